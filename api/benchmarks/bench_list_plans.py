@@ -0,0 +1,136 @@
+"""
+Benchmark: list_plans top-50-per-component retrieval, per-component query loop
+vs. shared.plan_queries.latest_per_component.
+
+Runs against an in-memory stand-in for the plans container that charges a
+fixed round-trip latency per query page, and reports query count, pages,
+rows read and wall-clock latency for each strategy.
+
+Run from the api/ folder:
+    python -m benchmarks.bench_list_plans [--components 200] [--history 120] [--rare 0.1] [--latency-ms 20]
+"""
+import argparse
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from shared.plan_queries import latest_per_component
+
+SELECT_FIELDS = "c.id, c.project_id, c.component_name, c.component_id, c.environment, c.branch, c.timestamp"
+WHERE = ["(NOT IS_DEFINED(c.is_pending_approval) OR c.is_pending_approval = false)", "c.project_id = @pid"]
+PARAMS = [{"name": "@pid", "value": "proj"}]
+
+
+class FakePlansContainer:
+    """
+    Answers the query shapes list_plans issues (filters by @pid/@cid/@before_ts,
+    DISTINCT component ids, ORDER BY timestamp DESC with optional LIMIT),
+    sleeping latency_s per page of results like a Cosmos round trip.
+    """
+
+    def __init__(self, docs: list[dict], latency_s: float, page_size: int = 100):
+        self.docs = sorted(docs, key=lambda d: d["timestamp"], reverse=True)
+        self.latency_s = latency_s
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.queries = 0
+        self.pages = 0
+        self.rows = 0
+
+    def query_items(self, query, parameters, enable_cross_partition_query=True, max_item_count=None):
+        params = {p["name"]: p["value"] for p in parameters}
+        with self._lock:
+            self.queries += 1
+
+        rows = [d for d in self.docs
+                if d["project_id"] == params["@pid"]
+                and ("@cid" not in params or d["component_id"] == params["@cid"])
+                and ("@before_ts" not in params or d["timestamp"] <= params["@before_ts"])]
+        if "DISTINCT VALUE c.component_id" in query:
+            rows = list(dict.fromkeys(d["component_id"] for d in rows))
+        limit = re.search(r"LIMIT (\d+)", query)
+        if limit:
+            rows = rows[:int(limit.group(1))]
+        return self._pages(rows, max_item_count or self.page_size)
+
+    def _pages(self, rows, page_size):
+        for start in range(0, max(len(rows), 1), page_size):
+            time.sleep(self.latency_s)
+            page = rows[start:start + page_size]
+            with self._lock:
+                self.pages += 1
+                self.rows += len(page)
+            yield from page
+
+
+def legacy_list(container) -> list[dict]:
+    """The previous list_plans loop: DISTINCT, then one query per component, sequentially."""
+    comp_query = f"SELECT DISTINCT VALUE c.component_id FROM c WHERE {' AND '.join(WHERE)}"
+    component_ids = list(container.query_items(query=comp_query, parameters=PARAMS, enable_cross_partition_query=True))
+    all_items = []
+    for cid in component_ids:
+        if not cid:
+            continue
+        per_comp_where = WHERE + ["c.component_id = @cid"]
+        per_comp_params = PARAMS + [{"name": "@cid", "value": cid}]
+        per_comp_query = f"SELECT {SELECT_FIELDS} FROM c WHERE {' AND '.join(per_comp_where)} ORDER BY c.timestamp DESC OFFSET 0 LIMIT 50"
+        all_items.extend(container.query_items(query=per_comp_query, parameters=per_comp_params, enable_cross_partition_query=True))
+    all_items.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+    return all_items
+
+
+def generate_docs(components: int, history: int, rare: float, seed: int = 42) -> list[dict]:
+    """history plans per active component (one a day); a `rare` fraction only gets a plan a month."""
+    rng = random.Random(seed)
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    docs = []
+    for c in range(components):
+        interval = timedelta(days=30) if rng.random() < rare else timedelta(days=1)
+        for i in range(history):
+            ts = now - i * interval - timedelta(minutes=rng.randrange(1440))
+            docs.append({
+                "id": f"plan-{c}-{i}",
+                "project_id": "proj",
+                "component_id": f"comp-{c}",
+                "timestamp": ts.isoformat().replace("+00:00", "Z"),
+            })
+    return docs
+
+
+def _measure(container, fn):
+    container.reset()
+    start = time.perf_counter()
+    items = fn()
+    return items, time.perf_counter() - start, (container.queries, container.pages, container.rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--components", type=int, default=200)
+    parser.add_argument("--history", type=int, default=120, help="plans per component")
+    parser.add_argument("--rare", type=float, default=0.1, help="fraction of components updated monthly")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="simulated round trip per query page")
+    args = parser.parse_args()
+
+    container = FakePlansContainer(generate_docs(args.components, args.history, args.rare), args.latency_ms / 1000)
+
+    legacy_items, legacy_time, legacy_stats = _measure(container, lambda: legacy_list(container))
+    new_items, new_time, new_stats = _measure(
+        container, lambda: latest_per_component(container, SELECT_FIELDS, WHERE, PARAMS, per_component=50))
+    assert {d["id"] for d in legacy_items} == {d["id"] for d in new_items}
+
+    print(f"components={args.components} history={args.history} rare={args.rare} latency={args.latency_ms}ms/page")
+    print(f"{'':22}{'queries':>8}{'pages':>8}{'rows':>8}{'latency':>12}")
+    for label, stats, elapsed in (("per-component loop", legacy_stats, legacy_time),
+                                  ("latest_per_component", new_stats, new_time)):
+        print(f"{label:22}{stats[0]:8d}{stats[1]:8d}{stats[2]:8d}{elapsed * 1000:9.0f} ms")
+    print(f"speedup: {legacy_time / new_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Micro-benchmark: PlanAnalyzer vs. the previous multi-pass manual_ingest code.
+
+Run from the api/ folder:
+    python -m benchmarks.bench_plan_analyzer [--resources 20000] [--components 200] [--repeat 5]
+"""
+import argparse
+import copy
+import gc
+import time
+
+from benchmarks.plan_fixtures import generate_plan
+from shared.component_matcher import ComponentMatcher
+from shared.plan_analyzer import PlanAnalyzer
+
+
+def legacy_analyze(tf_plan: dict, comp_map: dict, component_id: str | None) -> dict:
+    """The pre-PlanAnalyzer manual_ingest logic: one walk per concern."""
+    doc = {}
+    providers = set()
+    if 'configuration' in tf_plan and 'provider_config' in tf_plan['configuration']:
+        for provider_key in tf_plan['configuration']['provider_config']:
+            providers.add(provider_key)
+    doc['providers'] = list(providers)
+
+    cloud_platform = "Unknown"
+    if 'resource_changes' in tf_plan:
+        for rc in tf_plan['resource_changes']:
+            rtype = rc.get('type', '')
+            if cloud_platform == "Unknown":
+                if rtype.startswith('azurerm_'): cloud_platform = "Azure"
+                elif rtype.startswith('aws_'): cloud_platform = "AWS"
+                elif rtype.startswith('google_'): cloud_platform = "GCP"
+    doc['cloud_platform'] = cloud_platform
+
+    found = set()
+
+    def check_text(text):
+        if not isinstance(text, str): return
+        text_lower = text.lower()
+        for c_name, c_id in comp_map.items():
+            if component_id != c_id and c_name in text_lower:
+                found.add(c_id)
+
+    for var_val in tf_plan.get('variables', {}).values():
+        check_text(var_val.get('value'))
+    for res in tf_plan.get('configuration', {}).get('root_module', {}).get('resources', []):
+        check_text(res.get('name'))
+        for expr_val in res.get('expressions', {}).values():
+            if isinstance(expr_val, dict):
+                check_text(expr_val.get('constant_value'))
+    doc['dependencies'] = list(found)
+
+    graph = {"nodes": [], "edges": []}
+
+    def parse_module(module):
+        for res in module.get("resources", []):
+            res_addr = res.get("address")
+            graph["nodes"].append({"id": res_addr, "label": res.get("name"), "type": res.get("type"),
+                                   "group": res_addr.split('.')[0] if '.' in res_addr else "root"})
+            for dep in res.get("depends_on", []):
+                graph["edges"].append({"source": dep, "target": res_addr, "type": "explicit"})
+            for expr_val in res.get("expressions", {}).values():
+                if isinstance(expr_val, dict) and "references" in expr_val:
+                    for ref in expr_val["references"]:
+                        graph["edges"].append({"source": ref, "target": res_addr, "type": "implicit"})
+        for child in module.get("child_modules", []):
+            parse_module(child)
+
+    parse_module(tf_plan.get("configuration", {}).get("root_module", {}))
+    node_ids = set(n["id"] for n in graph["nodes"])
+    valid_edges = []
+    for edge in graph["edges"]:
+        src = edge["source"]
+        if src in node_ids:
+            valid_edges.append(edge)
+            continue
+        parts = src.split('.')
+        while len(parts) > 1:
+            parts.pop()
+            candidate = ".".join(parts)
+            if candidate in node_ids:
+                edge["source"] = candidate
+                valid_edges.append(edge)
+                break
+    graph["edges"] = valid_edges
+    doc['resource_graph'] = graph
+
+    pruned = {}
+    for key in ['format_version', 'terraform_version', 'timestamp']:
+        if key in tf_plan:
+            pruned[key] = tf_plan[key]
+    if 'resource_changes' in tf_plan:
+        refined = []
+        for rc in tf_plan['resource_changes']:
+            change_data = rc.get('change') or {}
+            rg_name = (change_data.get('after') or {}).get('resource_group_name')
+            if not rg_name:
+                rg_name = (change_data.get('before') or {}).get('resource_group_name')
+            refined.append({'address': rc.get('address'), 'type': rc.get('type'), 'name': rc.get('name'),
+                            'resource_group': rg_name, 'change': {'actions': change_data.get('actions', [])}})
+        pruned['resource_changes'] = refined
+    doc['terraform_plan'] = pruned
+
+    curr_changes = 0
+    for rc in pruned.get('resource_changes', []):
+        actions = rc.get('change', {}).get('actions', [])
+        if any(a in ['create', 'update', 'delete'] for a in actions):
+            curr_changes += 1
+    doc['changed_resources'] = curr_changes
+    return doc
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resources", type=int, default=20000)
+    parser.add_argument("--components", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    names = [f"component-{i}" for i in range(args.components)]
+    comp_map = {n: f"id-{i}" for i, n in enumerate(names)}
+    plan = generate_plan(args.resources, component_names=names)
+    # Built once per project and cached between ingests
+    matcher = ComponentMatcher(comp_map)
+
+    # Sanity check: both paths must agree before timing them
+    legacy = legacy_analyze(copy.deepcopy(plan), comp_map, None)
+    current = PlanAnalyzer(matcher).analyze(copy.deepcopy(plan))
+    assert sorted(legacy['dependencies']) == sorted(current.dependencies)
+    assert legacy['terraform_plan'] == current.pruned_plan
+    assert legacy['changed_resources'] == current.changed_resources
+    # Edges are deduplicated on (source, target) since the address-trie graph builder
+    assert ({(e['source'], e['target']) for e in legacy['resource_graph']['edges']}
+            == {(e['source'], e['target']) for e in current.resource_graph['edges']})
+
+    # The graph post-processing mutates edges in place, so time on fresh copies
+    copies = [copy.deepcopy(plan) for _ in range(args.repeat * 2)]
+    legacy_time = _best_of(lambda: legacy_analyze(copies.pop(), comp_map, None), args.repeat)
+    analyzer_time = _best_of(lambda: PlanAnalyzer(matcher).analyze(copies.pop()), args.repeat)
+
+    print(f"resources={args.resources} components={args.components} repeat={args.repeat}")
+    print(f"legacy multi-pass : {legacy_time * 1000:8.1f} ms")
+    print(f"PlanAnalyzer      : {analyzer_time * 1000:8.1f} ms")
+    print(f"speedup           : {legacy_time / analyzer_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
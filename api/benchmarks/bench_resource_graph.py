@@ -0,0 +1,113 @@
+"""
+Benchmark: address-trie ResourceGraphBuilder vs. the previous split/pop/join
+reference resolution in manual_ingest.
+
+Run from the api/ folder:
+    python -m benchmarks.bench_resource_graph [--references 50000] [--attribute-depth 1] [--repeat 5]
+"""
+import argparse
+import gc
+import time
+
+from benchmarks.plan_fixtures import generate_plan
+from shared.resource_graph import ResourceGraphBuilder
+
+
+def legacy_build(root_module: dict) -> dict:
+    """The pre-trie manual_ingest graph code (collect, then post-process)."""
+    graph = {"nodes": [], "edges": []}
+
+    def parse_module(module):
+        for res in module.get("resources", []):
+            res_addr = res.get("address")
+            graph["nodes"].append({"id": res_addr, "label": res.get("name"), "type": res.get("type"),
+                                   "group": res_addr.split('.')[0] if '.' in res_addr else "root"})
+            for dep in res.get("depends_on", []):
+                graph["edges"].append({"source": dep, "target": res_addr, "type": "explicit"})
+            for expr_val in res.get("expressions", {}).values():
+                if isinstance(expr_val, dict) and "references" in expr_val:
+                    for ref in expr_val["references"]:
+                        graph["edges"].append({"source": ref, "target": res_addr, "type": "implicit"})
+        for child in module.get("child_modules", []):
+            parse_module(child)
+
+    parse_module(root_module)
+    node_ids = set(n["id"] for n in graph["nodes"])
+    valid_edges = []
+    for edge in graph["edges"]:
+        src = edge["source"]
+        if src in node_ids:
+            valid_edges.append(edge)
+            continue
+        parts = src.split('.')
+        while len(parts) > 1:
+            parts.pop()
+            candidate = ".".join(parts)
+            if candidate in node_ids:
+                edge["source"] = candidate
+                valid_edges.append(edge)
+                break
+    graph["edges"] = valid_edges
+    return graph
+
+
+def trie_build(root_module: dict) -> dict:
+    builder = ResourceGraphBuilder()
+
+    def walk(module):
+        for res in module.get("resources", []):
+            res_addr = res["address"]
+            builder.add_resource(res_addr, res.get("name"), res.get("type"))
+            builder.add_resource_references(res_addr, res.get("depends_on"), res.get("expressions") or {})
+        for child in module.get("child_modules", []):
+            walk(child)
+
+    walk(root_module)
+    return builder.build()
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--references", type=int, default=50000)
+    parser.add_argument("--attribute-depth", type=int, default=1, choices=range(1, 6),
+                        help="segments after the resource address in each attribute reference")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # generate_plan emits 2 references (bare + ".id") per refs_per_resource
+    resources = max(1, args.references // 2)
+    plan = generate_plan(resources, refs_per_resource=1, attribute_depth=args.attribute_depth)
+    root = plan["configuration"]["root_module"]
+
+    legacy = legacy_build(root)
+    current = trie_build(root)
+    legacy_pairs = {(e["source"], e["target"]) for e in legacy["edges"]}
+    current_pairs = {(e["source"], e["target"]) for e in current["edges"]}
+    assert legacy_pairs == current_pairs
+
+    legacy_time = _best_of(lambda: legacy_build(root), args.repeat)
+    trie_time = _best_of(lambda: trie_build(root), args.repeat)
+
+    print(f"references={args.references} resources={resources} attribute_depth={args.attribute_depth} repeat={args.repeat}")
+    print(f"edges: legacy={len(legacy['edges'])} trie={len(current['edges'])} (deduplicated)")
+    print(f"legacy split/pop/join : {legacy_time * 1000:8.1f} ms")
+    print(f"address trie          : {trie_time * 1000:8.1f} ms")
+    print(f"speedup               : {legacy_time / trie_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
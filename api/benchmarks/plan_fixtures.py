@@ -0,0 +1,89 @@
+"""Synthetic Terraform plan generator shared by the benchmarks."""
+import random
+
+RESOURCE_TYPES = [
+    "azurerm_resource_group", "azurerm_storage_account", "azurerm_key_vault",
+    "azurerm_linux_function_app", "azurerm_cosmosdb_account", "azurerm_subnet",
+]
+ACTION_SETS = [["no-op"], ["no-op"], ["no-op"], ["create"], ["update"], ["delete"], ["delete", "create"], ["read"]]
+
+
+def generate_plan(resource_count: int = 20000, modules: int = 20, refs_per_resource: int = 2,
+                  component_names: list[str] | None = None, seed: int = 42,
+                  attribute_depth: int = 1) -> dict:
+    """
+    Builds a plan shaped like `terraform show -json` output: resources are
+    spread across the root module and `modules` child modules, each with
+    `refs_per_resource` references to earlier resources (every reference is
+    emitted both bare and with an `attribute_depth`-segment attribute path,
+    as Terraform does).
+    """
+    attribute = ".".join(["site_config", "0", "ip_restriction", "0", "id"][-attribute_depth:])
+    rng = random.Random(seed)
+    component_names = component_names or []
+
+    root = {"resources": [], "child_modules": []}
+    module_objs = [root]
+    for m in range(modules):
+        child = {"address": f"module.m{m}", "resources": [], "child_modules": []}
+        root["child_modules"].append(child)
+        module_objs.append(child)
+
+    addresses = []
+    resource_changes = []
+    for i in range(resource_count):
+        module = module_objs[i % len(module_objs)]
+        rtype = RESOURCE_TYPES[i % len(RESOURCE_TYPES)]
+        name = f"res{i}"
+        prefix = f"{module['address']}." if module is not root else ""
+        address = f"{prefix}{rtype}.{name}"
+
+        expressions = {}
+        if addresses:
+            refs = []
+            for _ in range(refs_per_resource):
+                target = rng.choice(addresses)
+                refs += [f"{target}.{attribute}", target]
+            expressions["parent_id"] = {"references": refs}
+        if component_names and i % 10 == 0:
+            expressions["tags"] = {"constant_value": f"owned-by-{rng.choice(component_names)}-team"}
+        expressions["location"] = {"constant_value": "westeurope"}
+
+        module["resources"].append({
+            "address": address,
+            "mode": "managed",
+            "type": rtype,
+            "name": name,
+            "expressions": expressions,
+            "depends_on": [rng.choice(addresses)] if addresses and i % 7 == 0 else [],
+        })
+        addresses.append(address)
+
+        actions = ACTION_SETS[i % len(ACTION_SETS)]
+        state = {"name": name, "resource_group_name": f"rg-{i % 50}", "location": "westeurope",
+                 "tags": {"env": "dev", "index": str(i)}}
+        resource_changes.append({
+            "address": address,
+            "type": rtype,
+            "name": name,
+            "change": {
+                "actions": actions,
+                "before": None if actions == ["create"] else state,
+                "after": None if actions == ["delete"] else state,
+            },
+        })
+
+    variables = {f"var{i}": {"value": f"value-{i}-{rng.choice(component_names) if component_names and i % 5 == 0 else 'x'}"}
+                 for i in range(max(1, resource_count // 20))}
+
+    return {
+        "format_version": "1.2",
+        "terraform_version": "1.7.5",
+        "timestamp": "2026-01-01T00:00:00Z",
+        "variables": variables,
+        "resource_changes": resource_changes,
+        "configuration": {
+            "provider_config": {"azurerm": {"name": "azurerm"}, "random": {"name": "random"}},
+            "root_module": root,
+        },
+    }
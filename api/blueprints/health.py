@@ -1,6 +1,8 @@
 import azure.functions as func
 import json
 import os
+from shared.db import get_cache_stats
+from shared.cosmos_metrics import get_metrics
 
 bp = func.Blueprint()
 
@@ -19,7 +21,11 @@ def get_version():
 @bp.route(route="health", auth_level=func.AuthLevel.ANONYMOUS)
 def health_check(req: func.HttpRequest) -> func.HttpResponse:
     return func.HttpResponse(
-        body=json.dumps({"status": "healthy", "version": get_version()}),
+        body=json.dumps({
+            "status": "healthy",
+            "version": get_version(),
+            "cosmos_cache": get_cache_stats()
+        }),
         status_code=200,
         mimetype="application/json"
     )
@@ -31,3 +37,20 @@ def version_check(req: func.HttpRequest) -> func.HttpResponse:
         status_code=200,
         mimetype="text/plain"
     )
+
+@bp.route(route="cosmos_metrics", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
+def cosmos_metrics(req: func.HttpRequest) -> func.HttpResponse:
+    # Query texts reveal the data model: internal callers only
+    internal_secret = os.environ.get('INTERNAL_SECRET')
+    if not internal_secret or req.headers.get('x-internal-secret') != internal_secret:
+        return func.HttpResponse("Unauthorized", status_code=401)
+    try:
+        top = max(1, int(req.params.get('top', 50)))
+        metrics = get_metrics(top=top, sort=req.params.get('sort', 'request_charge'))
+    except ValueError as e:
+        return func.HttpResponse(f"Error: {e}", status_code=400)
+    return func.HttpResponse(
+        body=json.dumps(metrics),
+        status_code=200,
+        mimetype="application/json"
+    )
@@ -1,3 +1,4 @@
+import asyncio
 import azure.functions as func
 import logging
 import json
@@ -6,12 +7,22 @@ import hashlib
 from datetime import datetime
 from azure.cosmos import exceptions
 from models import ManualIngestSchema
-from shared.db import get_container
+from shared.aio_db import get_async_container, query_all
+from shared.cosmos_metrics import metered
 from shared.notifications import send_slack_alert
+from shared.plan_analyzer import PlanAnalyzer
+from shared.component_matcher import get_project_matcher_async
+from shared.data_versions import bump_project_version, bump_project_version_async
+from shared.plans_store import delete_plan_doc, find_plan, get_plans_container, get_plans_container_async, project_query_kwargs
+from shared.plan_stream import read_plan_skeleton
+from shared.latest_plans import (
+    NOT_PENDING, count_changed_resources, get_latest_for_component_async, record_plan_async, refresh_series, remove_entries,
+)
 
 bp = func.Blueprint()
 
 @bp.route(route="ingest_plan", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
+@metered
 def ingest_plan(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Processing ingest_plan request.')
 
@@ -39,11 +50,12 @@ def ingest_plan(req: func.HttpRequest) -> func.HttpResponse:
     return func.HttpResponse("Endpoint under refactor", status_code=501)
 
 @bp.route(route="manual_ingest", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
-def manual_ingest(req: func.HttpRequest) -> func.HttpResponse:
+@metered
+async def manual_ingest(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Processing manual_ingest request.')
 
     # --- Authentication Logic ---
-    from shared.auth import verify_pat
+    from shared.auth import verify_pat_async
     import os
 
     is_authorized = False
@@ -62,7 +74,7 @@ def manual_ingest(req: func.HttpRequest) -> func.HttpResponse:
         auth_header = req.headers.get('Authorization')
         if auth_header and auth_header.startswith("Bearer "):
             token_str = auth_header.split(" ")[1]
-            project_doc = verify_pat(token_str)
+            project_doc = await verify_pat_async(token_str)
             if project_doc:
                 is_authorized = True
                 logging.info(f"Authenticated via PAT for Project {project_doc['id']}")
@@ -70,14 +82,28 @@ def manual_ingest(req: func.HttpRequest) -> func.HttpResponse:
     if not is_authorized:
         return func.HttpResponse("Unauthorized: Invalid PAT or Secret", status_code=401)
 
+    # Raw plan bytes to store as-is (streaming path only)
+    raw_plan_bytes = None
+
     try:
-        req_body = req.get_json()
-        # Manual extraction to avoid Pydantic overhead on large dicts
-        component_id = req_body.get('component_id')
-        component_name = req_body.get('component_name')
-        environment = req_body.get('environment')
-        branch = req_body.get('branch', 'develop')
-        tf_plan = req_body.get('terraform_plan')
+        if req.params.get('environment'):
+            # Streaming path: the body is the plan JSON itself and the metadata
+            # comes from the query string. Only the fields the analyzer needs
+            # are materialised; the bytes go to blob storage untouched.
+            component_id = req.params.get('component_id')
+            component_name = req.params.get('component_name')
+            environment = req.params.get('environment')
+            branch = req.params.get('branch', 'develop')
+            raw_plan_bytes = req.get_body()
+            tf_plan = await asyncio.to_thread(read_plan_skeleton, raw_plan_bytes) if raw_plan_bytes else None
+        else:
+            req_body = req.get_json()
+            # Manual extraction to avoid Pydantic overhead on large dicts
+            component_id = req_body.get('component_id')
+            component_name = req_body.get('component_name')
+            environment = req_body.get('environment')
+            branch = req_body.get('branch', 'develop')
+            tf_plan = req_body.get('terraform_plan')
         
         if not (component_id or component_name) or not environment or not tf_plan:
              return func.HttpResponse("Missing required fields: component_id (or component_name), environment, terraform_plan", status_code=400)
@@ -96,98 +122,123 @@ def manual_ingest(req: func.HttpRequest) -> func.HttpResponse:
     except ValueError as e:
         return func.HttpResponse(f"Invalid JSON: {e}", status_code=400)
 
+    if not ingest_data.component_id and not project_doc:
+        return func.HttpResponse("component_name lookup requires PAT authentication (Project Context) for new or existing components.", status_code=400)
+
+    # --- Concurrent reads ---
+    # The component lookup, the project read, the latest plan of the series
+    # (stale check) and the project's component names (dependency matching)
+    # are independent once the project is known. A PAT names it up front, so
+    # all of them run together; with the internal secret the project comes
+    # from the component, and the rest follow its lookup.
+    reads = {"component": _fetch_component(ingest_data, project_doc)}
+    if project_doc:
+        reads.update(_project_reads(project_doc['id'], ingest_data.component_id, ingest_data.environment))
+    results = await _gather_reads(reads)
+
     # Fetch Component Logic
     component_doc = None
     is_pending_approval = False
-    
-    try:
-        container_comps = get_container("components")
-        
-        if ingest_data.component_id:
-             # Direct ID lookup (Efficient, PK aware)
-             component_doc = container_comps.read_item(item=ingest_data.component_id, partition_key=ingest_data.component_id)
-        elif ingest_data.component_name:
-             # Name lookup (Requires Project Context)
-             if not project_doc:
-                 return func.HttpResponse("component_name lookup requires PAT authentication (Project Context) for new or existing components.", status_code=400)
-             
-             # Cross-partition query (Acceptable for lookup)
-             query = "SELECT * FROM c WHERE c.project_id = @pid AND c.name = @name"
-             params = [
-                 {"name": "@pid", "value": project_doc['id']},
-                 {"name": "@name", "value": ingest_data.component_name}
-             ]
-             results = list(container_comps.query_items(query=query, parameters=params, enable_cross_partition_query=True))
-             
-             if not results:
-                 # Component does not exist. Mark as pending approval.
-                 is_pending_approval = True
-             elif len(results) > 1:
-                  return func.HttpResponse(f"Ambiguous component name '{ingest_data.component_name}'", status_code=409)
-             else:
-                  component_doc = results[0]
-                  # Backfill ID for downstream logic
-                  ingest_data.component_id = component_doc['id']
-        else:
-             return func.HttpResponse("Either component_id or component_name is required", status_code=400)
 
-    except exceptions.CosmosResourceNotFoundError:
+    component = results['component']
+    if isinstance(component, exceptions.CosmosResourceNotFoundError):
         # If looked up by component_id and not found, this is a hard error (ids shouldn't be guessed)
         return func.HttpResponse("Component ID not found", status_code=404)
-    except Exception as e:
-         return func.HttpResponse(f"Error fetching component: {e}", status_code=500)
+    if isinstance(component, Exception):
+        return func.HttpResponse(f"Error fetching component: {component}", status_code=500)
+    if isinstance(component, func.HttpResponse):
+        return component
+    if component is None:
+        # Component does not exist. Mark as pending approval.
+        is_pending_approval = True
+    else:
+        component_doc = component
+        # Backfill ID for downstream logic
+        ingest_data.component_id = component_doc['id']
+
+    # --- PAT Ownership Check ---
+    # If authenticated via PAT (project_doc from header matches), ensure component belongs to that project
+    if project_doc and 'id' in project_doc and component_doc:
+         # Just strict equality since project_doc comes from PAT verification
+         if component_doc['project_id'] != project_doc['id']:
+             logging.warning(f"Security Alert: PAT for Project {project_doc['id']} tried to upload to Component {component_doc['id']} (Project {component_doc['project_id']})")
+             return func.HttpResponse("Forbidden: PAT does not match Component's Project", status_code=403)
+
+    # If we have a component_doc, its project_id is the primary source of truth (especially for legacy shared secret)
+    target_project_id = component_doc['project_id'] if component_doc else project_doc['id'] if project_doc else None
+    if not target_project_id:
+        return func.HttpResponse("Cannot determine project context", status_code=400)
+    # Reads not started with the component lookup (no PAT, or the component id came from its name)
+    results.update(await _gather_reads(_project_reads(target_project_id, ingest_data.component_id,
+                                                      ingest_data.environment, skip=results)))
 
     # Prepare Document
     doc_dict = {}
     tf_plan = ingest_data.terraform_plan
 
-    # 1. Use Full Plan (No Pruning as requested)
-    doc_dict['terraform_plan'] = tf_plan
     doc_dict['environment'] = ingest_data.environment
     doc_dict['branch'] = ingest_data.branch
-    
-    if 'terraform_version' in tf_plan:
-        doc_dict['terraform_version'] = tf_plan['terraform_version']
-        
-    providers = set()
-    if 'configuration' in tf_plan and 'provider_config' in tf_plan['configuration']:
-        for provider_key in tf_plan['configuration']['provider_config']:
-            providers.add(provider_key)
-    doc_dict['providers'] = list(providers)
-    
-    # Cloud Platform Detection
-    cloud_platform = "Unknown" 
-    if 'resource_changes' in tf_plan:
-        for rc in tf_plan['resource_changes']:
-            rtype = rc.get('type', '')
-            if cloud_platform == "Unknown":
-                if rtype.startswith('azurerm_'): cloud_platform = "Azure"
-                elif rtype.startswith('aws_'): cloud_platform = "AWS"
-                elif rtype.startswith('google_'): cloud_platform = "GCP"
-                
-    doc_dict['cloud_platform'] = cloud_platform
 
     # Project Metadata & Validation
     try:
         logging.info("Resolving project metadata...")
-        project_container = get_container("projects")
-        
-        # If we have a component_doc, its project_id is the primary source of truth (especially for legacy shared secret)
-        target_project_id = component_doc['project_id'] if component_doc else project_doc['id'] if project_doc else None
-        
-        if not target_project_id:
-            return func.HttpResponse("Cannot determine project context", status_code=400)
-            
-        # Re-fetch project doc to ensure we have the latest (including environments) if we didn't get it from PAT or if we need to verify component ownership
-        fetched_project_doc = project_container.read_item(item=target_project_id, partition_key=target_project_id)
+        # Re-fetched to ensure we have the latest (including environments)
+        fetched_project_doc = results['project']
+        if isinstance(fetched_project_doc, Exception):
+            raise fetched_project_doc
         
         # Environment Check
         if ingest_data.environment not in fetched_project_doc.get('environments', []):
             is_pending_approval = True
             
         doc_dict['is_pending_approval'] = is_pending_approval
+
+        doc_dict['project_id'] = fetched_project_doc['id']
+        doc_dict['project_name'] = fetched_project_doc['name']
         
-        # Validation: Enforce Cloud Platform Consistency (Skip if pending, but maybe set project platform anyway?)
+        if component_doc:
+            doc_dict['component_id'] = component_doc['id']
+            doc_dict['component_name'] = component_doc['name']
+        else:
+            doc_dict['component_name'] = ingest_data.component_name
+            # No component ID yet as it is pending
+                 
+    except Exception as e:
+        logging.error(f"Project metadata failed: {e}")
+        return func.HttpResponse("Failed to resolve project metadata", status_code=500)
+
+    # --- Heuristic Dependency Scanning Input ---
+    # Component-name matcher for this project, cached per worker and
+    # invalidated when components are created, renamed or deleted
+    matcher = results['matcher']
+    if isinstance(matcher, Exception):
+        logging.error(f"Dependency scanning failed: {matcher}")
+        # Non-critical, continue without dependency matches
+        matcher = None
+
+    # --- Plan Analysis (single pass) ---
+    # CPU-bound: run off the event loop so other invocations keep being served.
+    # Null fields, the dependency scan and the resource graph degrade to empty
+    # results inside the analyzer; what still fails here is a malformed
+    # resource_changes section.
+    try:
+        analysis = await asyncio.to_thread(PlanAnalyzer(matcher, doc_dict.get('component_id')).analyze, tf_plan)
+    except Exception as e:
+        logging.error(f"Plan analysis failed: {e}")
+        return func.HttpResponse(f"Invalid Terraform plan structure: {e}", status_code=400)
+
+    if analysis.terraform_version:
+        doc_dict['terraform_version'] = analysis.terraform_version
+    doc_dict['providers'] = analysis.providers
+    cloud_platform = analysis.cloud_platform
+    doc_dict['cloud_platform'] = cloud_platform
+    doc_dict['dependencies'] = analysis.dependencies
+    doc_dict['drift_summary'] = analysis.drift_summary
+    logging.info(f"Dependency Scan complete. Found: {len(analysis.dependencies)} links.")
+    logging.info(f"Resource Graph built: {len(analysis.resource_graph['nodes'])} nodes, {len(analysis.resource_graph['edges'])} edges")
+
+    # Validation: Enforce Cloud Platform Consistency
+    try:
         project_platform = fetched_project_doc.get('cloud_platform')
         if project_platform and project_platform != "Unknown" and cloud_platform != "Unknown":
             if project_platform != cloud_platform:
@@ -199,26 +250,7 @@ def manual_ingest(req: func.HttpRequest) -> func.HttpResponse:
         # If project has no platform set, set it now
         if (not project_platform or project_platform == "Unknown") and cloud_platform != "Unknown":
             fetched_project_doc['cloud_platform'] = cloud_platform
-            project_container.upsert_item(fetched_project_doc)
-
-        doc_dict['project_id'] = fetched_project_doc['id']
-        doc_dict['project_name'] = fetched_project_doc['name']
-        
-        if component_doc:
-            doc_dict['component_id'] = component_doc['id']
-            doc_dict['component_name'] = component_doc['name']
-        else:
-            doc_dict['component_name'] = ingest_data.component_name
-            # No component ID yet as it is pending
-        
-        # --- PAT Ownership Check ---
-        # If authenticated via PAT (project_doc from header matches), ensure component belongs to that project
-        if project_doc and 'id' in project_doc and component_doc:
-             # Just strict equality since project_doc comes from PAT verification
-             if component_doc['project_id'] != project_doc['id']:
-                 logging.warning(f"Security Alert: PAT for Project {project_doc['id']} tried to upload to Component {component_doc['id']} (Project {component_doc['project_id']})")
-                 return func.HttpResponse("Forbidden: PAT does not match Component's Project", status_code=403)
-                 
+            await (await get_async_container("projects")).upsert_item(fetched_project_doc)
     except Exception as e:
         logging.error(f"Project metadata failed: {e}")
         return func.HttpResponse("Failed to resolve project metadata", status_code=500)
@@ -228,213 +260,63 @@ def manual_ingest(req: func.HttpRequest) -> func.HttpResponse:
     doc_dict['id'] = plan_id
     
     # 2. Use Plan Timestamp
-    plan_timestamp = tf_plan.get('timestamp')
-    if plan_timestamp:
-        doc_dict['timestamp'] = plan_timestamp
+    if analysis.timestamp:
+        doc_dict['timestamp'] = analysis.timestamp
     else:
         doc_dict['timestamp'] = datetime.utcnow().isoformat()
 
-    # --- Heuristic Dependency Scanning ---
-    try:
-        # Fetch all components for this project to build a lookup map
-        # Optimization: cache this? For now, fetch on every ingest is okay (low volume)
-        comp_container = get_container("components")
-        project_components = list(comp_container.query_items(
-            query="SELECT c.id, c.name FROM c WHERE c.project_id = @pid",
-            parameters=[{"name": "@pid", "value": doc_dict['project_id']}],
-            enable_cross_partition_query=True
-        ))
-        
-        # Build comp_map so check_text doesn't throw a ReferenceError
-        comp_map = {c['name'].lower(): c['id'] for c in project_components}
-        found_dependencies = set()
-        
-        # Helper to check string for component names
-        def check_text(text):
-            if not isinstance(text, str): return
-            text_lower = text.lower()
-            for c_name, c_id in comp_map.items():
-                # Avoid self-referential matching if component_id is known
-                if doc_dict.get('component_id') != c_id and c_name in text_lower:
-                    found_dependencies.add(c_id)
-
-        # 1. Scan Variables
-        if 'variables' in tf_plan:
-            for var_key, var_val in tf_plan['variables'].items():
-                val = var_val.get('value')
-                check_text(val)
-                
-        # 2. Scan Configuration Resources (Managed & Data)
-        # Structure: plan['configuration']['root_module']['resources'] -> list of dicts
-        config = tf_plan.get('configuration', {})
-        root_module = config.get('root_module', {})
-        resources = root_module.get('resources', [])
-        
-        for res in resources:
-            # Check Resource Name
-            check_text(res.get('name'))
-            
-            # Check Expressions (Arguments)
-            # expressions is a dict of input args. Values can be complex.
-            # We'll do a shallow scan of string values.
-            expressions = res.get('expressions', {})
-            for expr_key, expr_val in expressions.items():
-                # expr_val could be {"constant_value": "..."} or references
-                if isinstance(expr_val, dict):
-                    check_text(expr_val.get('constant_value'))
-                    
-        doc_dict['dependencies'] = list(found_dependencies)
-        logging.info(f"Dependency Scan complete. Found: {len(found_dependencies)} links.")
-        
-    except Exception as e:
-        logging.error(f"Dependency scanning failed: {e}")
-        # Non-critical, continue
-        doc_dict['dependencies'] = []
+    # 3. Check for Stale Plan (Moved BEFORE Upload)
+    # Only performed if the component actually exists (not pending approval)
+    latest_entry = None
+    if not doc_dict.get('is_pending_approval'):
+        # Latest plan of this component/environment from the latest_plans index
+        latest_entry = results['latest']
+        if isinstance(latest_entry, Exception):
+            # If DB check fails, we probably shouldn't proceed? Or log and proceed?
+            # Proceeding is risky if DB is down. Failing is safer.
+            logging.error(f"Failed to check for stale plans: {latest_entry}")
+            return func.HttpResponse(f"Database Error checking stale plans: {latest_entry}", status_code=500)
+
+        if latest_entry is None:
+            # Series not in the index (new, or ingested before the index was
+            # backfilled): check the plans container itself
+            try:
+                latest_entry = await _latest_stored_plan(doc_dict['project_id'], doc_dict['component_id'], doc_dict['environment'])
+            except Exception as e:
+                logging.error(f"Failed to check for stale plans: {e}")
+                return func.HttpResponse(f"Database Error checking stale plans: {e}", status_code=500)
+
+        if latest_entry:
+            latest_ts = latest_entry['timestamp']
+            if doc_dict['timestamp'] <= latest_ts:
+                return func.HttpResponse(
+                    f"Stale Plan: Uploaded plan timestamp ({doc_dict['timestamp']}) is not newer than latest plan ({latest_ts}).",
+                    status_code=400
+                )
 
-    # 2.x Build Resource Graph (New)
-    try:
-        resource_graph = {"nodes": [], "edges": []}
-        
-        # Helper to recursively parse modules
-        def parse_module(module, parent_path=""):
-            for res in module.get("resources", []):
-                res_addr = res.get("address")
-                res_type = res.get("type")
-                res_name = res.get("name")
-                
-                # Check if this resource is actually change-managed (exists in resource_changes)
-                # Optimization: We might want all config resources even if no-op, to show full structure?
-                # User asked for "latest plan", usually implies active things.
-                # But graph is structural. Let's include everything found in config.
-                
-                node = {
-                    "id": res_addr,
-                    "label": res_name,
-                    "type": res_type,
-                    "group": res_addr.split('.')[0] if '.' in res_addr else "root" # heuristic grouping
-                }
-                resource_graph["nodes"].append(node)
-                
-                # explicit depends_on
-                for dep in res.get("depends_on", []):
-                     resource_graph["edges"].append({"source": dep, "target": res_addr, "type": "explicit"})
-                     
-                # implicit references in expressions
-                expressions = res.get("expressions", {})
-                for expr_key, expr_val in expressions.items():
-                    if isinstance(expr_val, dict) and "references" in expr_val:
-                        for ref in expr_val["references"]:
-                             # ref can be "azurerm_resource_group.rg.name". We need "azurerm_resource_group.rg"
-                             # Heuristic: match against known nodes?
-                             # Or just strip attributes.
-                             # Terraform addresses are usually [module.path].type.name
-                             # Reference might include attribute access.
-                             
-                             # Simple heuristic: Split by dot, take first 2 parts if root, or more if module?
-                             # Better: Check if ref starts with a known node ID.
-                             # Since we are building nodes on fly, we might settle for just storing the raw ref and cleaning in frontend?
-                             # No, backend should do best effort.
-                             
-                             # Let's clean attribute access:
-                             # "azurerm_resource_group.rg.name" -> "azurerm_resource_group.rg"
-                             # "module.x.azurerm_resource_group.rg.id" -> "module.x.azurerm_resource_group.rg"
-                             
-                             # Assumption: Resource addresses don't have dots in names, only as separators.
-                             # Types have underscores.
-                             
-                             # Edge creation (we'll filter invalid ones later or let frontend handle dangling edges)
-                             resource_graph["edges"].append({"source": ref, "target": res_addr, "type": "implicit"})
-
-            for child in module.get("child_modules", []):
-                parse_module(child)
-
-        config = tf_plan.get("configuration", {})
-        root = config.get("root_module", {})
-        parse_module(root)
-        
-        # Post-process edges to map attributes to resource IDs
-        # 1. Collect all Node IDs
-        node_ids = set(n["id"] for n in resource_graph["nodes"])
-        
-        valid_edges = []
-        for edge in resource_graph["edges"]:
-            src = edge["source"]
-            target = edge["target"]
-            
-            # Try exact match
-            if src in node_ids:
-                valid_edges.append(edge)
-                continue
-                
-            # Try removing last segment (attribute) until match found
-            parts = src.split('.')
-            while len(parts) > 1:
-                parts.pop()
-                candidate = ".".join(parts)
-                if candidate in node_ids:
-                    edge["source"] = candidate
-                    valid_edges.append(edge)
-                    break
-                    
-        resource_graph["edges"] = valid_edges
-        
-        doc_dict['resource_graph'] = resource_graph
-        logging.info(f"Resource Graph built: {len(resource_graph['nodes'])} nodes, {len(resource_graph['edges'])} edges")
-        
-    except Exception as e:
-        logging.error(f"Failed to build resource graph: {e}")
-        doc_dict['resource_graph'] = {"nodes": [], "edges": []}
+    # 4. Upload Full Plan and Resource Graph to Blob Storage (concurrently)
+    from shared.storage import delete_plan_blobs
+    from shared.aio_storage import upload_plan_blob_async
+    from shared.graph_store import upload_graph_blob_async
 
-    # 3. Check for Stale Plan (Moved BEFORE Upload)
-    try:
-        container = get_container("plans", "/id")
-        # Only perform the stale plan check if the component actually exists (not pending approval)
-        if not doc_dict.get('is_pending_approval'):
-            
-            query = """
-                SELECT TOP 1 c.timestamp, c.id
-                FROM c 
-                WHERE c.component_id = @cid AND c.environment = @env 
-                ORDER BY c.timestamp DESC
-            """
-            params = [
-                {"name": "@cid", "value": doc_dict['component_id']},
-                {"name": "@env", "value": doc_dict['environment']}
-            ]
-            
-            existing_plans = list(container.query_items(
-                query=query, 
-                parameters=params, 
-                enable_cross_partition_query=True
-            ))
-            
-            if existing_plans:
-                latest_ts = existing_plans[0]['timestamp']
-                if doc_dict['timestamp'] <= latest_ts:
-                    return func.HttpResponse(
-                        f"Stale Plan: Uploaded plan timestamp ({doc_dict['timestamp']}) is not newer than latest plan ({latest_ts}).",
-                        status_code=400
-                    )
-    except Exception as e:
-        # If DB check fails, we probably shouldn't proceed? Or log and proceed?
-        # Proceeding is risky if DB is down. Failing is safer.
-        logging.error(f"Failed to check for stale plans: {e}")
-        return func.HttpResponse(f"Database Error checking stale plans: {e}", status_code=500)
-
-    # 4. Upload Full Plan to Blob Storage
-    # Import inside function to avoid circular deps if any (though best at top)
-    from shared.storage import upload_plan_blob
-    
-    try:
-        blob_url = upload_plan_blob(
-            plan_data=tf_plan,
+    # Content-addressed: an unchanged re-run shares the previous plan's blob.
+    # The resource graph lives in its own (shared) blob, served by get_plan_graph
+    blob_url, graph_url = await asyncio.gather(
+        upload_plan_blob_async(
+            plan_data=raw_plan_bytes if raw_plan_bytes is not None else tf_plan,
             project_id=doc_dict['project_id'],
-            component_id=doc_dict.get('component_id', 'pending'),
-            environment=doc_dict['environment'],
-            plan_id=doc_dict['id']
-        )
-        doc_dict['blob_url'] = blob_url
-    except Exception as e:
+            plan_timestamp=analysis.timestamp
+        ),
+        upload_graph_blob_async(analysis.resource_graph, doc_dict['project_id']),
+        return_exceptions=True
+    )
+    upload_error = next((r for r in (blob_url, graph_url) if isinstance(r, Exception)), None)
+    if upload_error:
+        # Release the reference the other upload took
+        taken = [r for r in (blob_url, graph_url) if isinstance(r, str)]
+        if taken:
+            await asyncio.to_thread(delete_plan_blobs, taken)
+        e = upload_error
         status_code = 500
         error_msg = f"Blob Storage Upload Failed: {str(e)}"
         if "AuthorizationPermissionMismatch" in str(e) or "403" in str(e):
@@ -443,54 +325,33 @@ def manual_ingest(req: func.HttpRequest) -> func.HttpResponse:
         
         logging.error(f"Blob upload failed: {e}")
         return func.HttpResponse(error_msg, status_code=status_code)
+    doc_dict['blob_url'] = blob_url
+    doc_dict['graph_url'] = graph_url
 
     try:
         # 5. Prune Cosmos Document (Hybrid Approach)
-        pruned_plan = {}
-        # Keep Metadata
-        for key in ['format_version', 'terraform_version', 'timestamp']:
-            if key in tf_plan:
-                pruned_plan[key] = tf_plan[key]
-                
-        # Keep Resource Changes
-        if 'resource_changes' in tf_plan:
-            refined_changes = []
-            for rc in tf_plan['resource_changes']:
-                change_data = rc.get('change') or {}
-                
-                # Extract Resource Group Name
-                after_data = change_data.get('after') or {}
-                rg_name = after_data.get('resource_group_name')
-                
-                if not rg_name:
-                    before_data = change_data.get('before') or {}
-                    rg_name = before_data.get('resource_group_name')
-                
-                refined_rc = {
-                    'address': rc.get('address'),
-                    'type': rc.get('type'),
-                    'name': rc.get('name'), 
-                    'resource_group': rg_name,
-                    'change': {
-                        'actions': change_data.get('actions', [])
-                    }
-                }
-                refined_changes.append(refined_rc)
-            pruned_plan['resource_changes'] = refined_changes
-            
-        doc_dict['terraform_plan'] = pruned_plan
+        doc_dict['terraform_plan'] = analysis.pruned_plan
 
-        container.upsert_item(doc_dict)
+        await (await get_plans_container_async()).upsert_item(doc_dict)
         
     except exceptions.CosmosHttpResponseError as e:
         logging.error(f"Cosmos DB Error: {e.status_code} - {e.message}")
+        await asyncio.to_thread(delete_plan_blobs, [blob_url, graph_url])  # release the blob references taken above
         if e.status_code == 413:
              return func.HttpResponse("Plan too large for Database. Please reduce plan size or contact support.", status_code=413)
         return func.HttpResponse(f"Database Error ({e.status_code}): {e.message}", status_code=500)
     except Exception as e:
         logging.error(f"Upsert failed: {e}")
+        await asyncio.to_thread(delete_plan_blobs, [blob_url, graph_url])
         return func.HttpResponse(f"Internal Error saving to DB: {e}", status_code=500)
 
+    # The latest_plans index and the data version are independent writes
+    recorded, _ = await asyncio.gather(record_plan_async(doc_dict), bump_project_version_async(doc_dict['project_id']),
+                                       return_exceptions=True)
+    if isinstance(recorded, Exception):
+        # The plan is stored; the index converges on the next ingest or backfill
+        logging.error(f"Failed to update latest_plans index: {recorded}")
+
     # 5. Drift Notification (Slack) - Post-Success Logic
     try:
         notifications = project_doc.get('notifications', {})
@@ -499,12 +360,7 @@ def manual_ingest(req: func.HttpRequest) -> func.HttpResponse:
         default_branch = project_doc.get('default_branch', 'develop')
         if slack_settings.get('enabled') and slack_settings.get('webhook_url') and doc_dict.get('branch') == default_branch:
             # Calculate current changes
-            curr_changes = 0
-            if 'resource_changes' in doc_dict['terraform_plan']:
-                for rc in doc_dict['terraform_plan']['resource_changes']:
-                        actions = rc.get('change', {}).get('actions', [])
-                        if any(a in ['create', 'update', 'delete'] for a in actions):
-                            curr_changes += 1
+            curr_changes = analysis.changed_resources
             
             # Check previous state
             prev_changes = 0
@@ -513,33 +369,21 @@ def manual_ingest(req: func.HttpRequest) -> func.HttpResponse:
             # Keeping original alert logic but inside safe block
             
             should_alert = False
-            if existing_plans:
-                    try:
-                        prev_id = existing_plans[0]['id']
-                        # Re-read full doc for drift comparison since query was lightweight
-                        prev_plan_doc = container.read_item(item=prev_id, partition_key=prev_id)
-                        
-                        if 'terraform_plan' in prev_plan_doc and 'resource_changes' in prev_plan_doc['terraform_plan']:
-                            for rc in prev_plan_doc['terraform_plan']['resource_changes']:
-                                actions = rc.get('change', {}).get('actions', [])
-                                if any(a in ['create', 'update', 'delete'] for a in actions):
-                                    prev_changes += 1
-                        
-                        if prev_changes == 0 and curr_changes > 0:
-                            should_alert = True
-                            logging.info(f"Drift Transition (0->{curr_changes}). Alerting.")
-                            
-                    except Exception as ex:
-                        logging.warning(f"Could not fetch previous plan for drift: {ex}")
+            if latest_entry:
+                prev_changes = count_changed_resources(latest_entry)
+                if prev_changes == 0 and curr_changes > 0:
+                    should_alert = True
+                    logging.info(f"Drift Transition (0->{curr_changes}). Alerting.")
 
             if should_alert:
+                # Queued; posted by the dispatcher thread after we respond
                 try:
                     send_slack_alert(
                         webhook_url=slack_settings['webhook_url'],
                         project_name=doc_dict['project_name'],
                         component_name=doc_dict['component_name'],
                         environment=doc_dict['environment'],
-                        drift_summary=doc_dict['terraform_plan'],
+                        drift_summary=analysis.drift_summary,
                         plan_url=None
                     )
                 except Exception as slack_ex:
@@ -555,26 +399,100 @@ def manual_ingest(req: func.HttpRequest) -> func.HttpResponse:
         mimetype="application/json"
     )
 
+
+async def _gather_reads(reads: dict) -> dict:
+    """Awaits a dict of coroutines concurrently; failed reads map to their exception."""
+    values = await asyncio.gather(*reads.values(), return_exceptions=True)
+    return dict(zip(reads, values))
+
+
+async def _fetch_component(ingest_data, project_doc: dict | None) -> dict | func.HttpResponse | None:
+    """
+    The component by id (CosmosResourceNotFoundError if missing) or by name
+    within the PAT's project (None if it does not exist yet).
+    """
+    container_comps = await get_async_container("components")
+    if ingest_data.component_id:
+        # Direct ID lookup (Efficient, PK aware)
+        return await container_comps.read_item(item=ingest_data.component_id, partition_key=ingest_data.component_id)
+
+    # Name lookup (Requires Project Context). Cross-partition query (Acceptable for lookup)
+    results = await query_all(
+        container_comps,
+        "SELECT * FROM c WHERE c.project_id = @pid AND c.name = @name",
+        [{"name": "@pid", "value": project_doc['id']}, {"name": "@name", "value": ingest_data.component_name}],
+        enable_cross_partition_query=True
+    )
+    if len(results) > 1:
+        return func.HttpResponse(f"Ambiguous component name '{ingest_data.component_name}'", status_code=409)
+    return results[0] if results else None
+
+
+def _project_reads(project_id: str, component_id: str | None, environment: str, skip=()) -> dict:
+    """The reads manual_ingest keys on the project (the latest entry also needs the component), minus skip."""
+    reads = {"project": _read_project(project_id), "matcher": _load_matcher(project_id)}
+    if component_id:
+        reads["latest"] = get_latest_for_component_async(project_id, component_id, environment)
+    for key in skip:
+        if key in reads:
+            reads.pop(key).close()
+    return reads
+
+
+async def _latest_stored_plan(project_id: str, component_id: str, environment: str) -> dict | None:
+    """Newest approved plan of a component/environment in the plans container (stale check without an index entry)."""
+    plans = await query_all(
+        await get_plans_container_async(),
+        "SELECT TOP 1 c.id, c.timestamp FROM c WHERE c.project_id = @pid AND c.component_id = @cid "
+        f"AND c.environment = @env AND {NOT_PENDING} ORDER BY c.timestamp DESC",
+        [{"name": "@pid", "value": project_id}, {"name": "@cid", "value": component_id},
+         {"name": "@env", "value": environment}],
+        **project_query_kwargs(project_id)
+    )
+    return plans[0] if plans else None
+
+
+async def _read_project(project_id: str) -> dict:
+    return await (await get_async_container("projects")).read_item(item=project_id, partition_key=project_id)
+
+
+async def _load_matcher(project_id: str):
+    comp_container = await get_async_container("components")
+    return await get_project_matcher_async(project_id, lambda: query_all(
+        comp_container,
+        "SELECT c.id, c.name FROM c WHERE c.project_id = @pid",
+        [{"name": "@pid", "value": project_id}],
+        enable_cross_partition_query=True
+    ))
+
+
 @bp.route(route="delete_plan/{id}", auth_level=func.AuthLevel.ANONYMOUS, methods=["DELETE"])
+@metered
 def delete_plan(req: func.HttpRequest) -> func.HttpResponse:
     plan_id = req.route_params.get('id')
     logging.info(f"Processing delete_plan request for id: {plan_id}")
 
     try:
-        from shared.storage import delete_plan_blob
-        container = get_container("plans", "/id")
+        from shared.storage import delete_plan_blobs, plan_blob_urls
+        container = get_plans_container()
         
-        # Read the document first to get the blob_url
-        try:
-            plan_doc = container.read_item(item=plan_id, partition_key=plan_id)
-            blob_url = plan_doc.get("blob_url")
-            if blob_url:
-                delete_plan_blob(blob_url)
-        except exceptions.CosmosResourceNotFoundError:
-            pass # Standard 404 handled below if record is also missing
-
-        # Delete database record
-        container.delete_item(item=plan_id, partition_key=plan_id)
+        # Read the document first to get the blob_url / graph_url (and its
+        # partition; project_id is optional and saves a fan-out lookup)
+        plan_doc = find_plan(plan_id, req.params.get('project_id'))
+        if plan_doc is None:
+            return func.HttpResponse("Plan not found", status_code=404)
+
+        # Delete database record, then release its (possibly shared) blobs
+        delete_plan_doc(container, plan_doc)
+        delete_plan_blobs(plan_blob_urls(plan_doc))
+
+        # The series may now have an older latest plan (or none)
+        if plan_doc.get("component_id") and not plan_doc.get("is_pending_approval"):
+            try:
+                refresh_series(plan_doc["project_id"], plan_doc["component_id"], plan_doc["environment"], plan_doc.get("branch"))
+            except Exception as e:
+                logging.error(f"Failed to refresh latest_plans index for plan {plan_id}: {e}")
+        bump_project_version(plan_doc.get("project_id"))
         
         return func.HttpResponse(status_code=204)
         
@@ -591,6 +509,7 @@ def delete_plan(req: func.HttpRequest) -> func.HttpResponse:
         )
 
 @bp.route(route="delete_all_plans", auth_level=func.AuthLevel.ANONYMOUS, methods=["DELETE"])
+@metered
 def delete_all_plans(req: func.HttpRequest) -> func.HttpResponse:
     import os
     from shared.auth import verify_pat
@@ -632,29 +551,31 @@ def delete_all_plans(req: func.HttpRequest) -> func.HttpResponse:
     logging.info(f"Processing delete_all_plans request for project_id: {project_id}")
 
     try:
-        from shared.storage import delete_plan_blob
-        container = get_container("plans", "/id")
+        from shared.storage import delete_plan_blobs, plan_blob_urls
+        container = get_plans_container()
         
         # Query all plans for the given project_id
         items = list(container.query_items(
-            query="SELECT * FROM c WHERE c.project_id = @pid",
+            query="SELECT c.id, c.project_id, c.blob_url, c.graph_url FROM c WHERE c.project_id = @pid",
             parameters=[{"name": "@pid", "value": project_id}],
-            enable_cross_partition_query=True
+            **project_query_kwargs(project_id)
         ))
         
         deleted_count = 0
+        released_blobs = []
         for plan_doc in items:
             plan_id = plan_doc.get("id")
-            blob_url = plan_doc.get("blob_url")
             
-            # Delete from blob storage
-            if blob_url:
-                delete_plan_blob(blob_url)
-                
             # Delete from Cosmos DB
             if plan_id:
-                container.delete_item(item=plan_id, partition_key=plan_id)
+                delete_plan_doc(container, plan_doc)
                 deleted_count += 1
+                released_blobs.extend(plan_blob_urls(plan_doc))
+
+        # Release blob references (plans often share a blob), one update per blob
+        delete_plan_blobs(released_blobs)
+        remove_entries(project_id)
+        bump_project_version(project_id)
                 
         return func.HttpResponse(
             body=json.dumps({"message": f"Successfully deleted {deleted_count} plans.", "deleted_count": deleted_count}),
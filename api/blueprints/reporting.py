@@ -1,32 +1,93 @@
+import asyncio
 import azure.functions as func
 import logging
-import smtplib
 import os
 import json
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
-from shared.db import get_container
+from shared.aio_db import get_async_container, query_all, read_item_or_none
+from shared.cosmos_metrics import metered
+from shared.drift_summary import changed_resources
+from shared.mailer import send_email
+from shared.latest_plans import count_changes, get_latest_entries_async, latest_by_component_env
 from shared.notifications import send_slack_blocks, send_slack_stale_alert
+from shared.report_schedule import (
+    file_project_schedules, get_due_project_ids_async, remove_project_schedule, schedule_index_empty_async, schedule_slot,
+    slot_key,
+)
 from models import NotificationSettings
 
 bp = func.Blueprint()
 
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class _ReportTiming:
+    """
+    Stage timings of one project's report, logged as a single JSON line
+    ({"event": "report_timing", ...}) so slow stages can be queried in logs.
+    The budget is checked between stages; a stage that is already running
+    (e.g. an SMTP send) is bounded by its own timeout.
+    """
+
+    def __init__(self, project: dict, budget_seconds: float):
+        self.project_id = project.get('id')
+        self.project_name = project.get('name')
+        self.started = time.monotonic()
+        self.deadline = self.started + budget_seconds
+        self.stages: dict[str, float] = {}
+        self.status = "completed"
+        self.failed_stages: list[str] = []
+        self._last = self.started
+
+    def lap(self, stage: str) -> None:
+        now = time.monotonic()
+        self.stages[stage] = round((now - self._last) * 1000, 1)
+        self._last = now
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def within_budget(self, next_stage: str) -> bool:
+        if self.remaining() > 0:
+            return True
+        if self.status != "budget_exceeded":
+            logging.warning(f"Report for project {self.project_name} over its time budget, skipping from stage '{next_stage}'")
+            self.status = "budget_exceeded"
+        return False
+
+    def log(self) -> None:
+        logging.info(json.dumps({
+            "event": "report_timing",
+            "project_id": self.project_id,
+            "project_name": self.project_name,
+            "status": self.status,
+            "total_ms": round((time.monotonic() - self.started) * 1000, 1),
+            "stages_ms": self.stages,
+            "failed_stages": self.failed_stages,
+        }))
+
+
 @bp.timer_trigger(schedule="0 0 * * * *", arg_name="myTimer", run_on_startup=False,
               use_monitor=False) 
-def timer_report(myTimer: func.TimerRequest) -> None:
+@metered
+async def timer_report(myTimer: func.TimerRequest) -> None:
     if myTimer.past_due:
         logging.info('The timer is past due!')
 
     logging.info('Python timer trigger function executed.')
+    run_started = time.monotonic()
     
-    # 1. Fetch all projects
+    # 1. Fetch the projects due in this (weekday, hour) slot
     try:
-        container_projects = get_container("projects")
-        projects = list(container_projects.read_all_items())
-        
-        container_plans = get_container("plans")
-        container_components = get_container("components")
+        container_projects = await get_async_container("projects")
+        container_components = await get_async_container("components")
         
         current_time = datetime.utcnow()
         current_day = current_time.strftime("%A")
@@ -34,212 +95,237 @@ def timer_report(myTimer: func.TimerRequest) -> None:
         
         # Format Hour
         hour_str = f"{current_hour:02d}:00"
+        slot = slot_key(current_day, hour_str)
         
-        for project in projects:
-            try:
-                notifications = project.get('notifications')
-                if not notifications: continue
-                
-                email_settings = notifications.get('email', {})
-                if not email_settings.get('enabled'): continue
-                
-                schedule = email_settings.get('schedule', {})
-                if schedule.get('day') != current_day: continue
-                if schedule.get('time') != hour_str: continue # Check exact hour match
-                
-                recipients = email_settings.get('recipients', [])
-                if not recipients: continue
-                
-                logging.info(f"Generating report for Project: {project['name']}")
-                
-                # Fetch components
-                components = list(container_components.query_items(
-                    query="SELECT * FROM c WHERE c.project_id = @pid",
-                    parameters=[{"name": "@pid", "value": project['id']}],
-                    enable_cross_partition_query=True
-                ))
-                
-                report_data = []
-
-                for comp in components:
-                    # Get latest plan
-                    plans = list(container_plans.query_items(
-                        query="SELECT TOP 1 * FROM c WHERE c.component_id = @cid ORDER BY c.timestamp DESC",
-                        parameters=[{"name": "@cid", "value": comp['id']}],
-                        enable_cross_partition_query=True
-                    ))
-                    
-                    status = "Unknown"
-                    changes_str = "N/A"
-                    last_run = "Never"
-                    
-                    if plans:
-                        plan = plans[0]
-                        # Calculate Drift
-                        add, change, destroy = 0, 0, 0
-                        if 'terraform_plan' in plan and 'resource_changes' in plan['terraform_plan']:
-                             for rc in plan['terraform_plan']['resource_changes']:
-                                 actions = rc.get('change', {}).get('actions', [])
-                                 if 'create' in actions: add += 1
-                                 if 'update' in actions: change += 1
-                                 if 'delete' in actions: destroy += 1
-                        
-                        total = add + change + destroy
-                        if total == 0:
-                            status = "Synced"
-                            color = "green"
-                        else:
-                            status = "Drifted"
-                            color = "red"
-                            
-                        changes_str = f"+{add} ~{change} -{destroy}"
-                        last_run = plan.get('timestamp', 'Unknown')
-                    else:
-                        status = "No State"
-                        color = "gray"
-                        
-                    report_data.append({
-                        "component": comp['name'],
-                        "environment": "dev", # TODO: Loop all environments if components are env-specific or assume dev? Components are global? No, plans are per env. 
-                        # Wait, components are global, plans are per env. 
-                        # We should iterate environments defined in Project. 
-                        "status": status,
-                        "changes": changes_str,
-                        "last_run": last_run,
-                        "color": color
-                    })
-                    
-                # Note: The above loop logic assumes simplistic component-plan relationship. 
-                # If we want per-environment, we should loop environments.
-                # Re-do loop for environments.
-                
-                report_rows = []
-                for env in project.get('environments', ['dev']):
-                    for comp in components:
-                         # Get latest plan for this ENV
-                        plans = list(container_plans.query_items(
-                            query="SELECT TOP 1 * FROM c WHERE c.component_id = @cid AND c.environment = @env ORDER BY c.timestamp DESC",
-                            parameters=[
-                                {"name": "@cid", "value": comp['id']},
-                                {"name": "@env", "value": env}
-                            ],
-                            enable_cross_partition_query=True
-                        ))
-                        
-                        status = "Unknown"
-                        changes_str = "-"
-                        last_run = "-"
-                        color = "gray"
-                        
-                        if plans:
-                            plan = plans[0]
-                            # Simplify drift calc
-                            add, change, destroy = 0, 0, 0
-                            if 'terraform_plan' in plan and 'resource_changes' in plan['terraform_plan']:
-                                 for rc in plan['terraform_plan']['resource_changes']:
-                                     actions = rc.get('change', {}).get('actions', [])
-                                     if 'create' in actions: add += 1
-                                     if 'update' in actions: change += 1
-                                     if 'delete' in actions: destroy += 1
-                            total = add + change + destroy
-                            if total == 0:
-                                status = "Synced"
-                                color = "green"
-                            else:
-                                status = "Drifted"
-                                color = "red"
-                            changes_str = f"+{add} ~{change} -{destroy}"
-                            last_run_ts = plan.get('timestamp', '')
-                            if last_run_ts:
-                                try:
-                                    last_run = datetime.fromisoformat(last_run_ts.replace('Z', '+00:00')).strftime("%Y-%m-%d %H:%M")
-                                except:
-                                    last_run = last_run_ts
-                        
-                        report_rows.append(f"""
-                        <tr>
-                            <td style="padding: 8px; border: 1px solid #ddd;">{comp['name']}</td>
-                            <td style="padding: 8px; border: 1px solid #ddd;">{env}</td>
-                            <td style="padding: 8px; border: 1px solid #ddd; color: {color}; font-weight: bold;">{status}</td>
-                            <td style="padding: 8px; border: 1px solid #ddd;">{changes_str}</td>
-                            <td style="padding: 8px; border: 1px solid #ddd;">{last_run}</td>
-                        </tr>
-                        """)
-
-                # Construct Email
-                html_content = f"""
-                <html>
-                <body>
-                    <h2>Weekly Infrastructure Report: {project['name']}</h2>
-                    <table style="border-collapse: collapse; width: 100%;">
-                        <tr style="background-color: #f2f2f2;">
-                            <th style="padding: 8px; border: 1px solid #ddd; text-align: left;">Component</th>
-                            <th style="padding: 8px; border: 1px solid #ddd; text-align: left;">Environment</th>
-                            <th style="padding: 8px; border: 1px solid #ddd; text-align: left;">Status</th>
-                            <th style="padding: 8px; border: 1px solid #ddd; text-align: left;">Changes</th>
-                            <th style="padding: 8px; border: 1px solid #ddd; text-align: left;">Last Run</th>
-                        </tr>
-                        {''.join(report_rows)}
-                    </table>
-                </body>
-                </html>
-                """
-                
-                smtp_settings = email_settings.get('smtp', {})
-                if not smtp_settings.get('host'): 
-                    logging.warning("No SMTP host configured")
-                    continue
-                    
-                msg = MIMEMultipart()
-                msg['From'] = smtp_settings.get('username') or "noreply@terradorian.com"
-                msg['To'] = ", ".join(recipients)
-                msg['Subject'] = f"Weekly Report: {project['name']} ({current_day})"
-                msg.attach(MIMEText(html_content, 'html'))
-                
+        due_ids = await get_due_project_ids_async(slot)
+        projects = []
+        if not due_ids and await schedule_index_empty_async():
+            # The index has never been filled (tools.backfill_report_schedule
+            # not run): scan the projects as before, and file them so later
+            # runs read the index
+            logging.warning("report_schedule index is empty; scanning all projects (run tools.backfill_report_schedule)")
+            all_projects = await query_all(container_projects, "SELECT * FROM c", enable_cross_partition_query=True)
+            projects = [project for project in all_projects if schedule_slot(project) == slot]
+            filed = await asyncio.to_thread(file_project_schedules, all_projects)
+            logging.info(f"Filed {filed} scheduled project(s) in report_schedule")
+        for project_id, project in zip(due_ids, await asyncio.gather(
+                *(read_item_or_none(container_projects, project_id, project_id) for project_id in due_ids))):
+            if project is not None:
+                projects.append(project)
+            else:
+                # Project deleted since it was scheduled
+                await asyncio.to_thread(remove_project_schedule, project_id, slot)
+        logging.info(f"{len(projects)} project(s) scheduled for {slot}")
+        schedule_ms = round((time.monotonic() - run_started) * 1000, 1)
+
+        # 2. Generate and deliver the reports as concurrent tasks, at most
+        # REPORT_CONCURRENCY at a time. Each project gets its own time budget;
+        # projects not started before the run budget (kept under the function
+        # timeout) runs out are skipped.
+        concurrency = max(1, int(_env_number("REPORT_CONCURRENCY", 8)))
+        project_budget = _env_number("REPORT_PROJECT_BUDGET_SECONDS", 60)
+        run_deadline = run_started + _env_number("REPORT_RUN_BUDGET_SECONDS", 240)
+        slots = asyncio.Semaphore(concurrency)
+
+        async def run_project(project: dict) -> str:
+            async with slots:
+                remaining = run_deadline - time.monotonic()
+                if remaining <= 0:
+                    logging.warning(f"Run budget exhausted, skipping report for Project: {project.get('name')}")
+                    return "skipped_run_budget"
+                timing = _ReportTiming(project, min(project_budget, remaining))
                 try:
-                    server = smtplib.SMTP(smtp_settings['host'], smtp_settings.get('port', 587))
-                    server.starttls()
-                    server.login(smtp_settings['username'], smtp_settings['password'])
-                    server.send_message(msg)
-                    server.quit()
-                    logging.info("Email sent successfully")
+                    timing.status = await _process_project(project, container_components, current_time, timing)
                 except Exception as e:
-                    logging.error(f"Failed to send email: {e}")
-
-                # --- Slack Weekly Report ---
-                slack_settings = notifications.get('slack', {})
-                if (slack_settings.get('enabled') and slack_settings.get('webhook_url')
-                        and slack_settings.get('weekly_report')):
-                    slack_schedule = slack_settings.get('schedule', {})
-                    if slack_schedule.get('day') == current_day and slack_schedule.get('time') == hour_str:
-                        logging.info(f"Sending weekly Slack report for Project: {project['name']}")
-                        try:
-                            report_blocks = _generate_slack_report_blocks(project, components, container_plans)
-                            send_slack_blocks(slack_settings['webhook_url'], report_blocks)
-                        except Exception as e:
-                            logging.error(f"Failed to send Slack weekly report: {e}")
-
-                # --- Stale Plan Alerts ---
-                if (slack_settings.get('enabled') and slack_settings.get('webhook_url')
-                        and slack_settings.get('stale_alerts')):
-                    threshold_days = slack_settings.get('stale_threshold_days', 7)
-                    stale_items = _find_stale_plans(project, components, container_plans, threshold_days, current_time)
-                    if stale_items:
-                        logging.info(f"Found {len(stale_items)} stale plans for Project: {project['name']}")
-                        try:
-                            send_slack_stale_alert(slack_settings['webhook_url'], project['name'], stale_items)
-                        except Exception as e:
-                            logging.error(f"Failed to send stale alert: {e}")
-
-            except Exception as e:
-                logging.error(f"Error processing project {project.get('name')}: {e}")
+                    timing.status = "error"
+                    logging.error(f"Error processing project {project.get('name')}: {e}")
+                finally:
+                    timing.log()
+                return timing.status
+
+        statuses: dict[str, int] = {}
+        for status in await asyncio.gather(*(run_project(project) for project in projects)):
+            statuses[status] = statuses.get(status, 0) + 1
+
+        logging.info(json.dumps({
+            "event": "report_run",
+            "slot": slot,
+            "projects": len(projects),
+            "concurrency": concurrency,
+            "schedule_lookup_ms": schedule_ms,
+            "total_ms": round((time.monotonic() - run_started) * 1000, 1),
+            "statuses": statuses,
+        }))
 
     except Exception as e:
         logging.error(f"Timer trigger failed: {e}")
 
 
-def _generate_slack_report_blocks(project: dict, components: list, plans_container) -> list:
-    """Generate Slack Block Kit blocks for a weekly drift report."""
+async def _process_project(project: dict, container_components, current_time: datetime, timing: _ReportTiming) -> str:
+    """Builds and delivers one project's weekly report. Returns the outcome for the run summary."""
+    current_day = current_time.strftime("%A")
+    hour_str = f"{current_time.hour:02d}:00"
+
+    notifications = project.get('notifications')
+    if not notifications: return "not_configured"
+    
+    email_settings = notifications.get('email', {})
+    if not email_settings.get('enabled'): return "not_configured"
+    
+    schedule = email_settings.get('schedule', {})
+    if schedule.get('day') != current_day: return "not_due"
+    if schedule.get('time') != hour_str: return "not_due" # Check exact hour match
+    
+    recipients = email_settings.get('recipients', [])
+    if not recipients: return "not_configured"
+    
+    logging.info(f"Generating report for Project: {project['name']}")
+    
+    # Fetch components and, concurrently, one single-partition read of the
+    # project's latest_plans entries, reused for the email (any branch), the
+    # Slack report and the stale alerts (default branch)
+    components, latest_entries = await asyncio.gather(
+        query_all(
+            container_components,
+            "SELECT * FROM c WHERE c.project_id = @pid",
+            [{"name": "@pid", "value": project['id']}],
+            enable_cross_partition_query=True
+        ),
+        get_latest_entries_async(project['id'])
+    )
+    latest_plans = latest_by_component_env(latest_entries)
+    default_branch = project.get('default_branch', 'develop')
+    default_branch_plans = latest_by_component_env(
+        [e for e in latest_entries if e.get('branch') == default_branch])
+    timing.lap("load")
+
+    report_rows = []
+    for env in project.get('environments', ['dev']):
+        for comp in components:
+            plan = latest_plans.get(comp['id'], {}).get(env)
+            
+            status = "Unknown"
+            changes_str = "-"
+            last_run = "-"
+            color = "gray"
+            
+            if plan:
+                # A replace counts as both add and destroy
+                summary = count_changes(plan)
+                add = summary['create'] + summary['replace']
+                change = summary['update']
+                destroy = summary['delete'] + summary['replace']
+                total = add + change + destroy
+                if total == 0:
+                    status = "Synced"
+                    color = "green"
+                else:
+                    status = "Drifted"
+                    color = "red"
+                changes_str = f"+{add} ~{change} -{destroy}"
+                last_run_ts = plan.get('timestamp', '')
+                if last_run_ts:
+                    try:
+                        last_run = datetime.fromisoformat(last_run_ts.replace('Z', '+00:00')).strftime("%Y-%m-%d %H:%M")
+                    except:
+                        last_run = last_run_ts
+            
+            report_rows.append(f"""
+            <tr>
+                <td style="padding: 8px; border: 1px solid #ddd;">{comp['name']}</td>
+                <td style="padding: 8px; border: 1px solid #ddd;">{env}</td>
+                <td style="padding: 8px; border: 1px solid #ddd; color: {color}; font-weight: bold;">{status}</td>
+                <td style="padding: 8px; border: 1px solid #ddd;">{changes_str}</td>
+                <td style="padding: 8px; border: 1px solid #ddd;">{last_run}</td>
+            </tr>
+            """)
+
+    # Construct Email
+    html_content = f"""
+    <html>
+    <body>
+        <h2>Weekly Infrastructure Report: {project['name']}</h2>
+        <table style="border-collapse: collapse; width: 100%;">
+            <tr style="background-color: #f2f2f2;">
+                <th style="padding: 8px; border: 1px solid #ddd; text-align: left;">Component</th>
+                <th style="padding: 8px; border: 1px solid #ddd; text-align: left;">Environment</th>
+                <th style="padding: 8px; border: 1px solid #ddd; text-align: left;">Status</th>
+                <th style="padding: 8px; border: 1px solid #ddd; text-align: left;">Changes</th>
+                <th style="padding: 8px; border: 1px solid #ddd; text-align: left;">Last Run</th>
+            </tr>
+            {''.join(report_rows)}
+        </table>
+    </body>
+    </html>
+    """
+    
+    smtp_settings = email_settings.get('smtp', {})
+    if not smtp_settings.get('host'): 
+        logging.warning("No SMTP host configured")
+        return "no_smtp_host"
+        
+    msg = MIMEMultipart()
+    msg['From'] = smtp_settings.get('username') or "noreply@terradorian.com"
+    msg['To'] = ", ".join(recipients)
+    msg['Subject'] = f"Weekly Report: {project['name']} ({current_day})"
+    msg.attach(MIMEText(html_content, 'html'))
+    timing.lap("render")
+    
+    if not timing.within_budget("email"):
+        return timing.status
+    try:
+        # Pooled session per relay; bounded by what is left of the project's budget.
+        # smtplib is blocking, so the send runs in a worker thread.
+        await asyncio.to_thread(send_email, smtp_settings, msg, timeout=max(1.0, timing.remaining()))
+        logging.info("Email sent successfully")
+    except Exception as e:
+        logging.error(f"Failed to send email: {e}")
+        timing.failed_stages.append("email")
+    timing.lap("email")
+
+    # --- Slack Weekly Report ---
+    slack_settings = notifications.get('slack', {})
+    if (slack_settings.get('enabled') and slack_settings.get('webhook_url')
+            and slack_settings.get('weekly_report') and timing.within_budget("slack_report")):
+        slack_schedule = slack_settings.get('schedule', {})
+        if slack_schedule.get('day') == current_day and slack_schedule.get('time') == hour_str:
+            logging.info(f"Sending weekly Slack report for Project: {project['name']}")
+            try:
+                report_blocks = _generate_slack_report_blocks(project, components, default_branch_plans)
+                if not await asyncio.to_thread(send_slack_blocks, slack_settings['webhook_url'], report_blocks,
+                                               timeout=max(1.0, min(10.0, timing.remaining())),
+                                               budget=timing.remaining()):
+                    timing.failed_stages.append("slack_report")
+            except Exception as e:
+                logging.error(f"Failed to send Slack weekly report: {e}")
+                timing.failed_stages.append("slack_report")
+        timing.lap("slack_report")
+
+    # --- Stale Plan Alerts ---
+    if (slack_settings.get('enabled') and slack_settings.get('webhook_url')
+            and slack_settings.get('stale_alerts') and timing.within_budget("stale_alerts")):
+        threshold_days = slack_settings.get('stale_threshold_days', 7)
+        stale_items = _find_stale_plans(project, components, default_branch_plans, threshold_days, current_time)
+        if stale_items:
+            logging.info(f"Found {len(stale_items)} stale plans for Project: {project['name']}")
+            try:
+                if not await asyncio.to_thread(send_slack_stale_alert, slack_settings['webhook_url'], project['name'],
+                                               stale_items, timeout=max(1.0, min(10.0, timing.remaining())),
+                                               budget=timing.remaining()):
+                    timing.failed_stages.append("stale_alerts")
+            except Exception as e:
+                logging.error(f"Failed to send stale alert: {e}")
+                timing.failed_stages.append("stale_alerts")
+        timing.lap("stale_alerts")
+
+    return timing.status
+
+
+def _generate_slack_report_blocks(project: dict, components: list, latest_plans: dict) -> list:
+    """
+    Generate Slack Block Kit blocks for a weekly drift report.
+    latest_plans: latest_plans[comp_id][env] entries of the default branch.
+    """
     from datetime import datetime
 
     project_name = project.get("name", "Unknown Project")
@@ -247,33 +333,6 @@ def _generate_slack_report_blocks(project: dict, components: list, plans_contain
     default_branch = project.get("default_branch", "develop")
     instance_url = "https://web-terradorian-dev.azurewebsites.net"
 
-    # Fetch latest plans for default branch
-    plan_query = """
-    SELECT c.component_id, c.environment, c.timestamp, {'resource_changes': c.terraform_plan.resource_changes} AS terraform_plan
-    FROM c
-    WHERE c.project_id = @pid AND c.branch = @branch
-    AND (NOT IS_DEFINED(c.is_pending_approval) OR c.is_pending_approval = false)
-    ORDER BY c.timestamp DESC
-    """
-    all_plans = list(plans_container.query_items(
-        query=plan_query,
-        parameters=[
-            {"name": "@pid", "value": project['id']},
-            {"name": "@branch", "value": default_branch}
-        ],
-        enable_cross_partition_query=True
-    ))
-
-    # Build latest_plans[comp_id][env]
-    latest_plans = {}
-    for plan in all_plans:
-        cid = plan.get('component_id')
-        env = plan.get('environment')
-        if cid and env:
-            latest_plans.setdefault(cid, {})
-            if env not in latest_plans[cid]:
-                latest_plans[cid][env] = plan
-
     # Calculate average plan age
     now = datetime.utcnow()
     total_age_hours = 0
@@ -324,20 +383,9 @@ def _generate_slack_report_blocks(project: dict, components: list, plans_contain
                 row.append({"type": "rich_text", "elements": [{"type": "rich_text_section", "elements": [{"type": "emoji", "name": "question"}]}]})
                 continue
 
-            changes = plan.get('terraform_plan', {}).get('resource_changes', [])
-            summary = {"create": 0, "update": 0, "delete": 0, "replace": 0}
-            for rc in changes:
-                actions = rc.get('change', {}).get('actions', [])
-                if 'create' in actions and 'delete' in actions:
-                    summary["replace"] += 1
-                elif 'create' in actions:
-                    summary["create"] += 1
-                elif 'update' in actions:
-                    summary["update"] += 1
-                elif 'delete' in actions:
-                    summary["delete"] += 1
-
-            has_drift = sum(summary.values()) > 0
+            summary = count_changes(plan)
+
+            has_drift = changed_resources(summary) > 0
             if not has_drift:
                 row.append({"type": "rich_text", "elements": [{"type": "rich_text_section", "elements": [{"type": "emoji", "name": "large_green_circle"}]}]})
                 env_aligned[env] += 1
@@ -373,11 +421,13 @@ def _generate_slack_report_blocks(project: dict, components: list, plans_contain
     return blocks
 
 
-def _find_stale_plans(project: dict, components: list, plans_container, threshold_days: int, now: datetime) -> list[dict]:
-    """Find component/environment combinations where the latest plan is older than threshold_days."""
+def _find_stale_plans(project: dict, components: list, latest_plans: dict, threshold_days: int, now: datetime) -> list[dict]:
+    """
+    Find component/environment combinations where the latest plan is older than threshold_days.
+    latest_plans: latest_plans[comp_id][env] entries of the default branch.
+    """
     stale_items = []
     environments = project.get("environments", ["dev"])
-    default_branch = project.get("default_branch", "develop")
 
     for comp in components:
         excluded_envs = comp.get('excluded_environments', [])
@@ -385,20 +435,11 @@ def _find_stale_plans(project: dict, components: list, plans_container, threshol
             if env in excluded_envs:
                 continue
 
-            plans = list(plans_container.query_items(
-                query="SELECT TOP 1 c.timestamp FROM c WHERE c.component_id = @cid AND c.environment = @env AND c.branch = @branch AND (NOT IS_DEFINED(c.is_pending_approval) OR c.is_pending_approval = false) ORDER BY c.timestamp DESC",
-                parameters=[
-                    {"name": "@cid", "value": comp['id']},
-                    {"name": "@env", "value": env},
-                    {"name": "@branch", "value": default_branch}
-                ],
-                enable_cross_partition_query=True
-            ))
-
-            if not plans:
+            plan = latest_plans.get(comp['id'], {}).get(env)
+            if not plan:
                 continue  # No plans at all — not stale, just missing
 
-            ts_str = plans[0].get('timestamp')
+            ts_str = plan.get('timestamp')
             if not ts_str:
                 continue
 
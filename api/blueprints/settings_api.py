@@ -5,6 +5,7 @@ from azure.cosmos import exceptions
 from pydantic import ValidationError
 from models import AuthSettingsSchema
 from shared.db import get_container
+from shared.cosmos_metrics import metered
 
 bp = func.Blueprint()
 
@@ -17,6 +18,7 @@ def _is_internal_request(req: func.HttpRequest) -> bool:
 
 
 @bp.route(route="settings/auth/public", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
+@metered
 def get_public_auth_settings(req: func.HttpRequest) -> func.HttpResponse:
     try:
         container = get_container("settings", "/id")
@@ -46,6 +48,7 @@ def get_public_auth_settings(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="settings/auth", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
+@metered
 def get_auth_settings(req: func.HttpRequest) -> func.HttpResponse:
     if not _is_internal_request(req):
         return func.HttpResponse("Unauthorized", status_code=401)
@@ -82,6 +85,7 @@ def get_auth_settings(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="settings/auth", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
+@metered
 def save_auth_settings(req: func.HttpRequest) -> func.HttpResponse:
     if not _is_internal_request(req):
         return func.HttpResponse("Unauthorized", status_code=401)
@@ -1,13 +1,18 @@
+import asyncio
 import azure.functions as func
 import json
 from datetime import datetime
-from shared.db import get_container
+from shared.aio_db import get_async_container, query_all
+from shared.cosmos_metrics import metered
+from shared.drift_summary import has_drift as plan_has_drift
+from shared.latest_plans import count_changes, get_latest_entries_async, latest_by_component_env
 from azure.cosmos import exceptions
 
 bp = func.Blueprint()
 
 @bp.route(route="generate_slack_report", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
-def generate_slack_report(req: func.HttpRequest) -> func.HttpResponse:
+@metered
+async def generate_slack_report(req: func.HttpRequest) -> func.HttpResponse:
     project_id = req.params.get('project_id')
     branch = req.params.get('branch')
     
@@ -15,9 +20,17 @@ def generate_slack_report(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse("project_id param required", status_code=400)
     
     try:
-        # Fetch Project
-        projects_container = get_container("projects")
-        proj_doc = projects_container.read_item(item=project_id, partition_key=project_id)
+        # The project, its components and its latest plans are independent
+        # reads keyed on project_id: fetch them concurrently
+        projects_container = await get_async_container("projects")
+        comp_container = await get_async_container("components", "/id")
+        comp_query = "SELECT * FROM c WHERE c.project_id = @pid ORDER BY c.name ASC"
+        comp_params = [{"name": "@pid", "value": project_id}]
+        proj_doc, components, entries = await asyncio.gather(
+            projects_container.read_item(item=project_id, partition_key=project_id),
+            query_all(comp_container, comp_query, comp_params, enable_cross_partition_query=True),
+            get_latest_entries_async(project_id, branch=branch)
+        )
         
         project_name = proj_doc.get("name", "Unknown Project")
         environments = proj_doc.get("environments", ["dev"])
@@ -27,50 +40,13 @@ def generate_slack_report(req: func.HttpRequest) -> func.HttpResponse:
         # Default instance URL
         instance_url = "https://web-terradorian-dev.azurewebsites.net"
         
-        # Fetch Components
-        comp_container = get_container("components", "/id")
-        comp_query = "SELECT * FROM c WHERE c.project_id = @pid ORDER BY c.name ASC"
-        comp_params = [{"name": "@pid", "value": project_id}]
-        components = list(comp_container.query_items(
-            query=comp_query,
-            parameters=comp_params,
-            enable_cross_partition_query=True
-        ))
-        
         if not components:
             return func.HttpResponse("No components found for this project", status_code=404)
         
-        # Fetch Latest Plans
-        plans_container = get_container("plans", "/id")
-        plan_query = """
-        SELECT c.component_id, c.environment, c.timestamp, {'resource_changes': c.terraform_plan.resource_changes} AS terraform_plan 
-        FROM c 
-        WHERE c.project_id = @pid AND c.branch = @branch 
-        AND (NOT IS_DEFINED(c.is_pending_approval) OR c.is_pending_approval = false)
-        ORDER BY c.timestamp DESC
-        """
-        plan_params = [
-            {"name": "@pid", "value": project_id},
-            {"name": "@branch", "value": target_branch}
-        ]
-        
-        all_plans = list(plans_container.query_items(
-            query=plan_query,
-            parameters=plan_params,
-            enable_cross_partition_query=True
-        ))
-        
-        # Build map of fastest lookup: latest_plans[comp_id][env] = plan
-        latest_plans = {}
-        for plan in all_plans:
-            cid = plan.get('component_id')
-            env = plan.get('environment')
-            if not cid or not env:
-                continue
-            if cid not in latest_plans:
-                latest_plans[cid] = {}
-            if env not in latest_plans[cid]:
-                latest_plans[cid][env] = plan 
+        # Latest plans for the branch from the latest_plans index: latest_plans[comp_id][env] = entry.
+        # Without a branch parameter the target is the project's default branch,
+        # known only with the project: all entries were read, filter them here
+        latest_plans = latest_by_component_env([e for e in entries if e.get('branch') == target_branch])
         
         # Calculate Plan Ages
         total_age_hours = 0
@@ -138,31 +114,9 @@ def generate_slack_report(req: func.HttpRequest) -> func.HttpResponse:
                     row.append({"type": "rich_text", "elements": [{"type": "rich_text_section", "elements": [{"type": "emoji", "name": "question"}]}]})
                     continue
                     
-                # Process drifts
-                changes = plan.get('terraform_plan', {}).get('resource_changes', [])
-                summary = {"create": 0, "update": 0, "delete": 0, "replace": 0, "read": 0, "import": 0, "move": 0}
-                
-                for rc in changes:
-                    actions = rc.get('change', {}).get('actions', [])
-                    if 'create' in actions and 'delete' in actions:
-                        summary["replace"] += 1
-                    elif 'create' in actions:
-                        summary["create"] += 1
-                    elif 'update' in actions:
-                        summary["update"] += 1
-                    elif 'delete' in actions:
-                        summary["delete"] += 1
-                    elif 'read' in actions:
-                        summary["read"] += 1
-                    
-                    # For import and move, the actions list might be ["no-op"] but there is an 'action_reason' or other indicator in TF 1.5+. 
-                    # If this logic isn't perfect, we can tweak it based on sample outputs, assuming 'import' or 'moved' can appear.
-                    if 'import' in actions:
-                         summary["import"] += 1
-                         
-                # Check for "moved" in plan (TF represents this differently, but we accommodate based on the design)
-                # We'll map to emojis based on the requested template
-                has_drift = sum(summary.values()) - summary['read'] > 0
+                # Process drifts (precomputed drift_summary counters)
+                summary = count_changes(plan)
+                has_drift = plan_has_drift(summary)
                 
                 if not has_drift:
                     row.append({"type": "rich_text", "elements": [{"type": "rich_text_section", "elements": [{"type": "emoji", "name": "large_green_circle"}]}]})
@@ -189,6 +143,10 @@ def generate_slack_report(req: func.HttpRequest) -> func.HttpResponse:
                     if summary["import"] > 0:
                         elements.append({"type": "emoji", "name": "white_circle"})
                         elements.append({"type": "text", "text": f" To import: {summary['import']}\\n"})
+
+                    if summary["move"] > 0:
+                        elements.append({"type": "emoji", "name": "left_right_arrow"})
+                        elements.append({"type": "text", "text": f" To move: {summary['move']}\\n"})
                         
                     # Clean trailing newline if any
                     if elements and elements[-1]["type"] == "text" and elements[-1]["text"].endswith("\\n"):
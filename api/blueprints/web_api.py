@@ -1,5 +1,7 @@
+import asyncio
 import azure.functions as func
 import json
+import os
 import uuid
 import secrets
 import hashlib
@@ -7,11 +9,29 @@ from datetime import datetime, timezone, timedelta
 from azure.cosmos import exceptions
 from pydantic import ValidationError
 from models import CreateProjectSchema, CreateComponentSchema, UpdateProjectSettingsSchema, UpdateComponentSchema, ApproveIngestionSchema, RejectIngestionSchema
+from shared.aio_db import query_all
 from shared.db import get_container
+from shared.cosmos_metrics import metered
+from shared.component_matcher import invalidate_project_matcher
+from shared.data_versions import (
+    CATALOG_SCOPE, bump_project_version, etag_headers, not_modified, request_etag, request_etag_async,
+)
+from shared.storage import delete_plan_blobs, plan_blob_urls
+from shared.graph_store import load_plan_graph, load_plan_graph_async
+from shared.plans_store import (
+    delete_plan_doc, find_plan, get_plans_container, get_plans_container_async, plan_query_kwargs, project_query_kwargs,
+)
+from shared.pagination import (
+    AFTER_STATE, CONTINUATION_STATE, KEYSET_STATE, page_body, page_params, read_keyset_page, read_keyset_page_async, read_page,
+)
+from shared.plan_queries import latest_per_component_async, plan_select_fields
+from shared.latest_plans import get_latest_entries_async, latest_by_component_env, record_plan, remove_entries
+from shared.report_schedule import schedule_slot, sync_project_schedule
 
 bp = func.Blueprint()
 
 @bp.route(route="create_project", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
+@metered
 def create_project(req: func.HttpRequest) -> func.HttpResponse:
     try:
         req_body = req.get_json()
@@ -30,6 +50,7 @@ def create_project(req: func.HttpRequest) -> func.HttpResponse:
     try:
         container = get_container("projects", "/id")
         container.create_item(doc_dict)
+        bump_project_version(doc_dict['id'], catalog=True)
     except Exception as e:
         return func.HttpResponse(f"Error creating project: {e}", status_code=500)
 
@@ -40,6 +61,7 @@ def create_project(req: func.HttpRequest) -> func.HttpResponse:
     )
 
 @bp.route(route="add_environment", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
+@metered
 def add_environment(req: func.HttpRequest) -> func.HttpResponse:
     try:
         req_body = req.get_json()
@@ -59,6 +81,7 @@ def add_environment(req: func.HttpRequest) -> func.HttpResponse:
             current_envs.append(environment)
             project_doc['environments'] = current_envs
             container.upsert_item(project_doc)
+            bump_project_version(project_id, catalog=True)
             
         return func.HttpResponse(
             body=json.dumps({"environments": current_envs}),
@@ -71,6 +94,7 @@ def add_environment(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="create_component", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
+@metered
 def create_component(req: func.HttpRequest) -> func.HttpResponse:
     try:
         req_body = req.get_json()
@@ -88,6 +112,8 @@ def create_component(req: func.HttpRequest) -> func.HttpResponse:
     try:
         container = get_container("components", "/id")
         container.create_item(doc_dict)
+        invalidate_project_matcher(doc_dict['project_id'])
+        bump_project_version(doc_dict['project_id'])
     except Exception as e:
         return func.HttpResponse(f"Error creating component: {e}", status_code=500)
 
@@ -98,6 +124,7 @@ def create_component(req: func.HttpRequest) -> func.HttpResponse:
     )
 
 @bp.route(route="generate_pat", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
+@metered
 def generate_pat(req: func.HttpRequest) -> func.HttpResponse:
     try:
         req_body = req.get_json()
@@ -131,6 +158,7 @@ def generate_pat(req: func.HttpRequest) -> func.HttpResponse:
             
         proj_doc['tokens'].append(new_token)
         container.upsert_item(proj_doc)
+        bump_project_version(project_id)
         
     except exceptions.CosmosResourceNotFoundError:
         return func.HttpResponse("Project not found", status_code=404)
@@ -145,45 +173,86 @@ def generate_pat(req: func.HttpRequest) -> func.HttpResponse:
     )
     
 @bp.route(route="list_projects", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
+@metered
 def list_projects(req: func.HttpRequest) -> func.HttpResponse:
+    filters = {"endpoint": "list_projects"}
+    try:
+        page_size, page_state = page_params(req.params, filters, CONTINUATION_STATE)
+    except ValueError as e:
+        return func.HttpResponse(str(e), status_code=400)
+
+    # Conditional GET: a point read of the catalog version instead of the query
+    etag = request_etag(req, "list_projects", CATALOG_SCOPE)
+    cached = not_modified(req, etag)
+    if cached:
+        return cached
+
     try:
         container = get_container("projects", "/id")
+        query = "SELECT c.id, c.name, c.description, c.created_at, c.environments, c.notifications, c.environments_config, c.default_branch FROM c"
+        if page_size:
+            items, next_state = read_page(container, query, [], page_size, page_state, enable_cross_partition_query=True)
+            return func.HttpResponse(body=page_body(items, next_state, filters), status_code=200, mimetype="application/json",
+                                     headers=etag_headers(etag))
+
         items = list(container.query_items(
-            query="SELECT c.id, c.name, c.description, c.created_at, c.environments, c.notifications, c.environments_config, c.default_branch FROM c",
+            query=query,
             enable_cross_partition_query=True
         ))
         
         return func.HttpResponse(
             body=json.dumps(items),
             status_code=200,
-            mimetype="application/json"
+            mimetype="application/json",
+            headers=etag_headers(etag)
         )
     except Exception as e:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="list_components", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
+@metered
 def list_components(req: func.HttpRequest) -> func.HttpResponse:
     project_id = req.params.get('project_id')
     if not project_id:
         return func.HttpResponse("project_id param required", status_code=400)
+
+    filters = {"endpoint": "list_components", "project_id": project_id}
+    try:
+        page_size, page_state = page_params(req.params, filters, CONTINUATION_STATE)
+    except ValueError as e:
+        return func.HttpResponse(str(e), status_code=400)
+
+    etag = request_etag(req, "list_components", project_id)
+    cached = not_modified(req, etag)
+    if cached:
+        return cached
         
     try:
         container = get_container("components", "/id")
+        query = "SELECT c.id, c.name, c.project_id, c.excluded_environments FROM c WHERE c.project_id = @pid"
+        parameters = [{"name": "@pid", "value": project_id}]
+        if page_size:
+            items, next_state = read_page(container, query, parameters, page_size, page_state, enable_cross_partition_query=True)
+            return func.HttpResponse(body=page_body(items, next_state, filters), status_code=200, mimetype="application/json",
+                                     headers=etag_headers(etag))
+
         items = list(container.query_items(
-            query="SELECT c.id, c.name, c.project_id, c.excluded_environments FROM c WHERE c.project_id = @pid",
-            parameters=[{"name": "@pid", "value": project_id}],
+            query=query,
+            parameters=parameters,
             enable_cross_partition_query=True
         ))
         
         return func.HttpResponse(
             body=json.dumps(items),
             status_code=200,
-            mimetype="application/json"
+            mimetype="application/json",
+            headers=etag_headers(etag)
         )
     except Exception as e:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="update_component", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
+@metered
 def update_component(req: func.HttpRequest) -> func.HttpResponse:
     try:
         req_body = req.get_json()
@@ -198,10 +267,14 @@ def update_component(req: func.HttpRequest) -> func.HttpResponse:
         if comp_data.excluded_environments is not None:
             comp_doc['excluded_environments'] = comp_data.excluded_environments
 
+        renamed = bool(comp_data.name) and comp_data.name != comp_doc.get('name')
         if comp_data.name:
             comp_doc['name'] = comp_data.name
 
         container.upsert_item(comp_doc)
+        if renamed:
+            invalidate_project_matcher(comp_doc.get('project_id'))
+        bump_project_version(comp_doc.get('project_id'))
         
         return func.HttpResponse(
             body=json.dumps(comp_doc),
@@ -214,7 +287,8 @@ def update_component(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(f"Error: {e}", status_code=500)
     
 @bp.route(route="list_plans", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
-def list_plans(req: func.HttpRequest) -> func.HttpResponse:
+@metered
+async def list_plans(req: func.HttpRequest) -> func.HttpResponse:
     project_id = req.params.get('project_id')
     component_id = req.params.get('component_id')
     environment = req.params.get('environment')
@@ -234,11 +308,42 @@ def list_plans(req: func.HttpRequest) -> func.HttpResponse:
             start_timestamp = (datetime.now(timezone.utc) - timedelta(days=days)).replace(microsecond=0).isoformat().replace('+00:00', 'Z')
         except ValueError:
             return func.HttpResponse("days must be a positive integer or 'all'", status_code=400)
+
+    filters = {"endpoint": "list_plans", "project_id": project_id, "component_id": component_id,
+               "environment": environment, "branch": branch, "days": days_param}
+    try:
+        page_size, page_state = page_params(req.params, filters, KEYSET_STATE)
+        # view=summary|changes|graph|full or fields=a,b,c (see shared/plan_queries.py)
+        select_fields = plan_select_fields(req.params.get('view'), req.params.get('fields'))
+    except ValueError as e:
+        return func.HttpResponse(str(e), status_code=400)
+
+    # Only project-scoped listings have a version to validate against
+    etag = await request_etag_async(req, "list_plans", project_id)
+    cached = not_modified(req, etag)
+    if cached:
+        return cached
     
     try:
-        container = get_container("plans", "/id")
-        
-        select_fields = "c.id, c.project_id, c.component_name, c.component_id, c.environment, c.branch, c.timestamp, c.terraform_version, c.providers, c.cloud_platform, c.dependencies, c.resource_graph, {'resource_changes': c.terraform_plan.resource_changes} AS terraform_plan"
+        container = await get_plans_container_async()
+        query_kwargs = project_query_kwargs(project_id)
+
+        # Paginated: the matching plans newest first, page by page (no per-component cap)
+        if page_size:
+            where_clauses = ["(NOT IS_DEFINED(c.is_pending_approval) OR c.is_pending_approval = false)"]
+            parameters = []
+            for clause, name, value in (("c.project_id = @pid", "@pid", project_id),
+                                        ("c.component_id = @cid", "@cid", component_id),
+                                        ("c.environment = @env", "@env", environment),
+                                        ("c.branch = @branch", "@branch", branch),
+                                        ("c.timestamp >= @start_ts", "@start_ts", start_timestamp if filter_by_days else None)):
+                if value:
+                    where_clauses.append(clause)
+                    parameters.append({"name": name, "value": value})
+            items, next_state = await read_keyset_page_async(container, select_fields, where_clauses, parameters,
+                                                             page_size, page_state, **query_kwargs)
+            return func.HttpResponse(body=page_body(items, next_state, filters), status_code=200, mimetype="application/json",
+                                     headers=etag_headers(etag))
 
         # If filtering to a single component, simple query with limit
         if component_id:
@@ -258,10 +363,11 @@ def list_plans(req: func.HttpRequest) -> func.HttpResponse:
                 parameters.append({"name": "@start_ts", "value": start_timestamp})
 
             query = f"SELECT {select_fields} FROM c WHERE {' AND '.join(where_clauses)} ORDER BY c.timestamp DESC OFFSET 0 LIMIT 50"
-            items = list(container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True))
-            return func.HttpResponse(body=json.dumps(items), status_code=200, mimetype="application/json")
+            items = await query_all(container, query, parameters, **query_kwargs)
+            return func.HttpResponse(body=json.dumps(items), status_code=200, mimetype="application/json",
+                                     headers=etag_headers(etag))
 
-        # Otherwise, find distinct components then fetch latest 50 per component
+        # Otherwise, fetch the latest 50 per component
         comp_where = ["(NOT IS_DEFINED(c.is_pending_approval) OR c.is_pending_approval = false)"]
         comp_params = []
         if project_id:
@@ -277,39 +383,31 @@ def list_plans(req: func.HttpRequest) -> func.HttpResponse:
             comp_where.append("c.timestamp >= @start_ts")
             comp_params.append({"name": "@start_ts", "value": start_timestamp})
 
-        comp_query = f"SELECT DISTINCT VALUE c.component_id FROM c WHERE {' AND '.join(comp_where)}"
-        component_ids = list(container.query_items(query=comp_query, parameters=comp_params, enable_cross_partition_query=True))
-
-        all_items = []
-        for cid in component_ids:
-            if not cid:
-                continue
-            per_comp_where = comp_where + ["c.component_id = @cid"]
-            per_comp_params = comp_params + [{"name": "@cid", "value": cid}]
-            per_comp_query = f"SELECT {select_fields} FROM c WHERE {' AND '.join(per_comp_where)} ORDER BY c.timestamp DESC OFFSET 0 LIMIT 50"
-            items = list(container.query_items(query=per_comp_query, parameters=per_comp_params, enable_cross_partition_query=True))
-            all_items.extend(items)
-
-        # Sort combined results newest first
-        all_items.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+        # Latest 50 per component in a bounded number of queries (see shared/plan_queries.py)
+        all_items = await latest_per_component_async(container, select_fields, comp_where, comp_params, per_component=50,
+                                                     **query_kwargs)
         
         return func.HttpResponse(
             body=json.dumps(all_items),
             status_code=200,
-            mimetype="application/json"
+            mimetype="application/json",
+            headers=etag_headers(etag)
         )
     except Exception as e:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="get_plan", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
+@metered
 def get_plan(req: func.HttpRequest) -> func.HttpResponse:
     plan_id = req.params.get('plan_id')
     if not plan_id:
         return func.HttpResponse("plan_id param required", status_code=400)
     
     try:
-        container = get_container("plans", "/id")
-        item = container.read_item(item=plan_id, partition_key=plan_id)
+        # project_id is optional; with it the plan is a point read under either partition scheme
+        item = find_plan(plan_id, req.params.get('project_id'))
+        if item is None:
+            return func.HttpResponse("Plan not found", status_code=404)
         
         return func.HttpResponse(
             body=json.dumps(item),
@@ -321,11 +419,49 @@ def get_plan(req: func.HttpRequest) -> func.HttpResponse:
     except Exception as e:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
+@bp.route(route="get_plan_graph", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
+@metered
+def get_plan_graph(req: func.HttpRequest) -> func.HttpResponse:
+    """Resource graph (nodes and edges) of one plan, loaded from the graph store."""
+    plan_id = req.params.get('plan_id')
+    if not plan_id:
+        return func.HttpResponse("plan_id param required", status_code=400)
+
+    try:
+        container = get_plans_container()
+        refs = list(container.query_items(
+            query="SELECT c.graph_url, c.resource_graph FROM c WHERE c.id = @id",
+            parameters=[{"name": "@id", "value": plan_id}],
+            **plan_query_kwargs(plan_id, req.params.get('project_id'))
+        ))
+        if not refs:
+            return func.HttpResponse("Plan not found", status_code=404)
+
+        graph = load_plan_graph(refs[0])
+        if graph is None:
+            return func.HttpResponse("Graph not found", status_code=404)
+
+        return func.HttpResponse(
+            body=json.dumps(graph),
+            status_code=200,
+            mimetype="application/json",
+            # A plan's graph never changes
+            headers={"Cache-Control": "private, max-age=86400, immutable"}
+        )
+    except Exception as e:
+        return func.HttpResponse(f"Error: {e}", status_code=500)
+
 @bp.route(route="list_tokens", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
+@metered
 def list_tokens(req: func.HttpRequest) -> func.HttpResponse:
     project_id = req.params.get('project_id')
     if not project_id:
         return func.HttpResponse("project_id param required", status_code=400)
+
+    etag = request_etag(req, "list_tokens", project_id)
+    cached = not_modified(req, etag)
+    if cached:
+        return cached
         
     try:
         container = get_container("projects")
@@ -341,7 +477,8 @@ def list_tokens(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(
             body=json.dumps(safe_tokens),
             status_code=200,
-            mimetype="application/json"
+            mimetype="application/json",
+            headers=etag_headers(etag)
         )
     except exceptions.CosmosResourceNotFoundError:
         return func.HttpResponse("Project not found", status_code=404)
@@ -349,6 +486,7 @@ def list_tokens(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="revoke_token", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
+@metered
 def revoke_token(req: func.HttpRequest) -> func.HttpResponse:
     try:
         req_body = req.get_json()
@@ -372,6 +510,7 @@ def revoke_token(req: func.HttpRequest) -> func.HttpResponse:
 
         proj_doc['tokens'] = new_tokens
         container.upsert_item(proj_doc)
+        bump_project_version(project_id)
         
         return func.HttpResponse(status_code=204)
         
@@ -381,6 +520,7 @@ def revoke_token(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="delete_component", auth_level=func.AuthLevel.ANONYMOUS, methods=["DELETE"])
+@metered
 def delete_component(req: func.HttpRequest) -> func.HttpResponse:
     try:
         req_body = req.get_json()
@@ -399,21 +539,30 @@ def delete_component(req: func.HttpRequest) -> func.HttpResponse:
             comp_container.delete_item(item=component_id, partition_key=component_id)
         except exceptions.CosmosResourceNotFoundError:
             return func.HttpResponse("Component not found", status_code=404)
+        invalidate_project_matcher(project_id)
 
         # 2. Cascade Delete Plans
         # Note: In a real prod system, this might be done via a background job or stored procedure for atomicity
-        plans_container = get_container("plans", "/id")
+        plans_container = get_plans_container()
         plans = list(plans_container.query_items(
-            query="SELECT c.id FROM c WHERE c.component_id = @cid",
-            parameters=[{"name": "@cid", "value": component_id}],
-            enable_cross_partition_query=True
+            query="SELECT c.id, c.project_id, c.blob_url, c.graph_url FROM c WHERE c.project_id = @pid AND c.component_id = @cid",
+            parameters=[
+                {"name": "@pid", "value": project_id},
+                {"name": "@cid", "value": component_id}
+            ],
+            **project_query_kwargs(project_id)
         ))
         
+        released_blobs = []
         for plan in plans:
             try:
-                plans_container.delete_item(item=plan['id'], partition_key=plan['id'])
+                delete_plan_doc(plans_container, plan)
+                released_blobs.extend(plan_blob_urls(plan))
             except exceptions.CosmosResourceNotFoundError:
                 continue
+        delete_plan_blobs(released_blobs)
+        remove_entries(project_id, "c.component_id = @cid", [{"name": "@cid", "value": component_id}])
+        bump_project_version(project_id)
 
         return func.HttpResponse(status_code=204)
 
@@ -422,6 +571,7 @@ def delete_component(req: func.HttpRequest) -> func.HttpResponse:
 
 
 @bp.route(route="delete_environment", auth_level=func.AuthLevel.ANONYMOUS, methods=["DELETE"])
+@metered
 def delete_environment(req: func.HttpRequest) -> func.HttpResponse:
     try:
         req_body = req.get_json()
@@ -451,21 +601,26 @@ def delete_environment(req: func.HttpRequest) -> func.HttpResponse:
             return func.HttpResponse("Environment not found in project", status_code=404)
 
         # 2. Cascade Delete Plans
-        plans_container = get_container("plans", "/id")
+        plans_container = get_plans_container()
         plans = list(plans_container.query_items(
-            query="SELECT c.id FROM c WHERE c.project_id = @pid AND c.environment = @env",
+            query="SELECT c.id, c.project_id, c.blob_url, c.graph_url FROM c WHERE c.project_id = @pid AND c.environment = @env",
             parameters=[
                 {"name": "@pid", "value": project_id},
                 {"name": "@env", "value": environment}
             ],
-            enable_cross_partition_query=True
+            **project_query_kwargs(project_id)
         ))
         
+        released_blobs = []
         for plan in plans:
             try:
-                plans_container.delete_item(item=plan['id'], partition_key=plan['id'])
+                delete_plan_doc(plans_container, plan)
+                released_blobs.extend(plan_blob_urls(plan))
             except exceptions.CosmosResourceNotFoundError:
                 continue
+        delete_plan_blobs(released_blobs)
+        remove_entries(project_id, "c.environment = @env", [{"name": "@env", "value": environment}])
+        bump_project_version(project_id, catalog=True)
 
         return func.HttpResponse(status_code=204)
 
@@ -475,11 +630,11 @@ def delete_environment(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="delete_branch_plans", auth_level=func.AuthLevel.ANONYMOUS, methods=["DELETE"])
+@metered
 def delete_branch_plans(req: func.HttpRequest) -> func.HttpResponse:
     """Delete all plans for a specific branch within a project."""
     import logging
     import os
-    from shared.storage import delete_plan_blob
     from shared.auth import verify_pat
 
     # --- Authentication Logic ---
@@ -523,26 +678,29 @@ def delete_branch_plans(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse("Forbidden: PAT not valid for this project", status_code=403)
 
     try:
-        plans_container = get_container("plans", "/id")
+        plans_container = get_plans_container()
         plans = list(plans_container.query_items(
-            query="SELECT c.id, c.blob_url FROM c WHERE c.project_id = @pid AND c.branch = @branch",
+            query="SELECT c.id, c.project_id, c.blob_url, c.graph_url FROM c WHERE c.project_id = @pid AND c.branch = @branch",
             parameters=[
                 {"name": "@pid", "value": project_id},
                 {"name": "@branch", "value": branch}
             ],
-            enable_cross_partition_query=True
+            **project_query_kwargs(project_id)
         ))
 
         deleted_count = 0
+        released_blobs = []
         for plan in plans:
-            blob_url = plan.get("blob_url")
-            if blob_url:
-                delete_plan_blob(blob_url)
             try:
-                plans_container.delete_item(item=plan['id'], partition_key=plan['id'])
+                delete_plan_doc(plans_container, plan)
                 deleted_count += 1
+                released_blobs.extend(plan_blob_urls(plan))
             except exceptions.CosmosResourceNotFoundError:
                 continue
+        # Blobs are shared between identical plans; release one reference per deleted plan
+        delete_plan_blobs(released_blobs)
+        remove_entries(project_id, "c.branch = @branch", [{"name": "@branch", "value": branch}])
+        bump_project_version(project_id)
 
         return func.HttpResponse(
             body=json.dumps({"message": f"Deleted {deleted_count} plans for branch '{branch}'.", "deleted_count": deleted_count}),
@@ -555,37 +713,62 @@ def delete_branch_plans(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="list_branches", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
+@metered
 def list_branches(req: func.HttpRequest) -> func.HttpResponse:
     """List all unique branches for a project."""
     project_id = req.params.get('project_id')
     if not project_id:
         return func.HttpResponse("project_id parameter is required", status_code=400)
 
+    filters = {"endpoint": "list_branches", "project_id": project_id}
+    try:
+        page_size, page_state = page_params(req.params, filters, AFTER_STATE)
+    except ValueError as e:
+        return func.HttpResponse(str(e), status_code=400)
+
+    etag = request_etag(req, "list_branches", project_id)
+    cached = not_modified(req, etag)
+    if cached:
+        return cached
+
     try:
-        plans_container = get_container("plans", "/id")
-        # Query distinct branches for this project
+        plans_container = get_plans_container()
+        # Query distinct branches for this project (cross-partition DISTINCT has
+        # no continuation token; pages resume after the last branch name)
+        where = ["c.project_id = @pid"]
+        parameters = [{"name": "@pid", "value": project_id}]
+        if page_state:
+            where.append("c.branch > @after")
+            parameters.append({"name": "@after", "value": page_state["after"]})
         plans = list(plans_container.query_items(
-            query="SELECT DISTINCT c.branch FROM c WHERE c.project_id = @pid",
-            parameters=[{"name": "@pid", "value": project_id}],
-            enable_cross_partition_query=True
+            query=f"SELECT DISTINCT c.branch FROM c WHERE {' AND '.join(where)}",
+            parameters=parameters,
+            **project_query_kwargs(project_id)
         ))
         
         branches = sorted([plan.get("branch") for plan in plans if plan.get("branch") and isinstance(plan.get("branch"), str) and plan.get("branch").strip()])
+
+        if page_size:
+            next_state = {"after": branches[page_size - 1]} if len(branches) > page_size else None
+            return func.HttpResponse(body=page_body(branches[:page_size], next_state, filters), status_code=200, mimetype="application/json",
+                                     headers=etag_headers(etag))
         
         return func.HttpResponse(
             body=json.dumps({"branches": branches}),
             status_code=200,
-            mimetype="application/json"
+            mimetype="application/json",
+            headers=etag_headers(etag)
         )
     except Exception as e:
         logging.error(f"Error listing branches: {e}")
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="calculate_disk_usage", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
+@metered
 def calculate_disk_usage(req: func.HttpRequest) -> func.HttpResponse:
     """Calculate total disk usage (Cosmos DB + Blob Storage) for a project."""
     import logging
-    from shared.storage import get_blob_service_client
+    from shared.storage import get_plans_container_client
     
     try:
         req_body = req.get_json()
@@ -598,18 +781,17 @@ def calculate_disk_usage(req: func.HttpRequest) -> func.HttpResponse:
 
     try:
         # Calculate Cosmos DB size (sum of all plan documents for this project)
-        plans_container = get_container("plans", "/id")
+        plans_container = get_plans_container()
         plans = list(plans_container.query_items(
             query="SELECT * FROM c WHERE c.project_id = @pid",
             parameters=[{"name": "@pid", "value": project_id}],
-            enable_cross_partition_query=True
+            **project_query_kwargs(project_id)
         ))
         
         cosmos_size_bytes = sum(len(json.dumps(plan).encode('utf-8')) for plan in plans)
         
         # Calculate Blob Storage size
-        blob_service_client = get_blob_service_client()
-        container_client = blob_service_client.get_container_client("plans")
+        container_client = get_plans_container_client()
         
         blob_size_bytes = 0
         prefix = f"{project_id}/"
@@ -649,11 +831,11 @@ def calculate_disk_usage(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="delete_all_non_default_branch_plans", auth_level=func.AuthLevel.ANONYMOUS, methods=["DELETE"])
+@metered
 def delete_all_non_default_branch_plans(req: func.HttpRequest) -> func.HttpResponse:
     """Delete all plans for all non-default branches within a project."""
     import logging
     import os
-    from shared.storage import delete_plan_blob
     from shared.auth import verify_pat
 
     # --- Authentication Logic ---
@@ -702,26 +884,29 @@ def delete_all_non_default_branch_plans(req: func.HttpRequest) -> func.HttpRespo
         default_branch = project_doc.get('default_branch', 'develop')
         
         # Find all plans for branches other than default
-        plans_container = get_container("plans", "/id")
+        plans_container = get_plans_container()
         plans = list(plans_container.query_items(
-            query="SELECT c.id, c.blob_url, c.branch FROM c WHERE c.project_id = @pid AND c.branch != @default_branch",
+            query="SELECT c.id, c.project_id, c.blob_url, c.graph_url, c.branch FROM c WHERE c.project_id = @pid AND c.branch != @default_branch",
             parameters=[
                 {"name": "@pid", "value": project_id},
                 {"name": "@default_branch", "value": default_branch}
             ],
-            enable_cross_partition_query=True
+            **project_query_kwargs(project_id)
         ))
 
         deleted_count = 0
+        released_blobs = []
         for plan in plans:
-            blob_url = plan.get("blob_url")
-            if blob_url:
-                delete_plan_blob(blob_url)
             try:
-                plans_container.delete_item(item=plan['id'], partition_key=plan['id'])
+                delete_plan_doc(plans_container, plan)
                 deleted_count += 1
+                released_blobs.extend(plan_blob_urls(plan))
             except exceptions.CosmosResourceNotFoundError:
                 continue
+        # Blobs are shared between identical plans; release one reference per deleted plan
+        delete_plan_blobs(released_blobs)
+        remove_entries(project_id, "c.branch != @default_branch", [{"name": "@default_branch", "value": default_branch}])
+        bump_project_version(project_id)
 
         return func.HttpResponse(
             body=json.dumps({"message": f"Deleted {deleted_count} plans from non-default branches.", "deleted_count": deleted_count}),
@@ -736,6 +921,7 @@ def delete_all_non_default_branch_plans(req: func.HttpRequest) -> func.HttpRespo
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="test_slack_notification", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
+@metered
 def test_slack_notification(req: func.HttpRequest) -> func.HttpResponse:
     """Send a test message to the configured Slack webhook."""
     import logging
@@ -773,6 +959,7 @@ def test_slack_notification(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="update_project_settings", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
+@metered
 def update_project_settings(req: func.HttpRequest) -> func.HttpResponse:
     try:
         req_body = req.get_json()
@@ -784,6 +971,7 @@ def update_project_settings(req: func.HttpRequest) -> func.HttpResponse:
         container = get_container("projects")
         # Read existing project
         project_doc = container.read_item(item=settings_data.project_id, partition_key=settings_data.project_id)
+        previous_slot = schedule_slot(project_doc)
         
         # Update Fields
         if settings_data.description is not None:
@@ -805,6 +993,15 @@ def update_project_settings(req: func.HttpRequest) -> func.HttpResponse:
             project_doc['default_branch'] = settings_data.default_branch
 
         container.upsert_item(project_doc)
+        # Keep the timer's (weekday, hour) schedule index in step. The
+        # settings are saved either way; backfill_report_schedule repairs
+        # a missed index write.
+        try:
+            sync_project_schedule(project_doc, previous_slot)
+        except Exception as e:
+            import logging
+            logging.error(f"Failed to update report_schedule index for project {project_doc['id']}: {e}")
+        bump_project_version(project_doc['id'], catalog=True)
         
         return func.HttpResponse(
             body=json.dumps({"message": "Settings updated", "notifications": project_doc.get('notifications')}),
@@ -818,32 +1015,54 @@ def update_project_settings(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="list_pending_ingestions", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
+@metered
 def list_pending_ingestions(req: func.HttpRequest) -> func.HttpResponse:
     project_id = req.params.get('project_id')
     if not project_id:
         return func.HttpResponse("project_id param required", status_code=400)
-        
+
+    filters = {"endpoint": "list_pending_ingestions", "project_id": project_id}
     try:
-        container = get_container("plans", "/id")
+        page_size, page_state = page_params(req.params, filters, KEYSET_STATE)
+    except ValueError as e:
+        return func.HttpResponse(str(e), status_code=400)
+
+    etag = request_etag(req, "list_pending_ingestions", project_id)
+    cached = not_modified(req, etag)
+    if cached:
+        return cached
         
-        query = "SELECT c.id, c.project_id, c.component_name, c.environment, c.branch, c.timestamp FROM c WHERE c.project_id = @pid AND c.is_pending_approval = true ORDER BY c.timestamp DESC"
+    try:
+        container = get_plans_container()
+
+        select_fields = "c.id, c.project_id, c.component_name, c.environment, c.branch, c.timestamp, c.drift_summary"
+        where_clauses = ["c.project_id = @pid", "c.is_pending_approval = true"]
         parameters = [{"name": "@pid", "value": project_id}]
+        if page_size:
+            items, next_state = read_keyset_page(container, select_fields, where_clauses, parameters, page_size, page_state,
+                                                 **project_query_kwargs(project_id))
+            return func.HttpResponse(body=page_body(items, next_state, filters), status_code=200, mimetype="application/json",
+                                     headers=etag_headers(etag))
+
+        query = f"SELECT {select_fields} FROM c WHERE {' AND '.join(where_clauses)} ORDER BY c.timestamp DESC"
             
         items = list(container.query_items(
             query=query,
             parameters=parameters,
-            enable_cross_partition_query=True
+            **project_query_kwargs(project_id)
         ))
         
         return func.HttpResponse(
             body=json.dumps(items),
             status_code=200,
-            mimetype="application/json"
+            mimetype="application/json",
+            headers=etag_headers(etag)
         )
     except Exception as e:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="approve_ingestion", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
+@metered
 def approve_ingestion(req: func.HttpRequest) -> func.HttpResponse:
     try:
         req_body = req.get_json()
@@ -852,8 +1071,10 @@ def approve_ingestion(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(f"Invalid Request: {e}", status_code=400)
         
     try:
-        plans_container = get_container("plans", "/id")
-        plan_doc = plans_container.read_item(item=data.plan_id, partition_key=data.plan_id)
+        plans_container = get_plans_container()
+        plan_doc = find_plan(data.plan_id, data.project_id)
+        if plan_doc is None:
+            return func.HttpResponse("Plan not found", status_code=404)
         
         if not plan_doc.get("is_pending_approval"):
             return func.HttpResponse("Plan is not pending approval", status_code=400)
@@ -864,7 +1085,8 @@ def approve_ingestion(req: func.HttpRequest) -> func.HttpResponse:
         
         # 1. Update Environment if missing
         env = plan_doc.get("environment")
-        if env and env not in proj_doc.get("environments", []):
+        env_added = bool(env) and env not in proj_doc.get("environments", [])
+        if env_added:
             envs = proj_doc.get("environments", [])
             envs.append(env)
             proj_doc["environments"] = envs
@@ -893,11 +1115,19 @@ def approve_ingestion(req: func.HttpRequest) -> func.HttpResponse:
                 "excluded_environments": []
             }
             comp_container.upsert_item(new_comp)
+            invalidate_project_matcher(project_id)
             plan_doc["component_id"] = new_comp_id
             
         # 3. Mark plan as approved
         plan_doc["is_pending_approval"] = False
         plans_container.upsert_item(plan_doc)
+        try:
+            record_plan(plan_doc)
+        except Exception as e:
+            # The plan is approved; the index converges on the next ingest or backfill
+            import logging
+            logging.error(f"Failed to update latest_plans index: {e}")
+        bump_project_version(project_id, catalog=env_added)
         
         return func.HttpResponse(
             body=json.dumps({"message": "Approved successfully"}),
@@ -910,6 +1140,7 @@ def approve_ingestion(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 @bp.route(route="reject_ingestion", auth_level=func.AuthLevel.ANONYMOUS, methods=["POST"])
+@metered
 def reject_ingestion(req: func.HttpRequest) -> func.HttpResponse:
     try:
         req_body = req.get_json()
@@ -918,8 +1149,13 @@ def reject_ingestion(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(f"Invalid Request: {e}", status_code=400)
         
     try:
-        plans_container = get_container("plans", "/id")
-        plans_container.delete_item(item=data.plan_id, partition_key=data.plan_id)
+        plans_container = get_plans_container()
+        plan_doc = find_plan(data.plan_id, data.project_id)
+        if plan_doc is None:
+            return func.HttpResponse("Plan not found", status_code=404)
+        delete_plan_doc(plans_container, plan_doc)
+        delete_plan_blobs(plan_blob_urls(plan_doc))
+        bump_project_version(plan_doc.get("project_id"))
         
         return func.HttpResponse(
             body=json.dumps({"message": "Rejected successfully"}),
@@ -932,17 +1168,31 @@ def reject_ingestion(req: func.HttpRequest) -> func.HttpResponse:
         return func.HttpResponse(f"Error: {e}", status_code=500)
 
 
+EXPORT_FILENAME = "terraform-plans-export.zip"
+
+
+def _export_concurrency() -> int:
+    try:
+        return max(1, int(os.environ.get("EXPORT_DOWNLOAD_CONCURRENCY", "8")))
+    except ValueError:
+        return 8
+
+
 @bp.route(route="export_plans", auth_level=func.AuthLevel.ANONYMOUS, methods=["GET"])
-def export_plans(req: func.HttpRequest) -> func.HttpResponse:
+@metered
+async def export_plans(req: func.HttpRequest) -> func.HttpResponse:
     """
-    Downloads a ZIP file containing the latest full terraform plan JSON
-    for each component in the specified environment(s) and branch.
-    Query params: project_id (required), environment (required, comma-separated), branch (optional).
+    Builds a ZIP file containing the latest full terraform plan JSON
+    for each component in the specified environment(s) and branch, and
+    returns a short-lived download link to it ({url, expires_at, filename,
+    size, files}), or the archive itself with delivery=inline.
+    Query params: project_id (required), environment (required, comma-separated), branch (optional), delivery (optional: link|inline).
     """
     import zipfile
-    import io
     import logging
-    from shared.storage import download_plan_blob
+    from contextlib import aclosing
+    from shared.aio_storage import download_stored_blob_async, iter_plan_blobs
+    from shared.export_store import export_download_url, open_export_spool, take_export_bytes, write_plan_entry
 
     project_id = req.params.get('project_id')
     environment_param = req.params.get('environment')
@@ -954,109 +1204,154 @@ def export_plans(req: func.HttpRequest) -> func.HttpResponse:
     environments = [e.strip() for e in environment_param.split(',') if e.strip()]
 
     try:
-        container = get_container("plans", "/id")
-
-        # Build query: latest plan per component for given environment(s) + branch
-        where_clauses = [
-            "c.project_id = @pid",
-            "(NOT IS_DEFINED(c.is_pending_approval) OR c.is_pending_approval = false)"
-        ]
-        parameters = [{"name": "@pid", "value": project_id}]
+        container = await get_plans_container_async()
 
-        if len(environments) == 1:
-            where_clauses.append("c.environment = @env")
-            parameters.append({"name": "@env", "value": environments[0]})
-        else:
-            env_placeholders = []
-            for i, env in enumerate(environments):
-                param_name = f"@env{i}"
-                env_placeholders.append(param_name)
-                parameters.append({"name": param_name, "value": env})
-            where_clauses.append(f"c.environment IN ({', '.join(env_placeholders)})")
-
-        if branch:
-            where_clauses.append("c.branch = @branch")
-            parameters.append({"name": "@branch", "value": branch})
-
-        query = f"SELECT c.id, c.component_id, c.component_name, c.environment, c.timestamp, c.blob_url, c.resource_graph FROM c WHERE {' AND '.join(where_clauses)} ORDER BY c.timestamp DESC"
-
-        items = list(container.query_items(
-            query=query,
-            parameters=parameters,
-            enable_cross_partition_query=True
-        ))
-
-        # Pick latest plan per component+environment
+        # Latest plan per component+environment (for the branch, or across
+        # branches) from the latest_plans index: one single-partition query
+        entries = await get_latest_entries_async(project_id, branch=branch, environments=environments)
         latest = {}
-        for item in items:
-            key = f"{item.get('component_id', '')}-{item.get('environment', '')}"
-            if key not in latest:
-                latest[key] = item
+        for cid, per_env in latest_by_component_env(entries).items():
+            for env, entry in per_env.items():
+                latest[f"{cid}-{env}"] = dict(entry, id=entry['plan_id'])
+
+        # Resource graphs come from the graph store (entries carry graph_url);
+        # plans from before the split still embed them. Only which plans do is
+        # looked up here: graphs are fetched with their plan blob below
+        legacy_ids = [plan['id'] for plan in latest.values() if not plan.get('graph_url')]
+        if legacy_ids:
+            refs = await query_all(
+                container,
+                "SELECT c.id, c.graph_url, IS_DEFINED(c.resource_graph) AS embedded_graph FROM c "
+                "WHERE c.project_id = @pid AND ARRAY_CONTAINS(@ids, c.id)",
+                [{"name": "@pid", "value": project_id}, {"name": "@ids", "value": legacy_ids}],
+                **project_query_kwargs(project_id)
+            )
+            refs_by_id = {ref['id']: ref for ref in refs}
+            for plan in latest.values():
+                ref = refs_by_id.get(plan['id'])
+                if ref:
+                    plan['graph_url'] = ref.get('graph_url')
+                    plan['embedded_graph'] = ref.get('embedded_graph')
 
         if not latest:
             return func.HttpResponse("No plans found for the given filters", status_code=404)
 
-        # Build ZIP in memory
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for plan in latest.values():
-                blob_url = plan.get('blob_url')
-                comp_name = plan.get('component_name') or plan.get('component_id') or 'unknown'
-                env = plan.get('environment') or 'unknown'
-                # Sanitize filename
-                safe_name = "".join(c if c.isalnum() or c in ('-', '_') else '_' for c in comp_name)
-                safe_env = "".join(c if c.isalnum() or c in ('-', '_') else '_' for c in env)
-                filename = f"{safe_name}_{safe_env}.json"
-
-                if blob_url:
-                    blob_data = download_plan_blob(blob_url)
-                    if blob_data:
-                        zf.writestr(filename, blob_data)
-                    else:
+        async def load_graph(plan: dict) -> dict | None:
+            if plan.get('graph_url'):
+                return await load_plan_graph_async(plan)
+            if plan.get('embedded_graph'):
+                graphs = await query_all(
+                    container,
+                    "SELECT VALUE c.resource_graph FROM c WHERE c.project_id = @pid AND c.id = @id",
+                    [{"name": "@pid", "value": project_id}, {"name": "@id", "value": plan['id']}],
+                    **plan_query_kwargs(plan['id'], project_id)
+                )
+                return graphs[0] if graphs else None
+            return None
+
+        async def fetch(plan: dict):
+            # The plan blob (still compressed, None if missing) and the resource graph
+            return await asyncio.gather(download_stored_blob_async(plan.get('blob_url')), load_graph(plan))
+
+        # Stream the ZIP into a spool blob: each plan blob and resource graph
+        # is fetched `concurrency` entries ahead of the one being written and
+        # dropped once written, plans are decompressed into their entry chunk
+        # by chunk, and the archive is staged block by block as it grows. Blob
+        # I/O and compression run off the loop; memory stays at the fetch
+        # window plus one block.
+        concurrency = _export_concurrency()
+        spool = await asyncio.to_thread(open_export_spool, project_id)
+        zf = zipfile.ZipFile(spool, 'w', zipfile.ZIP_DEFLATED)
+        files = 0
+        try:
+            async with aclosing(iter_plan_blobs(list(latest.values()), concurrency, fetch)) as downloads:
+                async for plan, (stored, graph) in downloads:
+                    comp_name = plan.get('component_name') or plan.get('component_id') or 'unknown'
+                    env = plan.get('environment') or 'unknown'
+                    # Sanitize filename
+                    safe_name = "".join(c if c.isalnum() or c in ('-', '_') else '_' for c in comp_name)
+                    safe_env = "".join(c if c.isalnum() or c in ('-', '_') else '_' for c in env)
+                    filename = f"{safe_name}_{safe_env}.json"
+
+                    if not plan.get('blob_url'):
+                        logging.warning(f"No blob_url for plan {plan['id']}, skipping")
+                    elif stored is None:
                         logging.warning(f"Blob not found for plan {plan['id']}, skipping")
-                else:
-                    logging.warning(f"No blob_url for plan {plan['id']}, skipping")
-
-                # Generate .dot graph file from resource_graph
-                graph = plan.get('resource_graph')
-                if graph and graph.get('nodes'):
-                    dot_lines = [f'digraph "{comp_name} ({env})" {{', '  rankdir = "LR";']
-                    # Group nodes by type for subgraph clustering
-                    groups: dict[str, list] = {}
-                    for node in graph['nodes']:
-                        g = node.get('group') or node.get('type') or 'other'
-                        groups.setdefault(g, []).append(node)
-                    for idx, (group_name, nodes) in enumerate(sorted(groups.items())):
-                        dot_lines.append(f'  subgraph "cluster_{idx}" {{')
-                        dot_lines.append(f'    label = "{group_name}";')
-                        for node in nodes:
-                            node_id = node['id'].replace('"', '\\"')
-                            label = node.get('label', node['id']).replace('"', '\\"')
-                            dot_lines.append(f'    "{node_id}" [label="{label}"];')
-                        dot_lines.append('  }')
-                    # Deduplicate edges
-                    seen_edges: set[tuple[str, str]] = set()
-                    for edge in graph.get('edges', []):
-                        pair = (edge['source'], edge['target'])
-                        if pair not in seen_edges:
-                            seen_edges.add(pair)
-                            src = edge['source'].replace('"', '\\"')
-                            tgt = edge['target'].replace('"', '\\"')
-                            dot_lines.append(f'  "{src}" -> "{tgt}";')
-                    dot_lines.append('}')
-                    zf.writestr(f"{safe_name}_{safe_env}.dot", '\n'.join(dot_lines))
-
-        zip_bytes = zip_buffer.getvalue()
+                    else:
+                        await asyncio.to_thread(write_plan_entry, zf, filename, *stored)
+                        files += 1
+
+                    # Generate .dot graph file from resource_graph
+                    if graph and graph.get('nodes'):
+                        await asyncio.to_thread(zf.writestr, f"{safe_name}_{safe_env}.dot", _graph_dot(comp_name, env, graph))
+                        files += 1
+
+            await asyncio.to_thread(zf.close)
+            size = await asyncio.to_thread(spool.commit, EXPORT_FILENAME)
+        except BaseException:
+            spool.abort()
+            raise
+
+        # Inline delivery (opt-in) reads the spooled archive back into the
+        # response; by default only a short-lived link to it is returned
+        if (req.params.get('delivery') or os.environ.get("EXPORT_DELIVERY", "link")) != "inline":
+            try:
+                url, expires_at = await asyncio.to_thread(export_download_url, spool.blob_client, EXPORT_FILENAME)
+            except Exception as e:
+                logging.error(f"Could not sign export link: {e}")
+                return func.HttpResponse(f"Error: could not create the download link: {e}", status_code=503)
+            return func.HttpResponse(
+                json.dumps({
+                    "url": url,
+                    "expires_at": expires_at.isoformat(),
+                    "filename": EXPORT_FILENAME,
+                    "size": size,
+                    "files": files,
+                }),
+                status_code=200,
+                mimetype="application/json"
+            )
+
+        zip_bytes = await asyncio.to_thread(take_export_bytes, spool.blob_client)
 
         return func.HttpResponse(
             body=zip_bytes,
             status_code=200,
             mimetype="application/zip",
             headers={
-                "Content-Disposition": f"attachment; filename=terraform-plans-export.zip"
+                "Content-Disposition": f"attachment; filename={EXPORT_FILENAME}"
             }
         )
 
     except Exception as e:
         logging.error(f"Export plans error: {e}")
         return func.HttpResponse(f"Error: {e}", status_code=500)
+
+
+def _graph_dot(comp_name: str, env: str, graph: dict) -> str:
+    """A resource graph as a Graphviz digraph, nodes clustered by group/type."""
+    dot_lines = [f'digraph "{comp_name} ({env})" {{', '  rankdir = "LR";']
+    # Group nodes by type for subgraph clustering
+    groups: dict[str, list] = {}
+    for node in graph['nodes']:
+        g = node.get('group') or node.get('type') or 'other'
+        groups.setdefault(g, []).append(node)
+    for idx, (group_name, nodes) in enumerate(sorted(groups.items())):
+        dot_lines.append(f'  subgraph "cluster_{idx}" {{')
+        dot_lines.append(f'    label = "{group_name}";')
+        for node in nodes:
+            node_id = node['id'].replace('"', '\\"')
+            label = node.get('label', node['id']).replace('"', '\\"')
+            dot_lines.append(f'    "{node_id}" [label="{label}"];')
+        dot_lines.append('  }')
+    # Deduplicate edges
+    seen_edges: set[tuple[str, str]] = set()
+    for edge in graph.get('edges', []):
+        pair = (edge['source'], edge['target'])
+        if pair not in seen_edges:
+            seen_edges.add(pair)
+            src = edge['source'].replace('"', '\\"')
+            tgt = edge['target'].replace('"', '\\"')
+            dot_lines.append(f'  "{src}" -> "{tgt}";')
+    dot_lines.append('}')
+    return '\n'.join(dot_lines)
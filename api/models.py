@@ -41,9 +41,11 @@ class ManualIngestSchema(BaseModel):
 
 class ApproveIngestionSchema(BaseModel):
     plan_id: str
+    project_id: str | None = None
 
 class RejectIngestionSchema(BaseModel):
     plan_id: str
+    project_id: str | None = None
 
 class AuthSettingsSchema(BaseModel):
     auth_mode: str = "nextauth"
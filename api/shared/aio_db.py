@@ -0,0 +1,98 @@
+"""
+Async counterpart of shared/db.py on azure.cosmos.aio.
+
+`async def` handlers await Cosmos calls on the worker's event loop instead of
+holding a thread for each one, and can run independent reads concurrently
+with asyncio.gather(). The same per-process caching applies: one client,
+database proxy and (metered) container proxy per name.
+
+aio clients belong to the event loop they were created on. The Functions
+worker runs every async invocation on one loop; should the running loop
+change (tests, tools using asyncio.run()), the cache is rebuilt for it.
+
+Containers are created here with their declared index policy, but existing
+containers are only brought up to date by the sync get_container() (or
+tools/apply_index_policies), which every worker also runs.
+"""
+import asyncio
+import logging
+import os
+
+from azure.cosmos import PartitionKey, exceptions
+from azure.cosmos.aio import CosmosClient
+from azure.identity.aio import DefaultAzureCredential
+
+from shared.cosmos_metrics import MeteredContainer
+from shared.db import DATABASE_ID
+from shared.index_policies import index_policy
+
+_state: dict = {"loop": None}
+
+
+def _loop_state() -> dict:
+    loop = asyncio.get_running_loop()
+    if _state["loop"] is not loop:
+        _state.update(loop=loop, client=None, database=None, containers={}, lock=asyncio.Lock())
+    return _state
+
+
+def _create_client() -> CosmosClient:
+    conn_str = os.environ.get("CosmosDbConnectionSetting")
+
+    if conn_str:
+        # Emulator / Key-based
+        return CosmosClient.from_connection_string(conn_str, connection_verify=False)
+
+    # Managed Identity
+    endpoint = os.environ.get("CosmosDbConnectionSetting__accountEndpoint")
+    if not endpoint:
+        raise ValueError("No Cosmos DB connection string or endpoint found")
+
+    return CosmosClient(url=endpoint, credential=DefaultAzureCredential())
+
+
+async def get_async_database():
+    """Returns the TerradorianDB proxy of the running loop's client, creating the database once."""
+    state = _loop_state()
+    if state["database"] is None:
+        async with state["lock"]:
+            if state["database"] is None:
+                state["client"] = state["client"] or _create_client()
+                state["database"] = await state["client"].create_database_if_not_exists(id=DATABASE_ID)
+    return state["database"]
+
+
+async def get_async_container(container_name: str, partition_key_path: str = "/id"):
+    cached = _loop_state()["containers"].get(container_name)
+    if cached is not None:
+        return cached
+
+    database = await get_async_database()
+    state = _loop_state()
+    async with state["lock"]:
+        cached = state["containers"].get(container_name)
+        if cached is not None:
+            return cached
+
+        policy = index_policy(container_name)
+        try:
+            await database.create_container_if_not_exists(id=container_name, partition_key=PartitionKey(path=partition_key_path),
+                                                          **({"indexing_policy": policy} if policy else {}))
+        except Exception as e:
+            logging.warning(f"Could not ensure container '{container_name}' exists: {e}")
+
+        container = MeteredContainer(database.get_container_client(container_name), container_name)
+        state["containers"][container_name] = container
+        return container
+
+
+async def query_all(container, query: str, parameters: list | None = None, **query_kwargs) -> list:
+    """All results of a query (the async pager drained into a list)."""
+    return [item async for item in container.query_items(query=query, parameters=parameters or [], **query_kwargs)]
+
+
+async def read_item_or_none(container, item: str, partition_key) -> dict | None:
+    try:
+        return await container.read_item(item=item, partition_key=partition_key)
+    except exceptions.CosmosResourceNotFoundError:
+        return None
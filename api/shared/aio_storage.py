@@ -0,0 +1,167 @@
+"""
+Async counterpart of shared/storage.py on azure.storage.blob.aio.
+
+Same plan container, content-addressed layout and reference counting as the
+sync helpers (the reference documents are updated through shared/aio_db), so
+blobs written here are read and released by either side. Compression and
+decompression run in worker threads to keep the event loop free while a
+large plan is (de)compressed.
+
+As in shared/aio_db, clients belong to the running event loop.
+"""
+import asyncio
+import os
+
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.cosmos import exceptions as cosmos_exceptions
+from azure.identity.aio import DefaultAzureCredential
+from azure.storage.blob.aio import BlobServiceClient
+
+from shared.aio_db import get_async_container
+from shared.blob_codec import codec_from_properties, compress, decompress, get_default_codec
+from shared.storage import (
+    BLOB_REFS_CONTAINER, PLANS_CONTAINER, blob_name_from_url, blob_ref_id, plan_blob_content, plan_upload_options,
+)
+
+_state: dict = {"loop": None}
+
+
+def _loop_state() -> dict:
+    loop = asyncio.get_running_loop()
+    if _state["loop"] is not loop:
+        _state.update(loop=loop, service_client=None, plans_container_client=None, lock=asyncio.Lock())
+    return _state
+
+
+def _create_blob_service_client() -> BlobServiceClient:
+    # Same settings as shared/storage._create_blob_service_client
+    connection_string = os.environ.get("BlobStorageConnection")
+    if connection_string:
+        return BlobServiceClient.from_connection_string(connection_string)
+
+    account_name = os.environ.get("STORAGE_ACCOUNT_NAME")
+    if account_name:
+        return BlobServiceClient(account_url=f"https://{account_name}.blob.core.windows.net",
+                                 credential=DefaultAzureCredential())
+
+    return BlobServiceClient.from_connection_string("UseDevelopmentStorage=true", api_version="2019-12-12")
+
+
+def get_async_blob_service_client() -> BlobServiceClient:
+    state = _loop_state()
+    if state["service_client"] is None:
+        state["service_client"] = _create_blob_service_client()
+    return state["service_client"]
+
+
+async def get_async_plans_container_client():
+    """The 'plans' container client of the running loop; the container is created at most once."""
+    state = _loop_state()
+    if state["plans_container_client"] is None:
+        async with state["lock"]:
+            if state["plans_container_client"] is None:
+                container_client = get_async_blob_service_client().get_container_client(PLANS_CONTAINER)
+                try:
+                    await container_client.create_container()
+                except ResourceExistsError:
+                    pass
+                state["plans_container_client"] = container_client
+    return state["plans_container_client"]
+
+
+async def upload_plan_blob_async(plan_data: dict | bytes, project_id: str, plan_timestamp: str | None = None) -> str:
+    """upload_plan_blob() on the async clients. Returns the blob URL."""
+    blob_name, data_bytes = plan_blob_content(plan_data, project_id, plan_timestamp)
+    return await store_content_blob_async(project_id, blob_name, data_bytes)
+
+
+async def store_content_blob_async(project_id: str, blob_name: str, data_bytes: bytes) -> str:
+    """store_content_blob() on the async clients: takes a reference, writing the blob only for the first one."""
+    blob_client = (await get_async_plans_container_client()).get_blob_client(blob_name)
+
+    refs_container = await get_async_container(BLOB_REFS_CONTAINER, "/id")
+    ref_id = blob_ref_id(blob_name)
+
+    if await _add_blob_refs(refs_container, ref_id, 1):
+        return blob_client.url
+
+    # First reference: (re)write the blob and track its ETag (see store_content_blob)
+    codec = get_default_codec()
+    compressed = await asyncio.to_thread(compress, data_bytes, codec)
+    etag = (await blob_client.upload_blob(compressed, **plan_upload_options(codec))).get("etag")
+
+    try:
+        await refs_container.create_item({
+            "id": ref_id,
+            "project_id": project_id,
+            "blob_name": blob_name,
+            "refcount": 1,
+            "blob_etag": etag,
+        })
+    except cosmos_exceptions.CosmosResourceExistsError:
+        if not await _add_blob_refs(refs_container, ref_id, 1):
+            raise
+    return blob_client.url
+
+
+async def _add_blob_refs(refs_container, ref_id: str, delta: int) -> dict | None:
+    try:
+        return await refs_container.patch_item(
+            item=ref_id,
+            partition_key=ref_id,
+            patch_operations=[{"op": "incr", "path": "/refcount", "value": delta}]
+        )
+    except cosmos_exceptions.CosmosResourceNotFoundError:
+        return None
+
+
+async def download_plan_blob_async(blob_url: str) -> bytes | None:
+    """The (decompressed) JSON bytes of a plan or graph blob, or None if not found."""
+    stored = await download_stored_blob_async(blob_url)
+    if stored is None:
+        return None
+    return await asyncio.to_thread(decompress, *stored)
+
+
+async def download_stored_blob_async(blob_url: str) -> tuple[bytes, str] | None:
+    """The stored (still compressed) bytes of a plan or graph blob and their codec, or None if not found."""
+    blob_name = blob_name_from_url(blob_url) if blob_url else None
+    if not blob_name:
+        return None
+
+    blob_client = (await get_async_plans_container_client()).get_blob_client(blob_name)
+    try:
+        # decompress=False: see shared/storage._open_plan_download
+        downloader = await blob_client.download_blob(decompress=False)
+        data = await downloader.readall()
+    except ResourceNotFoundError:
+        return None
+    return data, codec_from_properties(downloader.properties)
+
+
+async def _stored_plan_blob(plan: dict) -> tuple[bytes, str] | None:
+    return await download_stored_blob_async(plan['blob_url']) if plan.get('blob_url') else None
+
+
+async def iter_plan_blobs(plans: list[dict], concurrency: int, fetch=_stored_plan_blob):
+    """
+    Yields (plan, await fetch(plan)) in order, keeping up to concurrency
+    fetches in flight: memory is bounded by the window, not by the number of
+    plans. The default fetch is the stored (compressed) plan blob, or None
+    for a missing URL or blob; the consumer decompresses each one as it
+    writes it.
+    """
+    concurrency = max(1, concurrency)
+    window = [asyncio.ensure_future(fetch(plan)) for plan in plans[:concurrency]]
+    try:
+        for i, plan in enumerate(plans):
+            data = await window[i]
+            window[i] = None
+            if i + concurrency < len(plans):
+                window.append(asyncio.ensure_future(fetch(plans[i + concurrency])))
+            yield plan, data
+    finally:
+        # The consumer stopped early (or failed): drop the downloads still running
+        for task in window:
+            if task is not None and not task.done():
+                task.cancel()
@@ -1,13 +1,11 @@
 import hashlib
 import logging
+from shared.aio_db import get_async_container
 from shared.db import get_container
 from azure.cosmos import exceptions
 
-def verify_pat(token_str: str) -> dict | None:
-    """
-    Verifies a PAT string format 'tdp_<project_id>_<secret>'.
-    Returns the Project Document if valid, None otherwise.
-    """
+def _parse_pat(token_str: str) -> tuple[str, str] | None:
+    """(project_id, sha256 of the full token) of a PAT string, None if malformed."""
     if not token_str or not token_str.startswith("tdp_"):
         logging.warning("Invalid PAT format")
         return None
@@ -17,29 +15,54 @@ def verify_pat(token_str: str) -> dict | None:
         logging.warning("Invalid PAT structure")
         return None
 
-    project_id = parts[1]
-    secret_part = parts[2]
-    
-    # Reconstruct the token to verify hash
-    # Note: web_api.py logic:
-    # pat = f"tdp_{project_id}_{random_part}"
-    # pat_hash = hashlib.sha256(pat.encode()).hexdigest()
-    
-    # We must verifying the hash of the FULL token string
-    pat_hash = hashlib.sha256(token_str.encode()).hexdigest()
+    # The hash stored by generate_pat is that of the FULL token string
+    # (pat = f"tdp_{project_id}_{random_part}")
+    return parts[1], hashlib.sha256(token_str.encode()).hexdigest()
+
+
+def _token_matches(project_doc: dict, pat_hash: str) -> bool:
+    for t in project_doc.get('tokens', []):
+        if t.get('hash') == pat_hash:
+            return True
+    logging.warning(f"PAT hash not found for project {project_doc.get('id')}")
+    return False
+
+
+def verify_pat(token_str: str) -> dict | None:
+    """
+    Verifies a PAT string format 'tdp_<project_id>_<secret>'.
+    Returns the Project Document if valid, None otherwise.
+    """
+    parsed = _parse_pat(token_str)
+    if not parsed:
+        return None
+    project_id, pat_hash = parsed
 
     try:
         container = get_container("projects")
         # Optimization: Fetch partition key directly since we extracted ID
         project_doc = container.read_item(item=project_id, partition_key=project_id)
-        
-        tokens = project_doc.get('tokens', [])
-        for t in tokens:
-            if t.get('hash') == pat_hash:
-                return project_doc
-                
-        logging.warning(f"PAT hash not found for project {project_id}")
+        return project_doc if _token_matches(project_doc, pat_hash) else None
+
+    except exceptions.CosmosResourceNotFoundError:
+        logging.warning(f"Project {project_id} not found during auth")
         return None
+    except Exception as e:
+        logging.error(f"Auth error: {e}")
+        return None
+
+
+async def verify_pat_async(token_str: str) -> dict | None:
+    """verify_pat() on the async data layer."""
+    parsed = _parse_pat(token_str)
+    if not parsed:
+        return None
+    project_id, pat_hash = parsed
+
+    try:
+        container = await get_async_container("projects")
+        project_doc = await container.read_item(item=project_id, partition_key=project_id)
+        return project_doc if _token_matches(project_doc, pat_hash) else None
 
     except exceptions.CosmosResourceNotFoundError:
         logging.warning(f"Project {project_id} not found during auth")
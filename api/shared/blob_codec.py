@@ -0,0 +1,112 @@
+"""
+Compression codecs for plan blobs.
+
+Plans are written with the codec named by PLAN_BLOB_CODEC (gzip by default;
+zstd when the optional `zstandard` package is installed; identity to disable)
+and the codec is recorded in the blob's metadata and Content-Encoding, so
+readers can decompress transparently. Blobs written before compression was
+introduced carry neither and are read as identity.
+"""
+import gzip
+import io
+import logging
+import os
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+CODEC_METADATA_KEY = "codec"
+IDENTITY = "identity"
+GZIP = "gzip"
+ZSTD = "zstd"
+SUPPORTED_CODECS = (IDENTITY, GZIP, ZSTD)
+
+
+def get_default_codec() -> str:
+    codec = os.environ.get("PLAN_BLOB_CODEC", GZIP).strip().lower() or GZIP
+    if codec not in SUPPORTED_CODECS:
+        logging.warning(f"Unknown PLAN_BLOB_CODEC '{codec}', falling back to gzip")
+        return GZIP
+    if codec == ZSTD and zstandard is None:
+        logging.warning("PLAN_BLOB_CODEC=zstd but the 'zstandard' package is not installed, falling back to gzip")
+        return GZIP
+    return codec
+
+
+def content_encoding(codec: str) -> str | None:
+    """Content-Encoding header value for codec (None for identity)."""
+    return None if codec == IDENTITY else codec
+
+
+def codec_from_properties(properties) -> str:
+    """Reads the codec of a blob from its BlobProperties (metadata first, then Content-Encoding)."""
+    metadata = getattr(properties, "metadata", None) or {}
+    codec = metadata.get(CODEC_METADATA_KEY)
+    if not codec:
+        content_settings = getattr(properties, "content_settings", None)
+        codec = getattr(content_settings, "content_encoding", None) or IDENTITY
+    return codec.lower()
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == GZIP:
+        # mtime=0 keeps the output deterministic for identical plans
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if codec == ZSTD:
+        _require_zstd()
+        return zstandard.ZstdCompressor(level=6).compress(data)
+    return bytes(data)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == GZIP:
+        return gzip.decompress(data)
+    if codec == ZSTD:
+        _require_zstd()
+        # Streaming decompressor: frames written by stream writers may not record their content size
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+def open_decompressed(chunks, codec: str) -> io.BufferedIOBase:
+    """
+    Wraps an iterable of compressed byte chunks (e.g. StorageStreamDownloader.chunks())
+    in a readable file object that yields the decompressed bytes incrementally.
+    """
+    raw = io.BufferedReader(_ChunkReader(chunks))
+    if codec == GZIP:
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    if codec == ZSTD:
+        _require_zstd()
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw))
+    return raw
+
+
+def _require_zstd() -> None:
+    if zstandard is None:
+        raise RuntimeError("zstd-compressed blob found but the 'zstandard' package is not installed")
+
+
+class _ChunkReader(io.RawIOBase):
+    """Minimal raw stream over an iterator of byte chunks."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
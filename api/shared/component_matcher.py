@@ -0,0 +1,144 @@
+"""
+Multi-pattern component-name matcher for the heuristic dependency scan.
+
+The previous scan tested every component name against every plan string with
+`name in text`, i.e. O(strings x components x length). ComponentMatcher
+compiles all names of a project into one trie-shaped regular expression, so
+each string is scanned once, position by position, in C. Matchers are cached
+per project and invalidated whenever a component is created, renamed or
+deleted.
+"""
+import os
+import re
+import threading
+import time
+from typing import Awaitable, Callable, Iterable
+
+
+class ComponentMatcher:
+    """
+    Finds every component whose (lower-cased) name occurs in a string.
+
+    component_names maps lower-cased component names to component ids, the
+    same shape as the old `comp_map`.
+    """
+
+    def __init__(self, component_names: dict[str, str]):
+        self.component_names = {name.lower(): cid for name, cid in component_names.items() if name}
+        self._regex = None
+        # implied[name] = ids of all component names occurring inside `name` (itself included)
+        self._implied: dict[str, frozenset] = {}
+
+        if not self.component_names:
+            return
+
+        trie: dict = {}
+        for name in self.component_names:
+            node = trie
+            for ch in name:
+                node = node.setdefault(ch, {})
+            node[""] = True
+
+        # A trie-shaped alternation matches the longest name starting at each
+        # position; the lookahead makes matches zero-width so overlapping
+        # names are all reported.
+        self._regex = re.compile(f"(?=({self._node_pattern(trie)}))")
+
+        # Shorter names nested in a longer match (prefixes at the same start,
+        # or names later in the string) are resolved at build time, shortest
+        # names first, so scanning only ever needs the longest match.
+        for name in sorted(self.component_names, key=len):
+            implied = {self.component_names[name]}
+            # prefixes of `name`
+            node = trie
+            for i, ch in enumerate(name[:-1]):
+                node = node[ch]
+                if "" in node:
+                    implied |= self._implied[name[:i + 1]]
+            # longest names starting at later positions of `name`
+            for m in self._regex.finditer(name, 1):
+                implied |= self._implied[m.group(1)]
+            self._implied[name] = frozenset(implied)
+
+    @classmethod
+    def _node_pattern(cls, node: dict) -> str:
+        alternatives = [re.escape(ch) + cls._node_pattern(child) for ch, child in sorted(node.items()) if ch != ""]
+        if not alternatives:
+            return ""
+        pattern = alternatives[0] if len(alternatives) == 1 else f"(?:{'|'.join(alternatives)})"
+        if "" in node:
+            # Greedy optional: prefer the longer name, fall back to this one
+            pattern = f"(?:{pattern})?"
+        return pattern
+
+    def find(self, text) -> set[str]:
+        """Returns the ids of all components whose name occurs in text (case-insensitive)."""
+        found: set[str] = set()
+        self.scan_into(text, found)
+        return found
+
+    def scan_into(self, text, found: set) -> None:
+        if self._regex is None or not isinstance(text, str):
+            return
+        implied = self._implied
+        seen = set()
+        for m in self._regex.finditer(text.lower()):
+            name = m.group(1)
+            if name not in seen:
+                seen.add(name)
+                found |= implied[name]
+
+
+# --- Per-project cache ---------------------------------------------------------
+# Other workers are not notified of invalidations, so entries also expire after
+# COMPONENT_MATCHER_TTL_SECONDS.
+
+_lock = threading.Lock()
+_matchers: dict[str, tuple[float, ComponentMatcher]] = {}
+
+
+def _ttl_seconds() -> float:
+    try:
+        return float(os.environ.get("COMPONENT_MATCHER_TTL_SECONDS", "300"))
+    except ValueError:
+        return 300.0
+
+
+def get_project_matcher(project_id: str, load_components: Callable[[], Iterable[dict]]) -> ComponentMatcher:
+    """
+    Returns the cached matcher for project_id, building it from
+    load_components() (dicts with 'id' and 'name') on a miss or expiry.
+    """
+    now = time.monotonic()
+    matcher = _cached_matcher(project_id, now)
+    return matcher if matcher is not None else _store_matcher(project_id, now, load_components())
+
+
+async def get_project_matcher_async(project_id: str,
+                                    load_components: Callable[[], Awaitable[Iterable[dict]]]) -> ComponentMatcher:
+    """get_project_matcher() with an async loader."""
+    now = time.monotonic()
+    matcher = _cached_matcher(project_id, now)
+    return matcher if matcher is not None else _store_matcher(project_id, now, await load_components())
+
+
+def _cached_matcher(project_id: str, now: float) -> ComponentMatcher | None:
+    entry = _matchers.get(project_id)
+    if entry and now - entry[0] < _ttl_seconds():
+        return entry[1]
+    return None
+
+
+def _store_matcher(project_id: str, now: float, components: Iterable[dict]) -> ComponentMatcher:
+    matcher = ComponentMatcher({c['name'].lower(): c['id'] for c in components if c.get('name')})
+    with _lock:
+        _matchers[project_id] = (now, matcher)
+    return matcher
+
+
+def invalidate_project_matcher(project_id: str | None) -> None:
+    """Drops the cached matcher after a component is created, renamed or deleted."""
+    if not project_id:
+        return
+    with _lock:
+        _matchers.pop(project_id, None)
@@ -0,0 +1,292 @@
+"""
+Request-unit and latency accounting for Cosmos DB calls.
+
+get_container() (shared/db.py) and get_async_container() (shared/aio_db.py)
+return MeteredContainer proxies. Every
+query_items / read_item / create_item / upsert_item / replace_item /
+patch_item / delete_item call is recorded with its request charge
+(x-ms-request-charge), latency, page count and item count, tagged with:
+
+* the endpoint: the function wrapped by @metered (set on every HTTP route and
+  timer), carried in a context variable. Work fanned out to thread pools is
+  attributed to it when the pool runs propagate_context(fn); asyncio tasks
+  and asyncio.to_thread() inherit the context on their own;
+* a fingerprint: the operation and container for point operations, a hash
+  of the normalized query text (numbers replaced by ?) for queries.
+
+Queries are paged lazily, so their charge and item counts are added page by
+page as the caller consumes them (from the SDK's per-page response_hook) and
+their latency runs from the call to the last page received.
+
+At the end of each invocation @metered adds the totals to HTTP responses
+(X-Cosmos-Request-Charge, X-Cosmos-Duration-Ms, X-Cosmos-Calls), logs one
+`cosmos_usage` JSON line, and folds the calls into this worker's
+per-(endpoint, operation, fingerprint) table served by GET /api/cosmos_metrics.
+"""
+import contextvars
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import re
+import threading
+import time
+
+import azure.functions as func
+
+# Distinct (endpoint, operation, fingerprint) rows kept per worker; later ones are folded into "other"
+MAX_METRIC_ROWS = 500
+
+_current: contextvars.ContextVar["RequestUsage | None"] = contextvars.ContextVar("cosmos_request_usage", default=None)
+
+_lock = threading.Lock()
+_metrics: dict[tuple[str, str, str], dict] = {}
+_started_at = time.time()
+
+
+def query_fingerprint(query: str) -> tuple[str, str]:
+    """(fingerprint, normalized query) of a query text; literals that vary per call are masked."""
+    normalized = re.sub(r"\s+", " ", query).strip()
+    normalized = re.sub(r"\b\d+\b", "?", normalized)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:12], normalized
+
+
+class CallStats:
+    __slots__ = ("operation", "container", "fingerprint", "query", "request_charge", "duration_ms", "pages", "items",
+                 "_started")
+
+    def __init__(self, operation: str, container: str, fingerprint: str, query: str | None = None):
+        self.operation = operation
+        self.container = container
+        self.fingerprint = fingerprint
+        self.query = query
+        self.request_charge = 0.0
+        self.duration_ms = 0.0
+        self.pages = 0
+        self.items = 0
+        self._started = time.monotonic()
+
+    def add_page(self, headers, items: int | None = None) -> None:
+        try:
+            self.request_charge += float(headers.get("x-ms-request-charge") or 0)
+            self.items += int(headers.get("x-ms-item-count") or 0) if items is None else items
+        except (TypeError, ValueError):
+            pass
+        self.pages += 1
+        self.stop()
+
+    def stop(self) -> None:
+        self.duration_ms = (time.monotonic() - self._started) * 1000
+
+
+class RequestUsage:
+    """The Cosmos calls of one function invocation (shared by the threads it fans out to)."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.calls: list[CallStats] = []
+        self._lock = threading.Lock()
+
+    def add(self, call: CallStats) -> None:
+        with self._lock:
+            self.calls.append(call)
+
+    def totals(self) -> dict:
+        with self._lock:
+            calls = list(self.calls)
+        return {
+            "calls": len(calls),
+            "request_charge": round(sum(c.request_charge for c in calls), 2),
+            "duration_ms": round(sum(c.duration_ms for c in calls), 1),
+            "pages": sum(c.pages for c in calls),
+            "items": sum(c.items for c in calls),
+        }
+
+    def headers(self) -> dict:
+        totals = self.totals()
+        return {
+            "X-Cosmos-Request-Charge": str(totals["request_charge"]),
+            "X-Cosmos-Duration-Ms": str(totals["duration_ms"]),
+            "X-Cosmos-Calls": str(totals["calls"]),
+        }
+
+
+def _record_call(call: CallStats) -> None:
+    usage = _current.get()
+    if usage is not None:
+        usage.add(call)
+    else:
+        # Outside a metered invocation (tools, module-level bootstrap)
+        _fold("(none)", [call])
+
+
+def _fold(endpoint: str, calls: list[CallStats]) -> None:
+    with _lock:
+        for call in calls:
+            key = (endpoint, call.operation, call.fingerprint)
+            row = _metrics.get(key)
+            if row is None:
+                if len(_metrics) >= MAX_METRIC_ROWS:
+                    key = (endpoint, call.operation, "other")
+                    row = _metrics.get(key)
+                if row is None:
+                    row = _metrics[key] = {
+                        "endpoint": endpoint, "operation": call.operation, "container": call.container,
+                        "fingerprint": key[2], "query": call.query if key[2] != "other" else None,
+                        "calls": 0, "request_charge": 0.0, "max_request_charge": 0.0,
+                        "duration_ms": 0.0, "pages": 0, "items": 0,
+                    }
+            row["calls"] += 1
+            row["request_charge"] += call.request_charge
+            row["max_request_charge"] = max(row["max_request_charge"], call.request_charge)
+            row["duration_ms"] += call.duration_ms
+            row["pages"] += call.pages
+            row["items"] += call.items
+
+
+def get_metrics(top: int = 50, sort: str = "request_charge") -> dict:
+    """This worker's per-(endpoint, operation, fingerprint) totals, biggest first."""
+    with _lock:
+        rows = [dict(row) for row in _metrics.values()]
+    for row in rows:
+        row["request_charge"] = round(row["request_charge"], 2)
+        row["avg_request_charge"] = round(row["request_charge"] / row["calls"], 2) if row["calls"] else 0.0
+        row["duration_ms"] = round(row["duration_ms"], 1)
+    if rows and sort not in rows[0]:
+        raise ValueError(f"sort must be one of: {', '.join(sorted(rows[0]))}")
+    rows.sort(key=lambda row: row[sort] or 0, reverse=True)
+    return {"since": _started_at, "rows": rows[:top], "total_rows": len(rows)}
+
+
+class MeteredContainer:
+    """ContainerProxy wrapper recording every data call; anything else is passed through."""
+
+    _POINT_OPERATIONS = ("read_item", "create_item", "upsert_item", "replace_item", "patch_item", "delete_item")
+
+    def __init__(self, container, name: str):
+        self._container = container
+        self._name = name
+
+    def __getattr__(self, attr):
+        target = getattr(self._container, attr)
+        if attr in self._POINT_OPERATIONS:
+            if inspect.iscoroutinefunction(target):
+                return functools.partial(self._async_point_operation, attr, target)
+            return functools.partial(self._point_operation, attr, target)
+        return target
+
+    def _hooked_call(self, operation: str, kwargs: dict) -> CallStats:
+        call = CallStats(operation, self._name, f"{operation}:{self._name}")
+        user_hook = kwargs.pop("response_hook", None)
+
+        def hook(headers, result):
+            call.add_page(headers, items=1 if result is not None else 0)
+            if user_hook:
+                user_hook(headers, result)
+
+        kwargs["response_hook"] = hook
+        return call
+
+    @staticmethod
+    def _end_call(call: CallStats) -> None:
+        if call.pages == 0:
+            # Failed: errors carry no hook call
+            call.stop()
+        _record_call(call)
+
+    def _point_operation(self, operation: str, target, *args, **kwargs):
+        call = self._hooked_call(operation, kwargs)
+        try:
+            return target(*args, **kwargs)
+        finally:
+            self._end_call(call)
+
+    async def _async_point_operation(self, operation: str, target, *args, **kwargs):
+        call = self._hooked_call(operation, kwargs)
+        try:
+            return await target(*args, **kwargs)
+        finally:
+            self._end_call(call)
+
+    def query_items(self, *args, **kwargs):
+        # Returns the SDK's (async) pager unchanged; sync and aio alike
+        query = kwargs.get("query", args[0] if args else "")
+        fingerprint, normalized = query_fingerprint(str(query))
+        call = CallStats("query_items", self._name, fingerprint, normalized)
+        user_hook = kwargs.pop("response_hook", None)
+
+        def hook(headers, result):
+            call.add_page(headers)
+            if user_hook:
+                user_hook(headers, result)
+
+        _record_call(call)
+        return self._container.query_items(*args, response_hook=hook, **kwargs)
+
+
+def metered(fn):
+    """Attributes the Cosmos calls of a function invocation to it (see module docstring)."""
+    endpoint = fn.__name__
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            # Tasks created inside copy the context, so gathered calls report here too
+            usage = RequestUsage(endpoint)
+            token = _current.set(usage)
+            try:
+                result = await fn(*args, **kwargs)
+            finally:
+                _current.reset(token)
+                _finish(usage)
+            return _with_usage_headers(result, usage)
+
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        usage = RequestUsage(endpoint)
+        token = _current.set(usage)
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+            _finish(usage)
+        return _with_usage_headers(result, usage)
+
+    return wrapper
+
+
+def _with_usage_headers(result, usage: RequestUsage):
+    if isinstance(result, func.HttpResponse) and usage.calls:
+        for name, value in usage.headers().items():
+            result.headers[name] = value
+    return result
+
+
+def _finish(usage: RequestUsage) -> None:
+    if not usage.calls:
+        return
+    _fold(usage.endpoint, list(usage.calls))
+    totals = usage.totals()
+    # The costliest call shapes of this invocation
+    by_fingerprint: dict[str, dict] = {}
+    for call in usage.calls:
+        entry = by_fingerprint.setdefault(call.fingerprint, {"fingerprint": call.fingerprint, "operation": call.operation,
+                                                             "calls": 0, "request_charge": 0.0})
+        entry["calls"] += 1
+        entry["request_charge"] = round(entry["request_charge"] + call.request_charge, 2)
+    top = sorted(by_fingerprint.values(), key=lambda e: e["request_charge"], reverse=True)[:5]
+    logging.info(json.dumps({"event": "cosmos_usage", "endpoint": usage.endpoint, **totals, "top": top}))
+
+
+def propagate_context(fn):
+    """fn wrapped to run in a copy of the caller's context, so pool threads report into the current invocation."""
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
@@ -0,0 +1,135 @@
+"""
+Data versions for conditional GETs on the list endpoints.
+
+Every write that changes what a project's list endpoints return (ingest,
+approve/reject, plan/component/environment/branch deletes, component,
+environment, token and settings changes) calls bump_project_version() after
+its write. A version is a tiny document in `data_versions` (one per project,
+plus CATALOG_SCOPE for the project list served by list_projects); each bump
+rewrites it, which gives it a new `_etag`.
+
+List endpoints derive their ETag from that `_etag` and the request's
+parameters, read with a ~1 RU point read *before* querying: a write racing
+the query can only leave the ETag older than the body (the next request
+refetches), never newer. A matching If-None-Match is answered with 304
+without running the query.
+
+ETags also roll over every hour, which bounds staleness should a bump fail
+(bumps are best-effort: the write itself already succeeded) and moves the
+`days` window of list_plans along.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+
+import azure.functions as func
+
+from azure.cosmos import exceptions
+
+from shared.aio_db import get_async_container, read_item_or_none
+from shared.db import get_container
+
+VERSIONS_CONTAINER = "data_versions"
+CATALOG_SCOPE = "_projects"
+
+# Browsers and the web proxy may store the response but must revalidate it
+CACHE_CONTROL = "private, no-cache"
+
+
+def _container():
+    return get_container(VERSIONS_CONTAINER, "/id")
+
+
+def bump_version(scope: str) -> None:
+    _container().upsert_item(_version_doc(scope))
+
+
+def _version_doc(scope: str) -> dict:
+    return {"id": scope, "updated_at": datetime.now(timezone.utc).isoformat()}
+
+
+def _scopes(project_id: str | None, catalog: bool) -> list[str]:
+    return ([project_id] if project_id else []) + ([CATALOG_SCOPE] if catalog else [])
+
+
+def bump_project_version(project_id: str | None, catalog: bool = False) -> None:
+    """
+    Invalidates the cached list responses of a project (and of list_projects
+    when catalog is set, i.e. the write changed a field list_projects returns).
+    Never raises.
+    """
+    for scope in _scopes(project_id, catalog):
+        try:
+            bump_version(scope)
+        except Exception as e:
+            logging.error(f"Failed to bump data version of '{scope}': {e}")
+
+
+async def bump_project_version_async(project_id: str | None, catalog: bool = False) -> None:
+    for scope in _scopes(project_id, catalog):
+        try:
+            await (await get_async_container(VERSIONS_CONTAINER, "/id")).upsert_item(_version_doc(scope))
+        except Exception as e:
+            logging.error(f"Failed to bump data version of '{scope}': {e}")
+
+
+def read_version(scope: str) -> str:
+    """The current version token of scope ("0" if it was never bumped)."""
+    try:
+        doc = _container().read_item(item=scope, partition_key=scope)
+    except exceptions.CosmosResourceNotFoundError:
+        return "0"
+    return doc["_etag"].strip('"')
+
+
+def request_etag(req: func.HttpRequest, endpoint: str, scope: str | None) -> str | None:
+    """
+    The ETag of a list request, or None if it cannot be validated (no scope,
+    or the version could not be read: the request is then served uncached).
+    """
+    if not scope:
+        return None
+    try:
+        version = read_version(scope)
+    except Exception as e:
+        logging.warning(f"Could not read data version of '{scope}': {e}")
+        return None
+    return _etag(req, endpoint, scope, version)
+
+
+async def request_etag_async(req: func.HttpRequest, endpoint: str, scope: str | None) -> str | None:
+    """request_etag() on the async data layer."""
+    if not scope:
+        return None
+    try:
+        doc = await read_item_or_none(await get_async_container(VERSIONS_CONTAINER, "/id"), scope, scope)
+    except Exception as e:
+        logging.warning(f"Could not read data version of '{scope}': {e}")
+        return None
+    return _etag(req, endpoint, scope, doc["_etag"].strip('"') if doc else "0")
+
+
+def _etag(req: func.HttpRequest, endpoint: str, scope: str, version: str) -> str:
+    hour = datetime.now(timezone.utc).strftime("%Y%m%d%H")
+    key = json.dumps([endpoint, scope, version, hour, sorted(req.params.items())])
+    # Weak: equal versions give equivalent, not byte-identical, JSON
+    return f'W/"{hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def etag_headers(etag: str | None) -> dict | None:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL} if etag else None
+
+
+def not_modified(req: func.HttpRequest, etag: str | None) -> func.HttpResponse | None:
+    """A 304 response if the request's If-None-Match matches etag, else None."""
+    if not etag:
+        return None
+    header = req.headers.get("If-None-Match")
+    if not header:
+        return None
+    # Weak comparison (RFC 9110 13.1.2): ignore W/ prefixes
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    if "*" in candidates or etag.removeprefix("W/") in candidates:
+        return func.HttpResponse(status_code=304, headers=etag_headers(etag))
+    return None
@@ -1,28 +1,108 @@
 import os
+import logging
+import threading
 from azure.cosmos import CosmosClient, PartitionKey
 from azure.identity import DefaultAzureCredential
+from shared.cosmos_metrics import MeteredContainer
+from shared.index_policies import apply_enabled, ensure_index_policy, index_policy
 
-def get_container(container_name: str, partition_key_path: str = "/id"):
+DATABASE_ID = "TerradorianDB"
+
+# One client, database proxy and container-proxy cache per worker process.
+# CosmosClient is thread-safe and keeps its own connection pool, so reusing it
+# avoids a TLS handshake and the create_*_if_not_exists round trips on every call.
+_lock = threading.Lock()
+_client: CosmosClient | None = None
+_database = None
+_containers: dict = {}
+_stats = {"hits": 0, "misses": 0, "clients_created": 0}
+
+
+def _create_client() -> CosmosClient:
     conn_str = os.environ.get("CosmosDbConnectionSetting")
-    
+
     if conn_str:
         # Emulator / Key-based
-        client = CosmosClient.from_connection_string(conn_str, connection_verify=False)
-    else:
-        # Managed Identity
-        endpoint = os.environ.get("CosmosDbConnectionSetting__accountEndpoint")
-        if not endpoint:
-            raise ValueError("No Cosmos DB connection string or endpoint found")
-            
-        credential = DefaultAzureCredential()
-        client = CosmosClient(url=endpoint, credential=credential)
-
-    database = client.create_database_if_not_exists(id="TerradorianDB")
-    
-    # helper to ensure container existence
-    try:
-        database.create_container_if_not_exists(id=container_name, partition_key=PartitionKey(path=partition_key_path))
-    except Exception:
-        pass
-        
-    return database.get_container_client(container_name)
+        return CosmosClient.from_connection_string(conn_str, connection_verify=False)
+
+    # Managed Identity
+    endpoint = os.environ.get("CosmosDbConnectionSetting__accountEndpoint")
+    if not endpoint:
+        raise ValueError("No Cosmos DB connection string or endpoint found")
+
+    credential = DefaultAzureCredential()
+    return CosmosClient(url=endpoint, credential=credential)
+
+
+def get_client() -> CosmosClient:
+    """Returns the process-wide CosmosClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = _create_client()
+                _stats["clients_created"] += 1
+    return _client
+
+
+def get_database():
+    """Returns the TerradorianDB proxy, creating the database once per process."""
+    global _database
+    if _database is None:
+        client = get_client()
+        with _lock:
+            if _database is None:
+                _database = client.create_database_if_not_exists(id=DATABASE_ID)
+    return _database
+
+
+def get_container(container_name: str, partition_key_path: str = "/id"):
+    cached = _containers.get(container_name)
+    if cached is not None:
+        _stats["hits"] += 1
+        return cached
+
+    database = get_database()
+    with _lock:
+        cached = _containers.get(container_name)
+        if cached is not None:
+            _stats["hits"] += 1
+            return cached
+
+        _stats["misses"] += 1
+        # helper to ensure container existence (with its declared index policy)
+        partition_key = PartitionKey(path=partition_key_path)
+        policy = index_policy(container_name)
+        try:
+            database.create_container_if_not_exists(id=container_name, partition_key=partition_key,
+                                                    **({"indexing_policy": policy} if policy else {}))
+        except Exception as e:
+            logging.warning(f"Could not ensure container '{container_name}' exists: {e}")
+
+        container = database.get_container_client(container_name)
+        # Existing containers keep their policy until it is replaced (once per process)
+        if policy and apply_enabled():
+            ensure_index_policy(database, container, container_name, partition_key)
+        # RU / latency accounting per endpoint (shared/cosmos_metrics.py)
+        container = MeteredContainer(container, container_name)
+        _containers[container_name] = container
+        return container
+
+
+def get_cache_stats() -> dict:
+    """Hit/miss counters for the container cache (exposed on /api/health)."""
+    return {
+        "hits": _stats["hits"],
+        "misses": _stats["misses"],
+        "clients_created": _stats["clients_created"],
+        "cached_containers": sorted(_containers.keys()),
+    }
+
+
+def reset_cache() -> None:
+    """Drops the cached client and proxies (e.g. after credential rotation)."""
+    global _client, _database
+    with _lock:
+        _client = None
+        _database = None
+        _containers.clear()
@@ -0,0 +1,64 @@
+"""
+Canonical drift counters of a plan.
+
+Ingest, the drift alert, the weekly email, the Slack reports and the UI all
+need "how many resources will be created / updated / ...". Instead of each
+recounting `terraform_plan.resource_changes`, PlanAnalyzer computes a
+`drift_summary` once per plan and it is stored on the plan document and on
+its latest_plans entry:
+
+    {"create": 2, "update": 1, "delete": 0, "replace": 1, "read": 0,
+     "no_op": 40, "import": 0, "move": 1}
+
+Every resource falls in exactly one of create/update/delete/replace/read/
+no_op (replace = delete and create in one action set). import and move are
+counted on top, from `change.importing` and `previous_address`, since an
+imported or moved resource may also be updated.
+
+tools/backfill_drift_summary adds the counters to plans ingested before
+they existed.
+"""
+
+ACTION_KEYS = ("create", "update", "delete", "replace", "read", "no_op")
+DRIFT_SUMMARY_KEYS = ACTION_KEYS + ("import", "move")
+
+
+def empty_drift_summary() -> dict[str, int]:
+    return {key: 0 for key in DRIFT_SUMMARY_KEYS}
+
+
+def action_bucket(actions: list[str]) -> str:
+    """The ACTION_KEYS bucket of one resource change's action set."""
+    if 'create' in actions and 'delete' in actions:
+        return "replace"
+    for action in ("create", "update", "delete", "read"):
+        if action in actions:
+            return action
+    return "no_op"
+
+
+def add_resource_change(summary: dict[str, int], rc: dict) -> None:
+    """Counts one resource change (full or pruned form) into summary."""
+    change = rc.get('change') or {}
+    summary[action_bucket(change.get('actions') or [])] += 1
+    if change.get('importing'):
+        summary["import"] += 1
+    if rc.get('previous_address'):
+        summary["move"] += 1
+
+
+def summarize_resource_changes(resource_changes: list | None) -> dict[str, int]:
+    summary = empty_drift_summary()
+    for rc in resource_changes or []:
+        add_resource_change(summary, rc)
+    return summary
+
+
+def changed_resources(summary: dict) -> int:
+    """Resources whose actions include create, update or delete."""
+    return sum(summary.get(key, 0) for key in ("create", "update", "delete", "replace"))
+
+
+def has_drift(summary: dict) -> bool:
+    """True if applying the plan would change anything (including imports and moves)."""
+    return changed_resources(summary) + summary.get("import", 0) + summary.get("move", 0) > 0
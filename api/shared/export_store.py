@@ -0,0 +1,161 @@
+"""
+Temporary storage for plan exports.
+
+export_plans writes its ZIP straight into a block blob of the 'exports'
+container through BlobSpool (blocks are staged as the archive grows), then
+hands out a short-lived read-only SAS link to it instead of returning the
+archive in the response body: the worker holds one block of the archive at a
+time, whatever the size of the export.
+
+Blobs are named {project_id}/{timestamp}-{uuid}.zip and removed by the
+storage account's lifecycle rule on the container (see infra/ and terraform/).
+"""
+import base64
+import io
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from azure.core.exceptions import ResourceExistsError
+from azure.storage.blob import BlobBlock, BlobSasPermissions, ContentSettings, generate_blob_sas
+
+from shared.blob_codec import open_decompressed
+from shared.storage import get_blob_service_client
+
+EXPORTS_CONTAINER = "exports"
+
+BLOCK_SIZE = 4 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+_lock = threading.Lock()
+_exports_container_client = None
+
+
+def get_exports_container_client():
+    """Returns the 'exports' container client, creating the container at most once per process."""
+    global _exports_container_client
+    if _exports_container_client is None:
+        service_client = get_blob_service_client()
+        with _lock:
+            if _exports_container_client is None:
+                container_client = service_client.get_container_client(EXPORTS_CONTAINER)
+                try:
+                    container_client.create_container()
+                except ResourceExistsError:
+                    pass
+                _exports_container_client = container_client
+    return _exports_container_client
+
+
+def export_link_ttl() -> timedelta:
+    try:
+        minutes = max(1, int(os.environ.get("EXPORT_LINK_TTL_MINUTES", "15")))
+    except ValueError:
+        minutes = 15
+    return timedelta(minutes=minutes)
+
+
+class BlobSpool(io.RawIOBase):
+    """
+    Write-only, unseekable file object over a new block blob. Writes are
+    buffered and staged in BLOCK_SIZE blocks; nothing is visible until
+    commit(). Blocks of an export that fails are never committed and are
+    discarded by the storage service.
+    """
+
+    def __init__(self, blob_client, block_size: int = BLOCK_SIZE):
+        super().__init__()
+        self.blob_client = blob_client
+        self.block_size = block_size
+        self.size = 0
+        self._buffer = bytearray()
+        self._blocks: list[BlobBlock] = []
+        self._aborted = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        n = len(b)
+        if self._aborted:
+            return n
+        self._buffer += b
+        self.size += n
+        while len(self._buffer) >= self.block_size:
+            self._stage(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return n
+
+    def _stage(self, data: bytes) -> None:
+        # Block ids must be base64 and of equal length within a blob
+        block_id = base64.b64encode(f"{len(self._blocks):08d}".encode()).decode()
+        self.blob_client.stage_block(block_id=block_id, data=data)
+        self._blocks.append(BlobBlock(block_id=block_id))
+
+    def commit(self, filename: str) -> int:
+        """Stages the remaining bytes and commits the blob. Returns its size."""
+        if self._buffer or not self._blocks:
+            self._stage(bytes(self._buffer))
+            self._buffer.clear()
+        self.blob_client.commit_block_list(self._blocks, content_settings=ContentSettings(
+            content_type="application/zip",
+            content_disposition=f"attachment; filename={filename}",
+        ))
+        return self.size
+
+    def abort(self) -> None:
+        """Drops the buffer; later writes (e.g. a ZipFile closed on cleanup) are discarded."""
+        self._aborted = True
+        self._buffer.clear()
+
+
+def open_export_spool(project_id: str) -> BlobSpool:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    blob_name = f"{project_id}/{stamp}-{uuid.uuid4().hex}.zip"
+    return BlobSpool(get_exports_container_client().get_blob_client(blob_name))
+
+
+def write_plan_entry(zf, filename: str, data: bytes, codec: str) -> None:
+    """Adds a stored (compressed) plan blob to zf, decompressing it chunk by chunk."""
+    with open_decompressed([data], codec) as source, zf.open(filename, "w") as target:
+        while chunk := source.read(COPY_CHUNK_SIZE):
+            target.write(chunk)
+
+
+def export_download_url(blob_client, filename: str) -> tuple[str, datetime]:
+    """
+    A read-only SAS URL for an export blob and its expiry. Signed with the
+    account key when the connection has one (connection strings, Azurite),
+    otherwise with a user delegation key of the managed identity.
+    """
+    service_client = get_blob_service_client()
+    start = datetime.now(timezone.utc) - timedelta(minutes=5)
+    expiry = datetime.now(timezone.utc) + export_link_ttl()
+
+    signing = {}
+    account_key = getattr(service_client.credential, "account_key", None)
+    if account_key:
+        signing["account_key"] = account_key
+    else:
+        signing["user_delegation_key"] = service_client.get_user_delegation_key(start, expiry)
+
+    sas = generate_blob_sas(
+        account_name=blob_client.account_name,
+        container_name=blob_client.container_name,
+        blob_name=blob_client.blob_name,
+        permission=BlobSasPermissions(read=True),
+        start=start,
+        expiry=expiry,
+        content_type="application/zip",
+        content_disposition=f"attachment; filename={filename}",
+        **signing
+    )
+    return f"{blob_client.url}?{sas}", expiry
+
+
+def take_export_bytes(blob_client) -> bytes:
+    """Reads an export blob back and deletes it (inline delivery)."""
+    data = blob_client.download_blob().readall()
+    blob_client.delete_blob()
+    return data
@@ -0,0 +1,71 @@
+"""
+Resource graph store.
+
+Resource graphs (all nodes and edges of a plan's configuration) used to be
+embedded in every plan document, inflating each document, the RU charge of
+every read and list_plans/export_plans responses. They are now stored as
+compressed, content-addressed blobs next to the plan blobs:
+
+    plans/{project_id}/graphs/sha256/{digest}.json
+
+where digest is the SHA-256 of the canonical graph JSON, so consecutive
+plans of an unchanged configuration share one blob. The plan document keeps
+only `graph_url`; the blob is reference counted in `plan_blobs` like plan
+blobs and released by the same delete paths (see plan_blob_urls()).
+
+Plans ingested before the split still carry `resource_graph`; load_plan_graph()
+reads either form and tools/migrate_resource_graphs moves old graphs out.
+"""
+import hashlib
+import json
+
+from shared.aio_storage import download_plan_blob_async, store_content_blob_async
+from shared.storage import GRAPH_DIR, content_blob_name, download_plan_blob, store_content_blob
+
+EMPTY_GRAPH = {"nodes": [], "edges": []}
+
+
+def graph_digest(graph_bytes: bytes) -> str:
+    return hashlib.sha256(graph_bytes).hexdigest()
+
+
+def _canonical_bytes(graph: dict) -> bytes:
+    return json.dumps(graph, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def upload_graph_blob(graph: dict, project_id: str) -> str | None:
+    """Stores graph (takes a reference on the shared blob) and returns its URL; None for an empty graph."""
+    if not graph or not graph.get("nodes"):
+        return None
+    return store_content_blob(project_id, *_graph_blob_content(graph, project_id))
+
+
+async def upload_graph_blob_async(graph: dict, project_id: str) -> str | None:
+    if not graph or not graph.get("nodes"):
+        return None
+    return await store_content_blob_async(project_id, *_graph_blob_content(graph, project_id))
+
+
+def _graph_blob_content(graph: dict, project_id: str) -> tuple[str, bytes]:
+    graph_bytes = _canonical_bytes(graph)
+    return content_blob_name(project_id, graph_digest(graph_bytes), subdir=GRAPH_DIR), graph_bytes
+
+
+def load_plan_graph(plan_doc: dict) -> dict | None:
+    """
+    The resource graph of a plan document (or projection with graph_url /
+    resource_graph). Returns None if the plan has a graph_url whose blob is
+    missing, EMPTY_GRAPH if the plan has no graph.
+    """
+    if plan_doc.get("graph_url"):
+        data = download_plan_blob(plan_doc["graph_url"])
+        return json.loads(data) if data is not None else None
+    return plan_doc.get("resource_graph") or EMPTY_GRAPH
+
+
+async def load_plan_graph_async(plan_doc: dict) -> dict | None:
+    """load_plan_graph() on the async blob client."""
+    if plan_doc.get("graph_url"):
+        data = await download_plan_blob_async(plan_doc["graph_url"])
+        return json.loads(data) if data is not None else None
+    return plan_doc.get("resource_graph") or EMPTY_GRAPH
@@ -0,0 +1,111 @@
+"""
+Declarative Cosmos DB indexing policies, one per container.
+
+Containers used to be created with the default policy, which indexes every
+path: each ingest paid write RUs to index the pruned `resource_changes` and
+(legacy) `resource_graph` arrays that are never filtered on, and the hot
+`WHERE ... ORDER BY c.timestamp DESC` queries had no composite index.
+
+Each policy indexes only the paths the code filters or sorts on, excludes
+everything else ("/*"), and adds composite indexes for the filtered
+newest-first queries. get_container() (shared/db.py) applies the policy when
+it creates a container and, once per process, replaces the policy of an
+existing container whose live policy differs; Cosmos then re-indexes online.
+Bump INDEX_POLICY_VERSION with every change so deployments can be told apart
+in the logs (and run tools/apply_index_policies where the Function App's
+identity has no control-plane rights).
+
+Queries filtering on an excluded path (e.g. IS_DEFINED(c.resource_graph) in
+the migration tools) must pass enable_scan_in_query=True.
+"""
+import logging
+import os
+
+INDEX_POLICY_VERSION = 1
+
+
+def _policy(included: list[str], composites: list[list[tuple[str, str]]] | None = None) -> dict:
+    return {
+        "indexingMode": "consistent",
+        "automatic": True,
+        "includedPaths": [{"path": f"/{name}/?"} for name in included],
+        "excludedPaths": [{"path": "/*"}],
+        "compositeIndexes": [
+            [{"path": f"/{name}", "order": order} for name, order in composite]
+            for composite in composites or []
+        ],
+    }
+
+
+# Plans: list/report filters plus _ts (tools.migrate_plans_partitioning)
+PLANS_POLICY = _policy(
+    ["project_id", "component_id", "environment", "branch", "timestamp", "is_pending_approval", "_ts"],
+    [
+        [("project_id", "ascending"), ("timestamp", "descending")],
+        [("project_id", "ascending"), ("branch", "ascending"), ("timestamp", "descending")],
+        [("project_id", "ascending"), ("environment", "ascending"), ("timestamp", "descending")],
+        [("project_id", "ascending"), ("component_id", "ascending"), ("timestamp", "descending")],
+        [("component_id", "ascending"), ("environment", "ascending"), ("timestamp", "descending")],
+    ],
+)
+
+INDEX_POLICIES: dict[str, dict] = {
+    "plans": PLANS_POLICY,
+    "plans_by_project": PLANS_POLICY,
+    "latest_plans": _policy(
+        ["component_id", "environment", "branch", "timestamp"],
+        [[("component_id", "ascending"), ("environment", "ascending"), ("timestamp", "descending")]],
+    ),
+    "components": _policy(["project_id", "name"], [[("project_id", "ascending"), ("name", "ascending")]]),
+    # Point reads and unfiltered scans only
+    "projects": _policy([]),
+    "plan_blobs": _policy([]),
+    "report_schedule": _policy([]),
+    "data_versions": _policy([]),
+}
+
+
+def index_policy(container_name: str) -> dict | None:
+    """The declared policy of a container, None to keep the Cosmos default."""
+    return INDEX_POLICIES.get(container_name)
+
+
+def apply_enabled() -> bool:
+    return os.environ.get("COSMOS_APPLY_INDEX_POLICIES", "true").strip().lower() not in ("0", "false", "no")
+
+
+def _composite_key(composites: list) -> set:
+    return {tuple((p["path"], p.get("order", "ascending").lower()) for p in composite) for composite in composites or []}
+
+
+def policy_matches(current: dict | None, wanted: dict) -> bool:
+    """Compares the parts of a live policy that the declarations set (Cosmos adds defaults such as /_etag)."""
+    if not current:
+        return False
+    return (
+        current.get("indexingMode", "consistent").lower() == wanted["indexingMode"]
+        and {p["path"] for p in current.get("includedPaths", [])} == {p["path"] for p in wanted["includedPaths"]}
+        and {p["path"] for p in wanted["excludedPaths"]} <= {p["path"] for p in current.get("excludedPaths", [])}
+        and _composite_key(current.get("compositeIndexes")) == _composite_key(wanted["compositeIndexes"])
+    )
+
+
+def ensure_index_policy(database, container, container_name: str, partition_key) -> bool:
+    """
+    Replaces the container's indexing policy if it differs from the declared
+    one. Returns True if it was replaced. Failures (e.g. no control-plane
+    rights) are logged and leave the container as it is.
+    """
+    wanted = index_policy(container_name)
+    if wanted is None:
+        return False
+    try:
+        current = container.read().get("indexingPolicy")
+        if policy_matches(current, wanted):
+            return False
+        database.replace_container(container, partition_key=partition_key, indexing_policy=wanted)
+        logging.info(f"Applied index policy v{INDEX_POLICY_VERSION} to container '{container_name}'")
+        return True
+    except Exception as e:
+        logging.warning(f"Could not apply index policy to container '{container_name}': {e}")
+        return False
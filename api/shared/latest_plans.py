@@ -0,0 +1,243 @@
+"""
+Materialized "latest plan per series" index.
+
+A series is (project, component, environment, branch). The `latest_plans`
+container, partitioned by project, holds one small document per series with
+the newest approved plan's id, timestamp, plan and graph blobs and drift_summary
+counters. Reports, exports and the ingest stale check read
+it with point reads or a single-partition query instead of scanning the
+plans container with cross-partition `ORDER BY c.timestamp DESC` queries.
+
+Writers: manual_ingest and approve_ingestion call record_plan() (or
+record_plan_async() from async handlers); the delete
+endpoints call refresh_series() (single plan) or remove_entries() (cascades).
+tools/backfill_latest_plans rebuilds the index from the plans container.
+"""
+import logging
+from urllib.parse import quote
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+from shared.aio_db import get_async_container, query_all, read_item_or_none
+from shared.db import get_container
+from shared.plans_store import get_plans_container, project_query_kwargs
+from shared.drift_summary import changed_resources, empty_drift_summary, summarize_resource_changes
+
+LATEST_PLANS_CONTAINER = "latest_plans"
+PARTITION_KEY_PATH = "/project_id"
+
+NOT_PENDING = "(NOT IS_DEFINED(c.is_pending_approval) OR c.is_pending_approval = false)"
+
+# Plan fields an entry is built from. resource_changes are only read for plans
+# that predate drift_summary (see tools/backfill_drift_summary).
+PLAN_ENTRY_FIELDS = (
+    "c.id, c.project_id, c.component_id, c.component_name, c.environment, c.branch, c.timestamp, c.blob_url, c.graph_url, "
+    "c.drift_summary, (IS_DEFINED(c.drift_summary) ? {} : {'resource_changes': c.terraform_plan.resource_changes}) AS terraform_plan"
+)
+
+
+def get_latest_container():
+    return get_container(LATEST_PLANS_CONTAINER, PARTITION_KEY_PATH)
+
+
+async def get_latest_container_async():
+    return await get_async_container(LATEST_PLANS_CONTAINER, PARTITION_KEY_PATH)
+
+
+def series_id(component_id: str, environment: str, branch: str | None) -> str:
+    # Branch names like "feature/x" contain characters Cosmos ids cannot
+    return ":".join(quote(part or "", safe="") for part in (component_id, environment, branch))
+
+
+def count_changes(entry: dict) -> dict[str, int]:
+    """The entry's drift_summary counters (all zero if it has none)."""
+    return dict(empty_drift_summary(), **(entry.get('drift_summary') or {}))
+
+
+def count_changed_resources(entry: dict) -> int:
+    """Number of resources whose actions include create, update or delete."""
+    return changed_resources(count_changes(entry))
+
+
+def entry_from_plan(plan_doc: dict) -> dict:
+    return {
+        "id": series_id(plan_doc['component_id'], plan_doc['environment'], plan_doc.get('branch')),
+        "project_id": plan_doc['project_id'],
+        "component_id": plan_doc['component_id'],
+        "component_name": plan_doc.get('component_name'),
+        "environment": plan_doc['environment'],
+        "branch": plan_doc.get('branch'),
+        "plan_id": plan_doc['id'],
+        "timestamp": plan_doc.get('timestamp'),
+        "blob_url": plan_doc.get('blob_url'),
+        "graph_url": plan_doc.get('graph_url'),
+        "drift_summary": plan_doc.get('drift_summary') or summarize_resource_changes(
+            (plan_doc.get('terraform_plan') or {}).get('resource_changes')),
+    }
+
+
+def _indexed(plan_doc: dict) -> bool:
+    return bool(not plan_doc.get('is_pending_approval') and plan_doc.get('component_id') and plan_doc.get('environment'))
+
+
+def _superseded(current: dict, entry: dict) -> bool:
+    """Whether the recorded entry is another, newer plan than entry."""
+    return current.get('plan_id') != entry['plan_id'] and (current.get('timestamp') or '') > (entry['timestamp'] or '')
+
+
+def record_plan(plan_doc: dict) -> None:
+    """
+    Makes plan_doc the latest plan of its series unless a newer one is
+    already recorded. Pending-approval plans are not indexed.
+    """
+    if not _indexed(plan_doc):
+        return
+
+    container = get_latest_container()
+    entry = entry_from_plan(plan_doc)
+
+    # Optimistic concurrency: two ingests of the same series must not let
+    # the older plan win.
+    for _ in range(5):
+        try:
+            current = container.read_item(item=entry['id'], partition_key=entry['project_id'])
+        except exceptions.CosmosResourceNotFoundError:
+            try:
+                container.create_item(entry)
+                return
+            except exceptions.CosmosResourceExistsError:
+                continue
+
+        if _superseded(current, entry):
+            return
+        try:
+            container.replace_item(item=entry['id'], body=entry,
+                                   etag=current.get('_etag'), match_condition=MatchConditions.IfNotModified)
+            return
+        except exceptions.CosmosAccessConditionFailedError:
+            continue
+    logging.warning(f"Could not record latest plan for series {entry['id']} after repeated conflicts")
+
+
+async def record_plan_async(plan_doc: dict) -> None:
+    """record_plan() on the async data layer."""
+    if not _indexed(plan_doc):
+        return
+
+    container = await get_latest_container_async()
+    entry = entry_from_plan(plan_doc)
+
+    for _ in range(5):
+        current = await read_item_or_none(container, entry['id'], entry['project_id'])
+        if current is None:
+            try:
+                await container.create_item(entry)
+                return
+            except exceptions.CosmosResourceExistsError:
+                continue
+
+        if _superseded(current, entry):
+            return
+        try:
+            await container.replace_item(item=entry['id'], body=entry,
+                                         etag=current.get('_etag'), match_condition=MatchConditions.IfNotModified)
+            return
+        except exceptions.CosmosAccessConditionFailedError:
+            continue
+    logging.warning(f"Could not record latest plan for series {entry['id']} after repeated conflicts")
+
+
+def refresh_series(project_id: str, component_id: str, environment: str, branch: str | None) -> None:
+    """Recomputes one series from the plans container (e.g. after its latest plan was deleted)."""
+    entry_id = series_id(component_id, environment, branch)
+    container = get_latest_container()
+
+    where = ["c.project_id = @pid", "c.component_id = @cid", "c.environment = @env", NOT_PENDING]
+    parameters = [{"name": "@pid", "value": project_id}, {"name": "@cid", "value": component_id},
+                  {"name": "@env", "value": environment}]
+    if branch is None:
+        # manual_ingest stores an explicit "branch": null as null
+        where.append("(NOT IS_DEFINED(c.branch) OR IS_NULL(c.branch))")
+    else:
+        where.append("c.branch = @branch")
+        parameters.append({"name": "@branch", "value": branch})
+    plans = list(get_plans_container().query_items(
+        query=f"SELECT TOP 1 {PLAN_ENTRY_FIELDS} FROM c WHERE {' AND '.join(where)} ORDER BY c.timestamp DESC",
+        parameters=parameters,
+        **project_query_kwargs(project_id)
+    ))
+    if plans:
+        container.upsert_item(entry_from_plan(plans[0]))
+    else:
+        try:
+            container.delete_item(item=entry_id, partition_key=project_id)
+        except exceptions.CosmosResourceNotFoundError:
+            pass
+
+
+def remove_entries(project_id: str, where: str | None = None, parameters: list | None = None) -> int:
+    """Deletes the project's entries matching an optional filter on c (cascading deletes). Returns the count."""
+    container = get_latest_container()
+    query = "SELECT c.id FROM c" + (f" WHERE {where}" if where else "")
+    removed = 0
+    for item in list(container.query_items(query=query, parameters=parameters or [], partition_key=project_id)):
+        try:
+            container.delete_item(item=item['id'], partition_key=project_id)
+            removed += 1
+        except exceptions.CosmosResourceNotFoundError:
+            continue
+    return removed
+
+
+def _entries_query(branch: str | None, environments: list[str] | None) -> tuple[str, list]:
+    where = []
+    parameters = []
+    if branch:
+        where.append("c.branch = @branch")
+        parameters.append({"name": "@branch", "value": branch})
+    if environments:
+        where.append("ARRAY_CONTAINS(@envs, c.environment)")
+        parameters.append({"name": "@envs", "value": environments})
+    return "SELECT * FROM c" + (f" WHERE {' AND '.join(where)}" if where else ""), parameters
+
+
+def get_latest_entries(project_id: str, branch: str | None = None, environments: list[str] | None = None) -> list[dict]:
+    """The project's series entries (single-partition query), optionally limited to a branch and environments."""
+    query, parameters = _entries_query(branch, environments)
+    return list(get_latest_container().query_items(query=query, parameters=parameters, partition_key=project_id))
+
+
+async def get_latest_entries_async(project_id: str, branch: str | None = None,
+                                   environments: list[str] | None = None) -> list[dict]:
+    query, parameters = _entries_query(branch, environments)
+    return await query_all(await get_latest_container_async(), query, parameters, partition_key=project_id)
+
+
+def latest_by_component_env(entries: list[dict]) -> dict[str, dict[str, dict]]:
+    """Reduces entries to latest[component_id][environment], keeping the newest across branches."""
+    latest: dict[str, dict[str, dict]] = {}
+    for entry in entries:
+        per_env = latest.setdefault(entry['component_id'], {})
+        current = per_env.get(entry['environment'])
+        if current is None or (entry.get('timestamp') or '') > (current.get('timestamp') or ''):
+            per_env[entry['environment']] = entry
+    return latest
+
+
+LATEST_FOR_COMPONENT_QUERY = "SELECT TOP 1 * FROM c WHERE c.component_id = @cid AND c.environment = @env ORDER BY c.timestamp DESC"
+
+
+def get_latest_for_component(project_id: str, component_id: str, environment: str) -> dict | None:
+    """Newest entry of a component/environment across branches (single-partition query)."""
+    entries = list(get_latest_container().query_items(
+        query=LATEST_FOR_COMPONENT_QUERY,
+        parameters=[{"name": "@cid", "value": component_id}, {"name": "@env", "value": environment}],
+        partition_key=project_id
+    ))
+    return entries[0] if entries else None
+
+
+async def get_latest_for_component_async(project_id: str, component_id: str, environment: str) -> dict | None:
+    entries = await query_all(await get_latest_container_async(), LATEST_FOR_COMPONENT_QUERY,
+                              [{"name": "@cid", "value": component_id}, {"name": "@env", "value": environment}],
+                              partition_key=project_id)
+    return entries[0] if entries else None
@@ -0,0 +1,207 @@
+"""
+Pooled SMTP delivery.
+
+Opening a session costs a TCP connect, EHLO, STARTTLS and AUTH round trips,
+and many projects share one relay. MailPool keeps authenticated
+smtplib sessions per (host, port, username, secure, password hash) and sends
+every message over an idle session when one is available. A session is only
+reused with the exact settings it was opened with, so a project never sends
+over a session another project authenticated. Sessions are checked with NOOP after
+sitting idle, retired after SMTP_SESSION_MAX_MESSAGES messages or
+SMTP_SESSION_MAX_IDLE_SECONDS idle, and transient failures (dropped
+connections, timeouts, 4xx replies) are retried on a fresh session with
+exponential backoff.
+
+For offline testing, point a project's SMTP settings at tools/local_smtp
+(`secure` off).
+"""
+import hashlib
+import logging
+import os
+import random
+import smtplib
+import socket
+import threading
+import time
+from email.message import Message
+
+# Replies in this range are temporary by definition (RFC 5321 4.2.1)
+_TRANSIENT_CODES = range(400, 500)
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class _Session:
+    __slots__ = ("smtp", "last_used", "sent")
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+
+class MailPool:
+    """Authenticated SMTP sessions pooled by their connection settings (see _key). Thread-safe."""
+
+    def __init__(self, max_idle_per_key: int = 4, max_idle_seconds: float | None = None,
+                 max_messages_per_session: int | None = None, retries: int = 3, backoff_seconds: float = 0.5):
+        self.max_idle_per_key = max_idle_per_key
+        self.max_idle_seconds = max_idle_seconds if max_idle_seconds is not None else _env_number("SMTP_SESSION_MAX_IDLE_SECONDS", 60)
+        self.max_messages_per_session = int(max_messages_per_session or _env_number("SMTP_SESSION_MAX_MESSAGES", 100))
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self._lock = threading.Lock()
+        self._idle: dict[tuple, list[_Session]] = {}
+        self._stats = {"sessions_opened": 0, "sessions_reused": 0, "messages_sent": 0, "retries": 0}
+
+    @staticmethod
+    def _key(smtp_settings: dict) -> tuple:
+        """(host, port, username, secure, password digest): only the digest of the password is kept."""
+        password_digest = hashlib.sha256((smtp_settings.get('password') or "").encode()).hexdigest()
+        return (smtp_settings['host'], int(smtp_settings.get('port') or 587), smtp_settings.get('username') or "",
+                bool(smtp_settings.get('secure', True)), password_digest)
+
+    def send(self, smtp_settings: dict, msg: Message, timeout: float = 30.0) -> None:
+        """Sends msg, retrying transient failures. Raises the last error if every attempt fails."""
+        self.send_many(smtp_settings, [msg], timeout)
+
+    def send_many(self, smtp_settings: dict, messages: list[Message], timeout: float = 30.0) -> None:
+        """Sends messages back to back over one (reused) session."""
+        key = self._key(smtp_settings)
+        pending = list(messages)
+        attempt = 0
+        while pending:
+            session = None
+            try:
+                session = self._acquire(key, smtp_settings, timeout)
+                while pending:
+                    session.smtp.send_message(pending[0])
+                    pending.pop(0)
+                    session.sent += 1
+                    with self._lock:
+                        self._stats["messages_sent"] += 1
+                self._release(key, session)
+            except Exception as e:
+                if session is not None:
+                    self._close(session)
+                attempt += 1
+                if not self._is_transient(e) or attempt > self.retries:
+                    raise
+                delay = self.backoff_seconds * (2 ** (attempt - 1)) * (1 + random.random() / 2)
+                logging.warning(f"Transient SMTP failure via {key[0]}:{key[1]} ({e}), retry {attempt}/{self.retries} in {delay:.1f}s")
+                with self._lock:
+                    self._stats["retries"] += 1
+                time.sleep(delay)
+
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, socket.timeout, ConnectionError)):
+            return True
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            codes = [code for code, _ in error.recipients.values()]
+            return bool(codes) and all(code in _TRANSIENT_CODES for code in codes)
+        if isinstance(error, smtplib.SMTPResponseException):
+            return error.smtp_code in _TRANSIENT_CODES
+        return False
+
+    def _acquire(self, key: tuple, smtp_settings: dict, timeout: float) -> _Session:
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                session = idle.pop() if idle else None
+            if session is None:
+                return self._open(smtp_settings, timeout)
+
+            idle_for = time.monotonic() - session.last_used
+            if idle_for > self.max_idle_seconds:
+                self._close(session)
+                continue
+            if idle_for > 5:
+                # Relays drop idle connections silently; probe before reuse
+                try:
+                    if session.smtp.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected("NOOP failed")
+                except Exception:
+                    self._close(session)
+                    continue
+            session.smtp.timeout = timeout
+            if session.smtp.sock is not None:
+                session.smtp.sock.settimeout(timeout)
+            with self._lock:
+                self._stats["sessions_reused"] += 1
+            return session
+
+    def _open(self, smtp_settings: dict, timeout: float) -> _Session:
+        host, port, username, secure, _ = self._key(smtp_settings)
+        if secure and port == 465:
+            smtp = smtplib.SMTP_SSL(host, port, timeout=timeout)
+        else:
+            smtp = smtplib.SMTP(host, port, timeout=timeout)
+            if secure:
+                smtp.starttls()
+        try:
+            if username:
+                smtp.login(username, smtp_settings.get('password') or "")
+        except Exception:
+            self._close(_Session(smtp))
+            raise
+        with self._lock:
+            self._stats["sessions_opened"] += 1
+        return _Session(smtp)
+
+    def _release(self, key: tuple, session: _Session) -> None:
+        session.last_used = time.monotonic()
+        if session.sent >= self.max_messages_per_session:
+            self._close(session)
+            return
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_key:
+                idle.append(session)
+                return
+        self._close(session)
+
+    @staticmethod
+    def _close(session: _Session) -> None:
+        try:
+            session.smtp.quit()
+        except Exception:
+            try:
+                session.smtp.close()
+            except Exception:
+                pass
+
+    def close_all(self) -> None:
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+        for session in sessions:
+            self._close(session)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, idle_sessions=sum(len(v) for v in self._idle.values()))
+
+
+_pool: MailPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_mail_pool() -> MailPool:
+    """Returns the process-wide MailPool."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = MailPool()
+    return _pool
+
+
+def send_email(smtp_settings: dict, msg: Message, timeout: float = 30.0) -> None:
+    """Sends msg through the pooled session for smtp_settings' relay."""
+    get_mail_pool().send(smtp_settings, msg, timeout)
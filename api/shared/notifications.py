@@ -1,25 +1,193 @@
+"""
+Slack webhook delivery.
+
+All posts go through one keep-alive requests.Session, so repeated alerts to
+hooks.slack.com reuse pooled TLS connections. post_to_slack() honours Slack's
+429 Retry-After (capped by SLACK_MAX_RETRY_AFTER_SECONDS) and retries 5xx
+replies and connection errors with backoff, up to SLACK_MAX_ATTEMPTS. Callers
+with a time budget (the weekly report timer) pass it as `budget`; no wait
+runs past it.
+
+Alerts raised on a request path (drift alerts from manual_ingest) are handed
+to the in-process SlackDispatcher queue and posted by a background thread, so
+the response does not wait on Slack. The queue lives in the worker process:
+messages still queued when the host recycles it are lost (a best-effort flush
+runs at exit), which is acceptable for these alerts.
+"""
+import atexit
 import logging
+import os
+import queue
+import threading
+import time
 import requests
-import json
+from requests.adapters import HTTPAdapter
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """Returns the process-wide keep-alive session used for webhook posts."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def post_to_slack(webhook_url: str, payload: dict, timeout: float = 10.0, label: str = "Slack message",
+                  budget: float | None = None) -> bool:
+    """
+    Posts payload to a Slack webhook over the shared session. Rate-limited
+    (429) posts wait for Retry-After; 5xx replies and connection errors are
+    retried with backoff. With a budget (seconds), a retry whose wait would
+    not fit in what is left of it is given up. Returns True once Slack
+    accepted the message.
+    """
+    max_attempts = max(1, int(_env_number("SLACK_MAX_ATTEMPTS", 3)))
+    max_retry_after = _env_number("SLACK_MAX_RETRY_AFTER_SECONDS", 30)
+    deadline = time.monotonic() + budget if budget is not None else None
+
+    def wait(seconds: float) -> bool:
+        if deadline is not None and time.monotonic() + seconds >= deadline:
+            logging.error(f"{label} out of time budget, giving up")
+            return False
+        time.sleep(seconds)
+        return True
+
+    for attempt in range(1, max_attempts + 1):
+        request_timeout = timeout
+        if deadline is not None:
+            request_timeout = max(1.0, min(timeout, deadline - time.monotonic()))
+        try:
+            response = _get_session().post(webhook_url, json=payload, timeout=request_timeout)
+        except requests.RequestException as e:
+            if attempt == max_attempts:
+                logging.error(f"Error sending {label}: {e}")
+                return False
+            if not wait(2 ** (attempt - 1)):
+                return False
+            continue
+
+        if response.status_code == 200:
+            return True
+        if response.status_code == 429 and attempt < max_attempts:
+            try:
+                retry_after = float(response.headers.get("Retry-After", 1))
+            except ValueError:
+                retry_after = 1.0
+            if retry_after > max_retry_after:
+                logging.error(f"{label} rate limited for {retry_after:.0f}s, giving up")
+                return False
+            logging.warning(f"{label} rate limited, retrying in {retry_after:.0f}s")
+            if not wait(retry_after):
+                return False
+            continue
+        if response.status_code >= 500 and attempt < max_attempts:
+            if not wait(2 ** (attempt - 1)):
+                return False
+            continue
+
+        logging.error(f"{label} failed: {response.status_code} - {response.text}")
+        return False
+    return False
+
+
+class SlackDispatcher:
+    """In-process queue of webhook posts drained by a background thread."""
+
+    def __init__(self, maxsize: int = 1000):
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, webhook_url: str, payload: dict, label: str = "Slack message") -> bool:
+        """Queues a post without waiting for it. Returns False if the queue is full."""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((webhook_url, payload, label))
+            return True
+        except queue.Full:
+            logging.error(f"Slack dispatch queue full, dropping {label}")
+            return False
+
+    def flush(self, timeout: float) -> bool:
+        """Waits up to timeout seconds for queued posts to finish. Returns True if the queue drained."""
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def pending(self) -> int:
+        return self._queue.unfinished_tasks
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                # One worker keeps posts to a webhook in order and paces them
+                # behind any Retry-After wait.
+                self._thread = threading.Thread(target=self._run, name="slack-dispatch", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            webhook_url, payload, label = self._queue.get()
+            try:
+                if post_to_slack(webhook_url, payload, label=label):
+                    logging.info(f"{label} sent")
+            except Exception as e:
+                logging.error(f"Error sending {label}: {e}")
+            finally:
+                self._queue.task_done()
+
+
+_dispatcher: SlackDispatcher | None = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> SlackDispatcher:
+    """Returns the process-wide SlackDispatcher."""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = SlackDispatcher()
+                atexit.register(_dispatcher.flush, 5.0)
+    return _dispatcher
+
 
 def send_slack_alert(webhook_url: str, project_name: str, component_name: str, environment: str, drift_summary: dict, plan_url: str = None):
     """
-    Sends a formatted Slack message about drift detection.
+    Queues a formatted Slack message about drift detection; returns without
+    waiting for Slack. drift_summary is the plan's counters (shared.drift_summary).
     """
     if not webhook_url:
         return
 
-    # Count changes
-    add = 0
-    change = 0
-    destroy = 0
-    
-    if 'resource_changes' in drift_summary:
-        for rc in drift_summary['resource_changes']:
-            actions = rc.get('change', {}).get('actions', [])
-            if 'create' in actions: add += 1
-            if 'update' in actions: change += 1
-            if 'delete' in actions: destroy += 1
+    # A replace counts as both add and destroy
+    add = drift_summary.get('create', 0) + drift_summary.get('replace', 0)
+    change = drift_summary.get('update', 0)
+    destroy = drift_summary.get('delete', 0) + drift_summary.get('replace', 0)
 
     total_changes = add + change + destroy
     
@@ -79,14 +247,7 @@ def send_slack_alert(webhook_url: str, project_name: str, component_name: str, e
         ]
     }
 
-    try:
-        response = requests.post(webhook_url, json=payload, timeout=5)
-        if response.status_code != 200:
-            logging.error(f"Slack notification failed: {response.status_code} - {response.text}")
-        else:
-            logging.info(f"Slack notification sent for {component_name}")
-    except Exception as e:
-        logging.error(f"Error sending Slack notification: {e}")
+    get_dispatcher().submit(webhook_url, payload, label=f"Slack drift alert for {component_name}")
 
 
 def send_slack_test(webhook_url: str, project_name: str) -> bool:
@@ -106,31 +267,18 @@ def send_slack_test(webhook_url: str, project_name: str) -> bool:
         ]
     }
 
-    try:
-        response = requests.post(webhook_url, json=payload, timeout=5)
-        return response.status_code == 200
-    except Exception as e:
-        logging.error(f"Error sending Slack test: {e}")
-        return False
+    return post_to_slack(webhook_url, payload, timeout=5, label="Slack test")
 
 
-def send_slack_blocks(webhook_url: str, blocks: list) -> bool:
+def send_slack_blocks(webhook_url: str, blocks: list, timeout: float = 10.0, budget: float | None = None) -> bool:
     """Posts a pre-built Block Kit payload to a Slack webhook."""
     if not webhook_url:
         return False
-
-    try:
-        response = requests.post(webhook_url, json={"blocks": blocks}, timeout=10)
-        if response.status_code != 200:
-            logging.error(f"Slack blocks post failed: {response.status_code} - {response.text}")
-            return False
-        return True
-    except Exception as e:
-        logging.error(f"Error posting Slack blocks: {e}")
-        return False
+    return post_to_slack(webhook_url, {"blocks": blocks}, timeout=timeout, label="Slack blocks post", budget=budget)
 
 
-def send_slack_stale_alert(webhook_url: str, project_name: str, stale_items: list[dict]) -> bool:
+def send_slack_stale_alert(webhook_url: str, project_name: str, stale_items: list[dict], timeout: float = 5.0,
+                           budget: float | None = None) -> bool:
     """Sends a Slack alert listing stale component/environment combinations."""
     if not webhook_url or not stale_items:
         return False
@@ -159,12 +307,4 @@ def send_slack_stale_alert(webhook_url: str, project_name: str, stale_items: lis
         ]
     }
 
-    try:
-        response = requests.post(webhook_url, json=payload, timeout=5)
-        if response.status_code != 200:
-            logging.error(f"Slack stale alert failed: {response.status_code} - {response.text}")
-            return False
-        return True
-    except Exception as e:
-        logging.error(f"Error sending stale alert: {e}")
-        return False
+    return post_to_slack(webhook_url, payload, timeout=timeout, label="Slack stale alert", budget=budget)
@@ -0,0 +1,153 @@
+"""
+Cursor pagination for the list endpoints.
+
+Clients pass `page_size` (default 50, max 500) and, for later pages, the
+opaque `cursor` returned as `next_cursor` by the previous page; the response
+is then `{"items": [...], "next_cursor": "<cursor>" | null}`. Requests
+without either parameter keep the endpoints' original unpaginated response.
+
+A cursor is base64url JSON holding the resume state and a fingerprint of the
+request's filters, so it cannot be replayed against a different query. The
+resume state is one of:
+
+* a Cosmos continuation token (read_page), for unordered queries: single
+  partition, or cross-partition queries the gateway serves directly;
+* a keyset (read_keyset_page) for newest-first `ORDER BY c.timestamp DESC`
+  queries. The Python SDK merges cross-partition ORDER BY results client-side
+  and cannot resume them from a continuation token, so these pages resume
+  after the last timestamp seen (and the ids already returned at it).
+
+Pages hold up to page_size items; a page may be shorter while next_cursor is
+still set. Each endpoint passes the shape of its resume state (CONTINUATION_STATE,
+KEYSET_STATE or AFTER_STATE) to page_params(), so a cursor whose state does
+not match is rejected as invalid input rather than failing the query.
+"""
+import base64
+import hashlib
+import json
+
+from shared.aio_db import query_all
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+# Resume state shapes: key -> accepted types
+CONTINUATION_STATE = {"ct": str}
+KEYSET_STATE = {"ts": (str, int, float, type(None)), "ids": list}
+AFTER_STATE = {"after": str}
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def _fingerprint(filters: dict) -> str:
+    return hashlib.sha256(json.dumps(filters, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(state: dict, filters: dict) -> str:
+    payload = json.dumps({"f": _fingerprint(filters), "s": state}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, filters: dict, shape: dict) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        state = payload["s"]
+        fingerprint = payload["f"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+    if fingerprint != _fingerprint(filters) or not isinstance(state, dict):
+        raise InvalidCursorError("Cursor does not match this request's filters")
+    if (set(state) != set(shape) or not all(isinstance(state[key], types) for key, types in shape.items())
+            or not all(isinstance(i, str) for i in state.get("ids", []))):
+        raise InvalidCursorError("Invalid cursor")
+    return state
+
+
+def page_params(params, filters: dict, shape: dict) -> tuple[int | None, dict | None]:
+    """
+    Reads page_size/cursor from the request params. Returns (None, None) when
+    the request is not paginated, else (page_size, resume state or None for
+    the first page). shape is the resume state the endpoint's reader expects.
+    Raises ValueError (InvalidCursorError) on bad input.
+    """
+    page_size_param = params.get('page_size')
+    cursor = params.get('cursor')
+    if page_size_param is None and cursor is None:
+        return None, None
+
+    page_size = DEFAULT_PAGE_SIZE
+    if page_size_param is not None:
+        try:
+            page_size = int(page_size_param)
+        except ValueError:
+            raise ValueError(f"page_size must be an integer between 1 and {MAX_PAGE_SIZE}")
+        if not 1 <= page_size <= MAX_PAGE_SIZE:
+            raise ValueError(f"page_size must be an integer between 1 and {MAX_PAGE_SIZE}")
+    return page_size, (decode_cursor(cursor, filters, shape) if cursor else None)
+
+
+def page_body(items: list, next_state: dict | None, filters: dict) -> str:
+    return json.dumps({"items": items, "next_cursor": encode_cursor(next_state, filters) if next_state else None})
+
+
+def read_page(container, query: str, parameters: list, page_size: int, state: dict | None,
+              **query_kwargs) -> tuple[list, dict | None]:
+    """One page of an unordered query, resumed from the Cosmos continuation token in state."""
+    pages = container.query_items(query=query, parameters=parameters, max_item_count=page_size,
+                                  **query_kwargs).by_page((state or {}).get("ct"))
+    items: list = []
+    for page in pages:
+        items.extend(page)
+        # Cross-partition reads can return empty pages before the next partition
+        if items:
+            break
+    token = pages.continuation_token
+    return items, ({"ct": token} if token else None)
+
+
+def read_keyset_page(container, select_fields: str, where_clauses: list[str], parameters: list, page_size: int,
+                     state: dict | None, **query_kwargs) -> tuple[list, dict | None]:
+    """
+    One page of `SELECT select_fields ... ORDER BY c.timestamp DESC`.
+    select_fields must include c.id and c.timestamp.
+    """
+    query, params = _keyset_query(select_fields, where_clauses, parameters, page_size, state)
+    items = list(container.query_items(query=query, parameters=params, **query_kwargs))
+    return _keyset_result(items, page_size, state)
+
+
+async def read_keyset_page_async(container, select_fields: str, where_clauses: list[str], parameters: list,
+                                 page_size: int, state: dict | None, **query_kwargs) -> tuple[list, dict | None]:
+    """read_keyset_page() on an azure.cosmos.aio container."""
+    query, params = _keyset_query(select_fields, where_clauses, parameters, page_size, state)
+    return _keyset_result(await query_all(container, query, params, **query_kwargs), page_size, state)
+
+
+def _keyset_query(select_fields: str, where_clauses: list[str], parameters: list, page_size: int,
+                  state: dict | None) -> tuple[str, list]:
+    where = list(where_clauses)
+    params = list(parameters)
+    if state:
+        where.append("c.timestamp <= @cursor_ts AND NOT ARRAY_CONTAINS(@cursor_ids, c.id)")
+        params += [{"name": "@cursor_ts", "value": state["ts"]}, {"name": "@cursor_ids", "value": state["ids"]}]
+
+    # One extra row tells whether another page exists
+    query = (f"SELECT TOP {page_size + 1} {select_fields} FROM c"
+             + (f" WHERE {' AND '.join(where)}" if where else "") + " ORDER BY c.timestamp DESC")
+    return query, params
+
+
+def _keyset_result(items: list, page_size: int, state: dict | None) -> tuple[list, dict | None]:
+    if len(items) <= page_size:
+        return items, None
+
+    items = items[:page_size]
+    last_ts = items[-1].get('timestamp')
+    ids = [item['id'] for item in items if item.get('timestamp') == last_ts]
+    if state and state.get("ts") == last_ts:
+        ids = state["ids"] + ids
+    return items, {"ts": last_ts, "ids": ids}
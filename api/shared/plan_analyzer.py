@@ -0,0 +1,186 @@
+"""
+Single-pass analysis of a Terraform plan JSON (`terraform show -json`).
+
+`manual_ingest` used to walk the same plan once per concern (providers,
+platform, dependency scan, resource graph, pruning, drift count). The
+PlanAnalyzer collects all of those in one traversal of each plan section and
+returns them as a typed PlanAnalysis.
+
+Missing or null sections and fields are treated as empty. As before the
+single pass, the dependency scan and the resource graph are best effort: if
+either fails, it is logged and left empty (or partial) instead of rejecting
+the plan.
+"""
+import logging
+from dataclasses import dataclass, field
+from shared.component_matcher import ComponentMatcher
+from shared.drift_summary import add_resource_change, changed_resources, empty_drift_summary
+from shared.resource_graph import ResourceGraphBuilder
+
+PLATFORM_PREFIXES = (
+    ("azurerm_", "Azure"),
+    ("aws_", "AWS"),
+    ("google_", "GCP"),
+)
+
+
+@dataclass
+class PlanAnalysis:
+    terraform_version: str | None = None
+    timestamp: str | None = None
+    providers: list[str] = field(default_factory=list)
+    cloud_platform: str = "Unknown"
+    dependencies: list[str] = field(default_factory=list)
+    resource_graph: dict = field(default_factory=lambda: {"nodes": [], "edges": []})
+    pruned_plan: dict = field(default_factory=dict)
+    # Occurrences of each raw action name across resource_changes
+    action_counts: dict[str, int] = field(default_factory=dict)
+    # Resources whose actions include create, update or delete
+    changed_resources: int = 0
+    # Canonical counters stored on the plan document (see shared.drift_summary)
+    drift_summary: dict[str, int] = field(default_factory=empty_drift_summary)
+
+
+class PlanAnalyzer:
+    """
+    Analyzes Terraform plans for one project.
+
+    component_matcher drives the heuristic dependency scan (see
+    shared.component_matcher); self_component_id is excluded from the matches
+    so a component never depends on itself.
+    """
+
+    def __init__(self, component_matcher: ComponentMatcher | None = None, self_component_id: str | None = None):
+        self.component_matcher = component_matcher
+        self.self_component_id = self_component_id
+
+    def analyze(self, tf_plan: dict) -> PlanAnalysis:
+        result = PlanAnalysis(
+            terraform_version=tf_plan.get('terraform_version'),
+            timestamp=tf_plan.get('timestamp'),
+        )
+        found_dependencies: set[str] = set()
+
+        config = tf_plan.get('configuration') or {}
+        result.providers = list((config.get('provider_config') or {}).keys())
+
+        # Variables only feed the dependency scan
+        try:
+            for var_val in (tf_plan.get('variables') or {}).values():
+                if isinstance(var_val, dict):
+                    self._match_components(var_val.get('value'), found_dependencies)
+        except Exception as e:
+            logging.error(f"Dependency scan of plan variables failed: {e}")
+
+        # Configuration module tree: graph nodes/edges, plus the dependency
+        # scan for root-module resources
+        try:
+            graph = ResourceGraphBuilder()
+            self._walk_module(config.get('root_module') or {}, graph, found_dependencies, is_root=True)
+            result.resource_graph = graph.build()
+        except Exception as e:
+            logging.error(f"Failed to build resource graph: {e}")
+            result.resource_graph = {"nodes": [], "edges": []}
+
+        # resource_changes: platform detection, pruning and action counts
+        pruned_plan = {}
+        for key in ('format_version', 'terraform_version', 'timestamp'):
+            if key in tf_plan:
+                pruned_plan[key] = tf_plan[key]
+
+        if 'resource_changes' in tf_plan:
+            refined_changes = []
+            action_counts: dict[str, int] = {}
+            summary = empty_drift_summary()
+            platform = "Unknown"
+
+            for rc in tf_plan['resource_changes'] or []:
+                if not isinstance(rc, dict):
+                    continue
+                rtype = rc.get('type')
+                if platform == "Unknown" and isinstance(rtype, str):
+                    for prefix, name in PLATFORM_PREFIXES:
+                        if rtype.startswith(prefix):
+                            platform = name
+                            break
+
+                change_data = rc.get('change') if isinstance(rc.get('change'), dict) else {}
+                actions = change_data.get('actions') or []
+                for action in actions:
+                    action_counts[action] = action_counts.get(action, 0) + 1
+                add_resource_change(summary, rc)
+
+                # Extract Resource Group Name
+                after_data = change_data.get('after')
+                rg_name = after_data.get('resource_group_name') if isinstance(after_data, dict) else None
+                if not rg_name:
+                    before_data = change_data.get('before')
+                    rg_name = before_data.get('resource_group_name') if isinstance(before_data, dict) else None
+
+                refined = {
+                    'address': rc.get('address'),
+                    'type': rtype,
+                    'name': rc.get('name'),
+                    'resource_group': rg_name,
+                    'change': {
+                        'actions': actions
+                    }
+                }
+                # Kept so drift_summary can be recomputed from the pruned plan
+                if rc.get('previous_address'):
+                    refined['previous_address'] = rc['previous_address']
+                if change_data.get('importing'):
+                    refined['change']['importing'] = change_data['importing']
+                refined_changes.append(refined)
+
+            pruned_plan['resource_changes'] = refined_changes
+            result.cloud_platform = platform
+            result.action_counts = action_counts
+            result.drift_summary = summary
+            result.changed_resources = changed_resources(summary)
+
+        result.pruned_plan = pruned_plan
+        found_dependencies.discard(self.self_component_id)
+        result.dependencies = list(found_dependencies)
+        return result
+
+    def _match_components(self, text, found: set) -> None:
+        if self.component_matcher is not None:
+            self.component_matcher.scan_into(text, found)
+
+    def _walk_module(self, module: dict, graph: ResourceGraphBuilder, found_dependencies: set,
+                     is_root: bool, module_path: str = "") -> None:
+        prefix = f"{module_path}." if module_path else ""
+
+        for res in module.get("resources") or []:
+            if not isinstance(res, dict):
+                continue
+            res_addr = res.get("address")
+            expressions = res.get("expressions") or {}
+
+            if is_root:
+                self._match_components(res.get('name'), found_dependencies)
+
+            if res_addr:
+                res_addr = prefix + res_addr
+                graph.add_resource(res_addr, res.get("name"), res.get("type"), module_path)
+                # explicit depends_on, and implicit expression references
+                # (e.g. "azurerm_resource_group.rg.name")
+                graph.add_resource_references(res_addr, res.get("depends_on"), expressions, module_path)
+
+            if is_root and self.component_matcher is not None:
+                for expr_val in expressions.values():
+                    if isinstance(expr_val, dict):
+                        self._match_components(expr_val.get('constant_value'), found_dependencies)
+
+        # configuration block: module calls declare resources relative to the module
+        for call_name, call in (module.get("module_calls") or {}).items():
+            child = call.get("module") if isinstance(call, dict) else None
+            if child:
+                self._walk_module(child, graph, found_dependencies, is_root=False,
+                                  module_path=f"{prefix}module.{call_name}")
+
+        # planned_values-style child modules already carry full addresses
+        for child in module.get("child_modules") or []:
+            if isinstance(child, dict):
+                self._walk_module(child, graph, found_dependencies, is_root=False)
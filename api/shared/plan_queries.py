@@ -0,0 +1,236 @@
+"""
+Top-N-per-component plan retrieval and field projections for list_plans.
+
+Cosmos SQL has no per-group LIMIT, so list_plans used to run one
+`ORDER BY c.timestamp DESC OFFSET 0 LIMIT 50` query per component, one after
+another (1 + components round trips per dashboard load). latest_per_component()
+instead:
+
+1. reads the merged history newest-first in a single query, keeping up to
+   `per_component` items per component, until every component is full or a
+   row budget is spent;
+2. for the (usually few, rarely-updated) components still short after the
+   budget, fetches only the rows older than where the merged read stopped,
+   concurrently with a bounded thread pool (latest_per_component_async():
+   bounded concurrent tasks on the aio client).
+
+The result is the same set of documents as the per-component loop.
+
+plan_select_fields() maps list_plans' `view=` / `fields=` parameters to a
+whitelisted SELECT list, so callers that only need timestamps and counters
+do not pull resource_changes, graphs and dependencies.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from shared.aio_db import query_all
+from shared.cosmos_metrics import propagate_context
+
+# Rows read by the merged query per expected result row before falling back
+# to per-component queries for the stragglers.
+MERGED_READ_FACTOR = 2
+
+
+# Projectable list_plans fields and their SELECT expressions
+PLAN_FIELD_EXPRESSIONS = {
+    "id": "c.id",
+    "project_id": "c.project_id",
+    "component_id": "c.component_id",
+    "component_name": "c.component_name",
+    "environment": "c.environment",
+    "branch": "c.branch",
+    "timestamp": "c.timestamp",
+    "terraform_version": "c.terraform_version",
+    "providers": "c.providers",
+    "cloud_platform": "c.cloud_platform",
+    "dependencies": "c.dependencies",
+    "graph_url": "c.graph_url",
+    # Only plans from before the graph store embed their graph (see shared/graph_store.py)
+    "resource_graph": "c.resource_graph",
+    "drift_summary": "c.drift_summary",
+    "resource_changes": "{'resource_changes': c.terraform_plan.resource_changes} AS terraform_plan",
+}
+
+# Used by views only: resource_changes for plans stored before drift_summary
+# (until backfilled), so clients can still count their changes
+VIEW_FIELD_EXPRESSIONS = {
+    "legacy_resource_changes": (
+        "(IS_DEFINED(c.drift_summary) ? {} : {'resource_changes': c.terraform_plan.resource_changes}) AS terraform_plan"
+    ),
+}
+
+# Always selected: identify a plan and drive ordering/grouping
+KEY_FIELDS = ("id", "project_id", "component_id", "component_name", "environment", "branch", "timestamp")
+
+PLAN_LIST_VIEWS = {
+    # Scalars and the drift_summary counters only (overview charts, tables)
+    "summary": KEY_FIELDS + ("terraform_version", "cloud_platform", "drift_summary", "legacy_resource_changes"),
+    "changes": KEY_FIELDS + ("drift_summary", "resource_changes"),
+    # Graphs themselves are fetched per plan from get_plan_graph
+    "graph": KEY_FIELDS + ("dependencies", "graph_url", "resource_graph", "resource_changes"),
+    "full": tuple(PLAN_FIELD_EXPRESSIONS),
+}
+DEFAULT_VIEW = "full"
+
+
+def plan_select_fields(view: str | None = None, fields: str | None = None) -> str:
+    """
+    SELECT list for list_plans from a view name or a comma-separated field
+    list (KEY_FIELDS are always included). Raises ValueError on unknown
+    names or when both are given.
+    """
+    if view and fields:
+        raise ValueError("Pass either view or fields, not both")
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in requested if f not in PLAN_FIELD_EXPRESSIONS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(PLAN_FIELD_EXPRESSIONS)}")
+        selected = list(KEY_FIELDS) + [f for f in requested if f not in KEY_FIELDS]
+    else:
+        view = view or DEFAULT_VIEW
+        if view not in PLAN_LIST_VIEWS:
+            raise ValueError(f"view must be one of: {', '.join(PLAN_LIST_VIEWS)}")
+        selected = PLAN_LIST_VIEWS[view]
+    expressions = {**PLAN_FIELD_EXPRESSIONS, **VIEW_FIELD_EXPRESSIONS}
+    return ", ".join(expressions[f] for f in dict.fromkeys(selected))
+
+
+def _max_workers() -> int:
+    try:
+        return max(1, int(os.environ.get("LIST_PLANS_QUERY_CONCURRENCY", "8")))
+    except ValueError:
+        return 8
+
+
+class _LatestCollector:
+    """The per-component buckets of latest_per_component(), shared by its sync and async forms."""
+
+    def __init__(self, select_fields: str, where_clauses: list[str], parameters: list[dict], per_component: int):
+        self.select_fields = select_fields
+        self.where = ' AND '.join(where_clauses)
+        self.parameters = parameters
+        self.per_component = per_component
+        self.collected: dict[str, list[dict]] = {}
+        self.remaining = 0
+        self.budget = 0
+        self.last_timestamp = None
+        self.exhausted = True
+
+    def component_query(self) -> str:
+        return f"SELECT DISTINCT VALUE c.component_id FROM c WHERE {self.where}"
+
+    def start(self, component_ids: list) -> bool:
+        """Sets up the buckets; False if there is nothing to read."""
+        component_ids = [cid for cid in component_ids if cid]
+        self.collected = {cid: [] for cid in component_ids}
+        self.remaining = len(component_ids)
+        self.budget = len(component_ids) * self.per_component * MERGED_READ_FACTOR
+        return bool(component_ids)
+
+    def merged_query(self) -> str:
+        return f"SELECT {self.select_fields} FROM c WHERE {self.where} ORDER BY c.timestamp DESC"
+
+    def add(self, item: dict) -> bool:
+        """Takes one row of the merged read; False once the read should stop."""
+        self.budget -= 1
+        bucket = self.collected.get(item.get('component_id'))
+        if bucket is not None and len(bucket) < self.per_component:
+            bucket.append(item)
+            if len(bucket) == self.per_component:
+                self.remaining -= 1
+        self.last_timestamp = item.get('timestamp')
+        if self.remaining == 0:
+            return False
+        if self.budget <= 0:
+            self.exhausted = False
+            return False
+        return True
+
+    def short_components(self) -> list[str]:
+        """Components to complete with fetch_rest_query() after a merged read cut short by the budget."""
+        if self.exhausted or not self.remaining:
+            return []
+        return [cid for cid, bucket in self.collected.items() if len(bucket) < self.per_component]
+
+    def fetch_rest_query(self, cid: str) -> tuple[str, list[dict]]:
+        # Everything newer than last_timestamp has been seen; fetch the rest
+        # of the component from there (<= and the id check in merge() cover
+        # plans sharing the boundary timestamp).
+        query = (f"SELECT {self.select_fields} FROM c WHERE {self.where} AND c.component_id = @cid "
+                 f"AND c.timestamp <= @before_ts ORDER BY c.timestamp DESC OFFSET 0 LIMIT {self.per_component}")
+        return query, self.parameters + [{"name": "@cid", "value": cid}, {"name": "@before_ts", "value": self.last_timestamp}]
+
+    def merge(self, cid: str, items: list[dict]) -> None:
+        bucket = self.collected[cid]
+        seen = {item['id'] for item in bucket}
+        for item in items:
+            if len(bucket) >= self.per_component:
+                break
+            if item['id'] not in seen:
+                bucket.append(item)
+
+    def result(self) -> list[dict]:
+        all_items = [item for bucket in self.collected.values() for item in bucket]
+        # Sort combined results newest first
+        all_items.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+        return all_items
+
+
+def latest_per_component(container, select_fields: str, where_clauses: list[str], parameters: list[dict],
+                         per_component: int = 50, **query_kwargs) -> list[dict]:
+    """
+    Returns up to per_component newest plans (by timestamp) of each component
+    matching where_clauses, sorted newest first. select_fields must include
+    c.id, c.component_id and c.timestamp. query_kwargs (partition scope) are
+    passed to every query.
+    """
+    collector = _LatestCollector(select_fields, where_clauses, parameters, per_component)
+    if not collector.start(list(container.query_items(query=collector.component_query(), parameters=parameters,
+                                                      **query_kwargs))):
+        return []
+
+    for item in container.query_items(query=collector.merged_query(), parameters=parameters,
+                                      max_item_count=min(collector.budget, 1000), **query_kwargs):
+        if not collector.add(item):
+            break
+
+    short = collector.short_components()
+    if short:
+        def fetch_rest(cid: str) -> tuple[str, list[dict]]:
+            query, params = collector.fetch_rest_query(cid)
+            return cid, list(container.query_items(query=query, parameters=params, **query_kwargs))
+
+        with ThreadPoolExecutor(max_workers=min(_max_workers(), len(short))) as pool:
+            for cid, items in pool.map(propagate_context(fetch_rest), short):
+                collector.merge(cid, items)
+
+    return collector.result()
+
+
+async def latest_per_component_async(container, select_fields: str, where_clauses: list[str], parameters: list[dict],
+                                     per_component: int = 50, **query_kwargs) -> list[dict]:
+    """latest_per_component() on an azure.cosmos.aio container; the stragglers are fetched as concurrent tasks."""
+    collector = _LatestCollector(select_fields, where_clauses, parameters, per_component)
+    if not collector.start(await query_all(container, collector.component_query(), parameters, **query_kwargs)):
+        return []
+
+    async for item in container.query_items(query=collector.merged_query(), parameters=parameters,
+                                            max_item_count=min(collector.budget, 1000), **query_kwargs):
+        if not collector.add(item):
+            break
+
+    short = collector.short_components()
+    if short:
+        limit = asyncio.Semaphore(_max_workers())
+
+        async def fetch_rest(cid: str) -> list[dict]:
+            query, params = collector.fetch_rest_query(cid)
+            async with limit:
+                return await query_all(container, query, params, **query_kwargs)
+
+        for cid, items in zip(short, await asyncio.gather(*(fetch_rest(cid) for cid in short))):
+            collector.merge(cid, items)
+
+    return collector.result()
@@ -0,0 +1,103 @@
+"""
+Streaming extraction of the parts of a Terraform plan that PlanAnalyzer needs.
+
+`req.get_json()` materialises the whole plan, including every `before` /
+`after` state in `resource_changes`, as Python objects. read_plan_skeleton()
+instead walks the raw bytes with an incremental JSON parser (ijson) and keeps:
+
+* `format_version`, `terraform_version`, `timestamp`
+* `variables` and `configuration` (dependency scan and resource graph)
+* `resource_changes`, one item at a time, reduced to the fields the pruned
+  Cosmos document keeps
+
+so peak memory stays close to the size of the pruned output rather than a
+multiple of the upload.
+"""
+import io
+import ijson
+
+SCALAR_KEYS = ("format_version", "terraform_version", "timestamp")
+SUBTREE_KEYS = ("variables", "configuration")
+RESOURCE_CHANGE_PREFIX = "resource_changes.item"
+
+_CONTAINER_START = ("start_map", "start_array")
+_CONTAINER_END = ("end_map", "end_array")
+
+
+def _slim_resource_change(rc: dict) -> dict:
+    """
+    Keeps only what PlanAnalyzer reads from a resource change. A `change`
+    that is not an object is kept as an empty change (no actions), like
+    PlanAnalyzer treats it.
+    """
+    change = rc.get("change")
+    if not isinstance(change, dict):
+        change = {}
+    slim_change = {"actions": change.get("actions", [])}
+    if change.get("importing"):
+        slim_change["importing"] = change["importing"]
+    for state_key in ("after", "before"):
+        state = change.get(state_key)
+        if isinstance(state, dict) and state.get("resource_group_name"):
+            slim_change[state_key] = {"resource_group_name": state["resource_group_name"]}
+    slim = {
+        "address": rc.get("address"),
+        "type": rc.get("type"),
+        "name": rc.get("name"),
+        "change": slim_change,
+    }
+    if rc.get("previous_address"):
+        slim["previous_address"] = rc["previous_address"]
+    return slim
+
+
+def read_plan_skeleton(body: bytes | io.BufferedIOBase) -> dict:
+    """
+    Parses a plan JSON document (bytes or a binary file object) into a plan
+    dict that PlanAnalyzer accepts, without ever holding the full
+    resource_changes states in memory. Raises ValueError on malformed JSON.
+    """
+    stream = io.BytesIO(body) if isinstance(body, (bytes, bytearray, memoryview)) else body
+
+    skeleton: dict = {}
+    builder = None
+    build_prefix = None
+    depth = 0
+
+    try:
+        for prefix, event, value in ijson.parse(stream, use_float=True):
+            if builder is not None:
+                builder.event(event, value)
+                if event in _CONTAINER_START:
+                    depth += 1
+                elif event in _CONTAINER_END:
+                    depth -= 1
+                if depth == 0:
+                    _store(skeleton, build_prefix, builder.value)
+                    builder = None
+                continue
+
+            if prefix in SCALAR_KEYS:
+                skeleton[prefix] = value
+            elif prefix == "resource_changes" and event == "start_array":
+                skeleton["resource_changes"] = []
+            elif prefix in SUBTREE_KEYS or prefix == RESOURCE_CHANGE_PREFIX:
+                if event in _CONTAINER_START:
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+                    build_prefix = prefix
+                    depth = 1
+                else:
+                    _store(skeleton, prefix, value)
+    except ijson.JSONError as e:
+        raise ValueError(f"Invalid plan JSON: {e}") from e
+
+    return skeleton
+
+
+def _store(skeleton: dict, prefix: str, value) -> None:
+    if prefix == RESOURCE_CHANGE_PREFIX:
+        if isinstance(value, dict):
+            skeleton.setdefault("resource_changes", []).append(_slim_resource_change(value))
+    else:
+        skeleton[prefix] = value
@@ -0,0 +1,90 @@
+"""
+Access to the plans container under either partition scheme.
+
+Plans were stored in `plans`, partitioned on `/id`: point reads were cheap but
+every project-scoped list, cascade delete or series refresh fanned out to all
+physical partitions. The `project` scheme stores them in `plans_by_project`,
+partitioned on `/project_id`, so those queries are served by one partition.
+
+The scheme is selected with the PLANS_PARTITIONING app setting (`id`, the
+default, or `project`) and switched after copying the data with
+tools/migrate_plans_partitioning. Code touching plans goes through this
+module rather than naming the container:
+
+* project_query_kwargs(project_id) for queries filtered on c.project_id;
+* find_plan() / plan_query_kwargs() for lookups by plan id, which are point
+  reads when the partition is known (always under `id`; under `project` when
+  the caller also has the project id, otherwise a fan-out query);
+* plan_partition_key(plan) for deletes and patches (plan must carry id and
+  project_id, so projections used for deletes select c.project_id).
+"""
+import os
+
+from azure.cosmos import exceptions
+
+from shared.aio_db import get_async_container
+from shared.db import get_container
+
+# scheme -> (container, partition key path)
+PARTITION_SCHEMES = {
+    "id": ("plans", "/id"),
+    "project": ("plans_by_project", "/project_id"),
+}
+DEFAULT_SCHEME = "id"
+
+
+def plans_scheme() -> str:
+    scheme = os.environ.get("PLANS_PARTITIONING", DEFAULT_SCHEME).strip().lower() or DEFAULT_SCHEME
+    if scheme not in PARTITION_SCHEMES:
+        raise ValueError(f"PLANS_PARTITIONING must be one of: {', '.join(PARTITION_SCHEMES)}")
+    return scheme
+
+
+def partitioned_by_project(scheme: str | None = None) -> bool:
+    return (scheme or plans_scheme()) == "project"
+
+
+def get_plans_container(scheme: str | None = None):
+    return get_container(*PARTITION_SCHEMES[scheme or plans_scheme()])
+
+
+async def get_plans_container_async(scheme: str | None = None):
+    return await get_async_container(*PARTITION_SCHEMES[scheme or plans_scheme()])
+
+
+def plan_partition_key(plan: dict, scheme: str | None = None) -> str:
+    return plan["project_id"] if partitioned_by_project(scheme) else plan["id"]
+
+
+def project_query_kwargs(project_id: str | None) -> dict:
+    """query_items() kwargs for a query filtered on c.project_id = project_id (if given)."""
+    if project_id and partitioned_by_project():
+        return {"partition_key": project_id}
+    return {"enable_cross_partition_query": True}
+
+
+def plan_query_kwargs(plan_id: str, project_id: str | None = None) -> dict:
+    """query_items() kwargs for a query filtered on c.id = plan_id."""
+    if not partitioned_by_project():
+        return {"partition_key": plan_id}
+    return project_query_kwargs(project_id)
+
+
+def find_plan(plan_id: str, project_id: str | None = None) -> dict | None:
+    """The full plan document, or None if it does not exist (in project_id, if given)."""
+    container = get_plans_container()
+    if not partitioned_by_project() or project_id:
+        try:
+            return container.read_item(item=plan_id, partition_key=project_id if partitioned_by_project() else plan_id)
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+    items = list(container.query_items(
+        query="SELECT * FROM c WHERE c.id = @id",
+        parameters=[{"name": "@id", "value": plan_id}],
+        enable_cross_partition_query=True
+    ))
+    return items[0] if items else None
+
+
+def delete_plan_doc(container, plan: dict) -> None:
+    container.delete_item(item=plan["id"], partition_key=plan_partition_key(plan))
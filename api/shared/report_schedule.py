@@ -0,0 +1,85 @@
+"""
+Schedule index for the weekly reports.
+
+The hourly timer used to read every project document to compare its email
+schedule with the current hour. The `report_schedule` container, partitioned
+by slot ("<Weekday>-<HH>:00", e.g. "Monday-09:00"), holds one small document
+per project with an enabled email report, in the slot of its schedule.
+timer_report reads only the current slot's partition and point-reads those
+projects, so its cost follows the number of due projects.
+
+update_project_settings keeps the index current via sync_project_schedule();
+tools/backfill_report_schedule rebuilds it from the projects container. While
+the index is empty (never backfilled), timer_report scans the projects as
+before and files the scheduled ones itself.
+"""
+from azure.cosmos import exceptions
+from shared.aio_db import get_async_container, query_all
+from shared.db import get_container
+
+SCHEDULE_CONTAINER = "report_schedule"
+PARTITION_KEY_PATH = "/slot"
+
+
+def get_schedule_container():
+    return get_container(SCHEDULE_CONTAINER, PARTITION_KEY_PATH)
+
+
+def slot_key(day: str, time: str) -> str:
+    return f"{day}-{time}"
+
+
+def schedule_slot(project_doc: dict) -> str | None:
+    """The slot in which timer_report handles project_doc, or None if it has no email report."""
+    email_settings = (project_doc.get('notifications') or {}).get('email') or {}
+    if not email_settings.get('enabled') or not email_settings.get('recipients'):
+        return None
+    schedule = email_settings.get('schedule') or {}
+    if not schedule.get('day') or not schedule.get('time'):
+        return None
+    return slot_key(schedule['day'], schedule['time'])
+
+
+def sync_project_schedule(project_doc: dict, previous_slot: str | None) -> None:
+    """Moves the project's index entry from previous_slot to its current slot (adding or removing it as needed)."""
+    container = get_schedule_container()
+    slot = schedule_slot(project_doc)
+
+    if previous_slot and previous_slot != slot:
+        remove_project_schedule(project_doc['id'], previous_slot)
+    if slot:
+        container.upsert_item({"id": project_doc['id'], "slot": slot, "project_name": project_doc.get('name')})
+
+
+def remove_project_schedule(project_id: str, slot: str) -> None:
+    try:
+        get_schedule_container().delete_item(item=project_id, partition_key=slot)
+    except exceptions.CosmosResourceNotFoundError:
+        pass
+
+
+def get_due_project_ids(slot: str) -> list[str]:
+    """Ids of the projects scheduled in slot (single-partition query)."""
+    return [item['id'] for item in get_schedule_container().query_items(
+        query="SELECT c.id FROM c", partition_key=slot)]
+
+
+async def get_due_project_ids_async(slot: str) -> list[str]:
+    container = await get_async_container(SCHEDULE_CONTAINER, PARTITION_KEY_PATH)
+    return [item['id'] for item in await query_all(container, "SELECT c.id FROM c", partition_key=slot)]
+
+
+async def schedule_index_empty_async() -> bool:
+    """Whether no project at all is filed (e.g. tools.backfill_report_schedule has never run)."""
+    container = await get_async_container(SCHEDULE_CONTAINER, PARTITION_KEY_PATH)
+    return not await query_all(container, "SELECT TOP 1 c.id FROM c", enable_cross_partition_query=True)
+
+
+def file_project_schedules(projects: list[dict]) -> int:
+    """Files each project with an email report under its slot. Returns the number filed."""
+    filed = 0
+    for project in projects:
+        if schedule_slot(project):
+            sync_project_schedule(project, None)
+            filed += 1
+    return filed
@@ -1,19 +1,49 @@
 import os
+import re
 import json
-from azure.storage.blob import BlobServiceClient
+import hashlib
+import logging
+import threading
+from collections import Counter
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.cosmos import exceptions as cosmos_exceptions
+from azure.storage.blob import BlobServiceClient, ContentSettings
+from shared.blob_codec import (
+    CODEC_METADATA_KEY, codec_from_properties, compress, content_encoding,
+    decompress, get_default_codec, open_decompressed,
+)
 
 # Use 'AzureWebJobsStorage' for local dev (which usually points to UseDevelopmentStorage=true or a storage account)
 # Or use a specific 'BlobStorageConnection' env var if preferred.
 # For local Azurite, "UseDevelopmentStorage=true" is the standard value.
 
 from azure.identity import DefaultAzureCredential
+from shared.db import get_container
 
-def get_blob_service_client():
+PLANS_CONTAINER = "plans"
+
+# Content-addressed layout: {project_id}/sha256/{digest}.json, shared by every
+# plan document of the project whose plan hashes to digest. Resource graphs use
+# {project_id}/graphs/sha256/{digest}.json (see shared/graph_store.py).
+# Reference counts live in the Cosmos 'plan_blobs' container (one document per blob).
+CONTENT_DIR = "sha256"
+GRAPH_DIR = "graphs"
+BLOB_REFS_CONTAINER = "plan_blobs"
+
+# Process-wide client: BlobServiceClient is thread-safe and owns the HTTP
+# transport (connection pool), so every helper below shares one of each.
+_lock = threading.Lock()
+_service_client: BlobServiceClient | None = None
+_plans_container_client = None
+
+
+def _create_blob_service_client() -> BlobServiceClient:
     connection_string = os.environ.get("BlobStorageConnection")
-    
+
     if connection_string:
          return BlobServiceClient.from_connection_string(connection_string)
-         
+
     # Fallback/Primary for Azure: Use Managed Identity
     # We need the storage account URL.
     # In Bicep we set AzureWebJobsStorage__accountName, but we might not have it as a clear env var for general use?
@@ -21,86 +51,283 @@ def get_blob_service_client():
     # Checking Bicep again... we have 'AzureWebJobsStorage__accountName' which is specific to Functions runtime.
     # Let's add STORAGE_ACCOUNT_NAME to Bicep, effectively.
     # OR, safely infer it from the AzureWebJobsStorage__accountName if possible, but that's risky if format changes.
-    
+
     # Better: Use a dedicated env var 'STORAGE_ACCOUNT_NAME'
     account_name = os.environ.get("STORAGE_ACCOUNT_NAME")
     if account_name:
         account_url = f"https://{account_name}.blob.core.windows.net"
         return BlobServiceClient(account_url=account_url, credential=DefaultAzureCredential())
-        
+
     # Last Resort (Local Dev default)
     # Azurite often lags behind the latest API version. We pin it to a stable recent version supported by Azurite 3.x
     return BlobServiceClient.from_connection_string("UseDevelopmentStorage=true", api_version="2019-12-12")
 
-def upload_plan_blob(plan_data: dict, project_id: str, component_id: str, environment: str, plan_id: str) -> str:
+
+def get_blob_service_client() -> BlobServiceClient:
+    """Returns the process-wide BlobServiceClient, creating it on first use."""
+    global _service_client
+    if _service_client is None:
+        with _lock:
+            if _service_client is None:
+                _service_client = _create_blob_service_client()
+    return _service_client
+
+
+def get_plans_container_client():
+    """
+    Returns the 'plans' container client. The container is created at most once
+    per process; an existing container is not an error.
+    """
+    global _plans_container_client
+    if _plans_container_client is None:
+        service_client = get_blob_service_client()
+        with _lock:
+            if _plans_container_client is None:
+                container_client = service_client.get_container_client(PLANS_CONTAINER)
+                try:
+                    container_client.create_container()
+                except ResourceExistsError:
+                    pass
+                _plans_container_client = container_client
+    return _plans_container_client
+
+
+def blob_name_from_url(blob_url: str) -> str | None:
+    # URL format: https://<account_name>.blob.core.windows.net/plans/<blob_name>
+    parts = blob_url.split(f"{PLANS_CONTAINER}/", 1)
+    if len(parts) <= 1:
+        return None
+    return parts[1]
+
+
+def plan_content_digest(data_bytes: bytes, plan_timestamp: str | None = None) -> str:
+    """
+    SHA-256 of the plan JSON with the top-level plan timestamp masked out, so
+    re-running an unchanged plan (e.g. a nightly drift check) hashes the same.
+    The plan document keeps its own timestamp.
+    """
+    if plan_timestamp:
+        pattern = rb'"timestamp"\s*:\s*"' + re.escape(plan_timestamp.encode('utf-8')) + rb'"'
+        data_bytes = re.sub(pattern, b'"timestamp":null', data_bytes, count=1)
+    return hashlib.sha256(data_bytes).hexdigest()
+
+
+def content_blob_name(project_id: str, digest: str, subdir: str | None = None) -> str:
+    return f"{project_id}/{subdir + '/' if subdir else ''}{CONTENT_DIR}/{digest}.json"
+
+
+def _is_content_blob(blob_name: str) -> bool:
+    parts = blob_name.split("/")
+    return ((len(parts) == 3 and parts[1] == CONTENT_DIR)
+            or (len(parts) == 4 and parts[1] == GRAPH_DIR and parts[2] == CONTENT_DIR))
+
+
+def blob_ref_id(blob_name: str) -> str:
+    # Cosmos ids cannot contain '/'
+    return blob_name.replace("/", ":")
+
+
+def upload_plan_blob(plan_data: dict | bytes, project_id: str, plan_timestamp: str | None = None) -> str:
     """
-    Uploads a plan JSON to blob storage.
+    Stores a plan JSON in the project's content-addressed blob store and takes
+    a reference on it. Identical plans (ignoring plan_timestamp) share one blob:
+    only the first upload writes it, later ones just bump its reference count.
+    plan_data is either the parsed plan or its raw JSON bytes.
+    The JSON is compressed with the configured codec (PLAN_BLOB_CODEC, gzip by default).
     Returns the Blob URL (or path) for reference.
-    Folder Structure: plans/{project_id}/{component_id}/{environment}/{plan_id}.json
-    """
-    container_name = "plans"
-    blob_name = f"{project_id}/{component_id}/{environment}/{plan_id}.json"
-    
-    blob_service_client = get_blob_service_client()
-    container_client = blob_service_client.get_container_client(container_name)
-    
-    # Ensure container exists
-    if not container_client.exists():
-        container_client.create_container()
-        
-    blob_client = container_client.get_blob_client(blob_name)
-    
-    data_bytes = json.dumps(plan_data).encode('utf-8')
-    blob_client.upload_blob(data_bytes, overwrite=True)
-    
+    Folder Structure: plans/{project_id}/sha256/{digest}.json
+    """
+    blob_name, data_bytes = plan_blob_content(plan_data, project_id, plan_timestamp)
+    return store_content_blob(project_id, blob_name, data_bytes)
+
+
+def plan_blob_content(plan_data: dict | bytes, project_id: str, plan_timestamp: str | None = None) -> tuple[str, bytes]:
+    """The content-addressed blob name and JSON bytes of a plan (see upload_plan_blob)."""
+    if isinstance(plan_data, (bytes, bytearray, memoryview)):
+        data_bytes = bytes(plan_data)
+    else:
+        data_bytes = json.dumps(plan_data).encode('utf-8')
+        plan_timestamp = plan_timestamp or plan_data.get('timestamp')
+    return content_blob_name(project_id, plan_content_digest(data_bytes, plan_timestamp)), data_bytes
+
+
+def store_content_blob(project_id: str, blob_name: str, data_bytes: bytes) -> str:
+    """
+    Takes a reference on the content-addressed blob_name, writing data_bytes
+    only if no reference exists yet. Returns the blob URL.
+    """
+    blob_client = get_plans_container_client().get_blob_client(blob_name)
+
+    refs_container = get_container(BLOB_REFS_CONTAINER, "/id")
+    ref_id = blob_ref_id(blob_name)
+
+    if _add_blob_refs(refs_container, ref_id, 1):
+        return blob_client.url
+
+    # First reference: (re)write the blob. Overwriting even if a blob is
+    # already there gives it a fresh ETag, which is kept on the reference
+    # document so a concurrent release of the previous generation (whose
+    # conditional delete uses the old ETag) cannot remove it.
+    etag = write_plan_bytes(blob_client, data_bytes).get("etag")
+
+    try:
+        refs_container.create_item({
+            "id": ref_id,
+            "project_id": project_id,
+            "blob_name": blob_name,
+            "refcount": 1,
+            "blob_etag": etag,
+        })
+    except cosmos_exceptions.CosmosResourceExistsError:
+        if not _add_blob_refs(refs_container, ref_id, 1):
+            raise
     return blob_client.url
 
+
+def record_blob_etag(blob_name: str, etag: str) -> None:
+    """Updates the ETag tracked for a content-addressed blob after it was rewritten in place (e.g. recompressed)."""
+    if not _is_content_blob(blob_name):
+        return
+    ref_id = blob_ref_id(blob_name)
+    try:
+        get_container(BLOB_REFS_CONTAINER, "/id").patch_item(
+            item=ref_id,
+            partition_key=ref_id,
+            patch_operations=[{"op": "set", "path": "/blob_etag", "value": etag}]
+        )
+    except cosmos_exceptions.CosmosResourceNotFoundError:
+        pass
+
+
+def _add_blob_refs(refs_container, ref_id: str, delta: int) -> dict | None:
+    """Atomically adds delta to a blob's reference count. Returns the updated document, or None if untracked."""
+    try:
+        return refs_container.patch_item(
+            item=ref_id,
+            partition_key=ref_id,
+            patch_operations=[{"op": "incr", "path": "/refcount", "value": delta}]
+        )
+    except cosmos_exceptions.CosmosResourceNotFoundError:
+        return None
+
+
+def write_plan_bytes(blob_client, data_bytes: bytes, codec: str | None = None, **kwargs) -> dict:
+    """Compresses plan JSON bytes and uploads them, recording the codec. Returns the upload result (etag, last_modified)."""
+    codec = codec or get_default_codec()
+    return blob_client.upload_blob(compress(data_bytes, codec), **plan_upload_options(codec), **kwargs)
+
+
+def plan_upload_options(codec: str) -> dict:
+    """upload_blob() options of a plan blob compressed with codec."""
+    return {
+        "overwrite": True,
+        "metadata": {CODEC_METADATA_KEY: codec},
+        "content_settings": ContentSettings(content_type="application/json", content_encoding=content_encoding(codec)),
+    }
+
+
 def download_plan_blob(blob_url: str) -> bytes | None:
     """
     Downloads a plan JSON from blob storage given its URL.
-    Returns the raw bytes of the blob content, or None if not found.
+    Returns the (decompressed) JSON bytes of the blob content, or None if not found.
     """
-    if not blob_url:
+    downloader = _open_plan_download(blob_url)
+    if downloader is None:
         return None
+    return decompress(downloader.readall(), codec_from_properties(downloader.properties))
 
-    container_name = "plans"
-    parts = blob_url.split(f"{container_name}/")
-    if len(parts) <= 1:
+
+def open_plan_blob_stream(blob_url: str):
+    """
+    Opens a plan blob for streaming reads. Returns a binary file object that
+    yields the decompressed JSON chunk by chunk, or None if not found.
+    """
+    downloader = _open_plan_download(blob_url)
+    if downloader is None:
         return None
+    return open_decompressed(downloader.chunks(), codec_from_properties(downloader.properties))
+
 
-    blob_name = parts[1]
-    blob_service_client = get_blob_service_client()
-    container_client = blob_service_client.get_container_client(container_name)
-    blob_client = container_client.get_blob_client(blob_name)
+def _open_plan_download(blob_url: str):
+    if not blob_url:
+        return None
 
-    if not blob_client.exists():
+    blob_name = blob_name_from_url(blob_url)
+    if not blob_name:
         return None
 
-    return blob_client.download_blob().readall()
+    blob_client = get_plans_container_client().get_blob_client(blob_name)
+
+    try:
+        # decompress=False: the transport would otherwise decode gzip (but not
+        # zstd) on its own based on Content-Encoding
+        return blob_client.download_blob(decompress=False)
+    except ResourceNotFoundError:
+        return None
 
 
 def delete_plan_blob(blob_url: str) -> None:
     """
-    Deletes a plan JSON from blob storage given its URL.
+    Releases a plan document's reference on its blob, deleting the blob once
+    no plan points at it. Call after the plan document itself is deleted.
     """
-    if not blob_url:
+    delete_plan_blobs([blob_url])
+
+
+def plan_blob_urls(plan_doc: dict) -> list[str]:
+    """The blobs a plan document holds a reference on (plan JSON and resource graph)."""
+    return [url for url in (plan_doc.get('blob_url'), plan_doc.get('graph_url')) if url]
+
+
+def delete_plan_blobs(blob_urls) -> None:
+    """
+    Releases one reference per entry of blob_urls (duplicates release several),
+    with a single reference-count update per distinct blob. Legacy per-plan
+    blobs are not reference counted and are deleted directly.
+    """
+    blob_names = Counter()
+    for blob_url in blob_urls:
+        blob_name = blob_name_from_url(blob_url) if blob_url else None
+        if blob_name:
+            blob_names[blob_name] += 1
+
+    for blob_name, count in blob_names.items():
+        try:
+            if _is_content_blob(blob_name):
+                _release_content_blob(blob_name, count)
+            else:
+                try:
+                    get_plans_container_client().get_blob_client(blob_name).delete_blob()
+                except ResourceNotFoundError:
+                    pass
+        except Exception as e:
+            logging.error(f"Failed to delete blob {blob_name}: {e}")
+            # We don't want a blob deletion failure to stop the DB deletion, so we swallow it here usually
+
+
+def _release_content_blob(blob_name: str, count: int) -> None:
+    refs_container = get_container(BLOB_REFS_CONTAINER, "/id")
+    ref_id = blob_ref_id(blob_name)
+
+    ref_doc = _add_blob_refs(refs_container, ref_id, -count)
+    if ref_doc is None:
+        logging.warning(f"No reference count for blob {blob_name}, leaving it in place")
+        return
+    if ref_doc.get("refcount", 0) > 0:
+        return
+
+    # Last reference gone. Both deletes are conditional: an upload that
+    # re-referenced the document in the meantime changes its ETag, and one
+    # that re-created the blob changes the blob's ETag.
+    try:
+        refs_container.delete_item(item=ref_id, partition_key=ref_id,
+                                   etag=ref_doc.get("_etag"), match_condition=MatchConditions.IfNotModified)
+    except (cosmos_exceptions.CosmosAccessConditionFailedError, cosmos_exceptions.CosmosResourceNotFoundError):
         return
-        
+    condition = {}
+    if ref_doc.get("blob_etag"):
+        condition = {"etag": ref_doc["blob_etag"], "match_condition": MatchConditions.IfNotModified}
     try:
-        # Extract blob name from URL
-        # URL format: https://<account_name>.blob.core.windows.net/plans/<blob_name>
-        container_name = "plans"
-        # Find where 'plans/' starts and take everything after it
-        parts = blob_url.split(f"{container_name}/")
-        if len(parts) > 1:
-            blob_name = parts[1]
-            blob_service_client = get_blob_service_client()
-            container_client = blob_service_client.get_container_client(container_name)
-            blob_client = container_client.get_blob_client(blob_name)
-            
-            if blob_client.exists():
-                blob_client.delete_blob()
-    except Exception as e:
-        import logging
-        logging.error(f"Failed to delete blob {blob_url}: {e}")
-        # We don't want a blob deletion failure to stop the DB deletion, so we swallow it here usually
+        get_plans_container_client().get_blob_client(blob_name).delete_blob(**condition)
+    except (ResourceModifiedError, ResourceNotFoundError):
+        pass
@@ -0,0 +1,55 @@
+"""
+Apply the declared indexing policies (shared/index_policies.py) to existing containers.
+
+get_container() applies them on first use in each worker, but replacing a
+container's policy is a control-plane operation: when the Function App runs
+under an identity with data-plane access only, run this once per deployment
+with credentials that may manage containers. Cosmos re-indexes online; the
+progress is visible in the portal (Index Transformation Progress).
+
+Run from the api/ folder (uses the same COSMOS_* settings as the Function App):
+    python -m tools.apply_index_policies [--container <name>] [--dry-run]
+"""
+import argparse
+import logging
+
+from azure.cosmos import PartitionKey, exceptions
+
+from shared.db import get_database
+from shared.index_policies import INDEX_POLICIES, INDEX_POLICY_VERSION, ensure_index_policy, policy_matches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--container", default=None, help="Only this container")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which containers differ")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    database = get_database()
+    counts: dict[str, int] = {}
+    for name, wanted in INDEX_POLICIES.items():
+        if args.container and name != args.container:
+            continue
+        container = database.get_container_client(name)
+        try:
+            properties = container.read()
+        except exceptions.CosmosResourceNotFoundError:
+            status = "missing"
+        else:
+            if policy_matches(properties.get("indexingPolicy"), wanted):
+                status = "current"
+            elif args.dry_run:
+                status = "outdated"
+            else:
+                partition_key = PartitionKey(path=properties["partitionKey"]["paths"][0])
+                status = "applied" if ensure_index_policy(database, container, name, partition_key) else "failed"
+        logging.info(f"{name}: {status}")
+        counts[status] = counts.get(status, 0) + 1
+
+    logging.info(f"Index policy v{INDEX_POLICY_VERSION}: " + ", ".join(f"{k}: {v}" for k, v in sorted(counts.items())))
+
+
+if __name__ == "__main__":
+    main()
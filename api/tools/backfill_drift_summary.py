@@ -0,0 +1,91 @@
+"""
+Backfill: add drift_summary counters to plans ingested before they existed.
+
+By default the counters are computed from the pruned resource_changes stored
+on the plan document. Pruned plans written before drift_summary did not keep
+`previous_address` / `change.importing`, so their move and import counts are
+0; pass --from-blob to recount those plans from the original plan JSON in
+blob storage instead (slower: one download per plan).
+
+Re-run tools.backfill_latest_plans afterwards so the latest_plans entries pick
+up the stored counters.
+
+Run from the api/ folder (uses the same COSMOS_* / storage settings as the Function App):
+    python -m tools.backfill_drift_summary [--project <project_id>] [--from-blob] [--force] [--workers 8] [--dry-run]
+"""
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.cosmos import exceptions
+
+from shared.plans_store import get_plans_container, plan_partition_key, project_query_kwargs
+from shared.drift_summary import summarize_resource_changes
+from shared.plan_stream import read_plan_skeleton
+from shared.storage import open_plan_blob_stream
+
+
+def compute_summary(plan: dict, from_blob: bool) -> dict | None:
+    if from_blob and plan.get('blob_url'):
+        stream = open_plan_blob_stream(plan['blob_url'])
+        if stream is not None:
+            with stream:
+                return summarize_resource_changes(read_plan_skeleton(stream).get('resource_changes'))
+        logging.warning(f"{plan['id']}: blob not found, counting the stored resource_changes")
+    return summarize_resource_changes((plan.get('terraform_plan') or {}).get('resource_changes'))
+
+
+def backfill_plan(container, plan: dict, from_blob: bool, dry_run: bool) -> str:
+    summary = compute_summary(plan, from_blob)
+    if dry_run:
+        return "pending"
+    try:
+        container.patch_item(item=plan['id'], partition_key=plan_partition_key(plan),
+                             patch_operations=[{"op": "set", "path": "/drift_summary", "value": summary}])
+    except exceptions.CosmosResourceNotFoundError:
+        return "deleted"
+    return "updated"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--project", default=None, help="Only backfill this project's plans")
+    parser.add_argument("--from-blob", action="store_true", help="Recount from the original plan JSON in blob storage")
+    parser.add_argument("--force", action="store_true", help="Also recompute plans that already have drift_summary")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many plans would be updated")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    where = []
+    parameters = []
+    if not args.force:
+        where.append("NOT IS_DEFINED(c.drift_summary)")
+    if args.project:
+        where.append("c.project_id = @pid")
+        parameters.append({"name": "@pid", "value": args.project})
+
+    container = get_plans_container()
+    plans = container.query_items(
+        query="SELECT c.id, c.project_id, c.blob_url, {'resource_changes': c.terraform_plan.resource_changes} AS terraform_plan FROM c"
+              + (f" WHERE {' AND '.join(where)}" if where else ""),
+        parameters=parameters,
+        # drift_summary / resource_graph are not indexed (shared/index_policies.py)
+        enable_scan_in_query=True,
+        **project_query_kwargs(args.project)
+    )
+
+    counts: dict[str, int] = {}
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for status in pool.map(lambda p: backfill_plan(container, p, args.from_blob, args.dry_run), plans):
+            counts[status] = counts.get(status, 0) + 1
+            done = sum(counts.values())
+            if done % 500 == 0:
+                logging.info(f"{done} plans processed")
+
+    logging.info(", ".join(f"{k}: {v}" for k, v in sorted(counts.items())) or "No plans to backfill")
+
+
+if __name__ == "__main__":
+    main()
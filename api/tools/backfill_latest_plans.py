@@ -0,0 +1,69 @@
+"""
+Backfill: rebuild the latest_plans index from the plans container.
+
+Needed once after deploying the index (plans ingested before it existed are
+not in it), and safe to re-run at any time: each series entry is recomputed
+from the newest approved plan of that series.
+
+Run from the api/ folder (uses the same COSMOS_* settings as the Function App):
+    python -m tools.backfill_latest_plans [--project <project_id>] [--dry-run]
+"""
+import argparse
+import logging
+
+from shared.plans_store import get_plans_container, project_query_kwargs
+from shared.latest_plans import NOT_PENDING, PLAN_ENTRY_FIELDS, entry_from_plan, get_latest_container, remove_entries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--project", default=None, help="Only rebuild this project's entries")
+    parser.add_argument("--dry-run", action="store_true", help="Only report the entries that would be written")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    where = [NOT_PENDING, "IS_DEFINED(c.component_id)", "IS_DEFINED(c.environment)"]
+    parameters = []
+    if args.project:
+        where.append("c.project_id = @pid")
+        parameters.append({"name": "@pid", "value": args.project})
+
+    # One streaming pass; only the newest plan per series is kept in memory
+    latest: dict[tuple[str, str], dict] = {}
+    plans = get_plans_container().query_items(
+        query=f"SELECT {PLAN_ENTRY_FIELDS} FROM c WHERE {' AND '.join(where)}",
+        parameters=parameters,
+        **project_query_kwargs(args.project)
+    )
+    scanned = 0
+    for plan in plans:
+        scanned += 1
+        if not plan.get('component_id'):
+            continue
+        entry = entry_from_plan(plan)
+        key = (entry['project_id'], entry['id'])
+        current = latest.get(key)
+        if current is None or (entry['timestamp'] or '') > (current['timestamp'] or ''):
+            latest[key] = entry
+
+    logging.info(f"Scanned {scanned} plans, {len(latest)} series")
+    if args.dry_run:
+        return
+
+    container = get_latest_container()
+    series_by_project: dict[str, list[str]] = {args.project: []} if args.project else {}
+    for (project_id, entry_id), entry in latest.items():
+        container.upsert_item(entry)
+        series_by_project.setdefault(project_id, []).append(entry_id)
+    logging.info(f"Wrote {len(latest)} latest_plans entries")
+
+    # Drop entries of series that no longer have any plans
+    for project_id, entry_ids in series_by_project.items():
+        removed = remove_entries(project_id, "NOT ARRAY_CONTAINS(@ids, c.id)", [{"name": "@ids", "value": entry_ids}])
+        if removed:
+            logging.info(f"{project_id}: removed {removed} orphaned entries")
+
+
+if __name__ == "__main__":
+    main()
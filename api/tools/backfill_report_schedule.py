@@ -0,0 +1,47 @@
+"""
+Backfill: rebuild the report_schedule index from the projects container.
+
+Needed once after deploying the index (schedules saved before it existed are
+not in it), and safe to re-run: every project is re-filed under the slot of
+its current email schedule and entries of other slots are dropped.
+
+Run from the api/ folder (uses the same COSMOS_* settings as the Function App):
+    python -m tools.backfill_report_schedule [--dry-run]
+"""
+import argparse
+import logging
+
+from shared.db import get_container
+from shared.report_schedule import get_schedule_container, remove_project_schedule, schedule_slot
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Only report the slot of each scheduled project")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    slots: dict[str, str] = {}
+    names: dict[str, str] = {}
+    for project in get_container("projects").query_items(
+            query="SELECT c.id, c.name, c.notifications FROM c", enable_cross_partition_query=True):
+        slot = schedule_slot(project)
+        if slot:
+            slots[project['id']] = slot
+            names[project['id']] = project.get('name')
+            logging.info(f"{project.get('name')} ({project['id']}): {slot}")
+    logging.info(f"{len(slots)} scheduled project(s)")
+    if args.dry_run:
+        return
+
+    container = get_schedule_container()
+    for item in list(container.query_items(query="SELECT c.id, c.slot FROM c", enable_cross_partition_query=True)):
+        if slots.get(item['id']) != item['slot']:
+            remove_project_schedule(item['id'], item['slot'])
+    for project_id, slot in slots.items():
+        container.upsert_item({"id": project_id, "slot": slot, "project_name": names[project_id]})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Local SMTP stand-in for testing report delivery offline.
+
+Speaks enough SMTP for smtplib (EHLO/HELO, AUTH PLAIN/LOGIN accepting any
+credentials, MAIL, RCPT, DATA, RSET, NOOP, QUIT; no STARTTLS, so set the
+project's SMTP `secure` flag off). Received messages are kept in memory and,
+with --out-dir, written as .eml files. --fail-every N answers every Nth DATA
+with a transient 451 to exercise the mailer's retries.
+
+Run from the api/ folder:
+    python -m tools.local_smtp [--host 127.0.0.1] [--port 2525] [--out-dir .mail] [--fail-every 0]
+
+or start it in-process with LocalSmtpServer(...).start().
+"""
+import argparse
+import base64
+import logging
+import os
+import socketserver
+import threading
+import time
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str) -> None:
+        self.wfile.write((line + "\r\n").encode("utf-8"))
+
+    def handle(self) -> None:
+        server: "LocalSmtpServer" = self.server.stand_in
+        with server.lock:
+            server.stats["connections"] += 1
+        self._reply("220 localhost Terradorian SMTP stand-in")
+        mail_from, rcpt_to = None, []
+
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode("utf-8", "replace").rstrip("\r\n")
+            verb, _, arg = line.partition(" ")
+            verb = verb.upper()
+
+            if verb == "EHLO":
+                self._reply("250-localhost")
+                self._reply("250-AUTH PLAIN LOGIN")
+                self._reply("250 8BITMIME")
+            elif verb == "HELO":
+                self._reply("250 localhost")
+            elif verb == "AUTH":
+                mechanism, _, initial = arg.partition(" ")
+                if mechanism.upper() == "PLAIN" and not initial:
+                    self._reply("334 ")
+                    self.rfile.readline()
+                elif mechanism.upper() == "LOGIN":
+                    self._reply("334 " + base64.b64encode(b"Username:").decode())
+                    self.rfile.readline()
+                    self._reply("334 " + base64.b64encode(b"Password:").decode())
+                    self.rfile.readline()
+                with server.lock:
+                    server.stats["logins"] += 1
+                self._reply("235 Authentication successful")
+            elif verb == "MAIL":
+                mail_from, rcpt_to = arg.partition(":")[2].strip(), []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                rcpt_to.append(arg.partition(":")[2].strip())
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                if server.should_fail():
+                    self._reply("451 Requested action aborted: local stand-in simulated failure")
+                else:
+                    server.store(mail_from, rcpt_to, b"".join(lines))
+                    self._reply("250 OK: queued")
+                mail_from, rcpt_to = None, []
+            elif verb == "RSET":
+                mail_from, rcpt_to = None, []
+                self._reply("250 OK")
+            elif verb == "NOOP":
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class LocalSmtpServer:
+    """In-process SMTP stand-in; received messages are in .messages as (from, to, bytes)."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, out_dir: str | None = None, fail_every: int = 0):
+        self._server = _ThreadingServer((host, port), _SmtpHandler)
+        self._server.stand_in = self
+        self.host, self.port = self._server.server_address[:2]
+        self.out_dir = out_dir
+        self.fail_every = fail_every
+        self.lock = threading.Lock()
+        self.messages: list[tuple[str, list[str], bytes]] = []
+        self.stats = {"connections": 0, "logins": 0, "data_commands": 0}
+        self._thread: threading.Thread | None = None
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            self.stats["data_commands"] += 1
+            return bool(self.fail_every) and self.stats["data_commands"] % self.fail_every == 0
+
+    def store(self, mail_from: str, rcpt_to: list[str], data: bytes) -> None:
+        with self.lock:
+            self.messages.append((mail_from, rcpt_to, data))
+            index = len(self.messages)
+        logging.info(f"Received message {index} from {mail_from} to {', '.join(rcpt_to)} ({len(data)} bytes)")
+        if self.out_dir:
+            os.makedirs(self.out_dir, exist_ok=True)
+            with open(os.path.join(self.out_dir, f"{time.strftime('%Y%m%dT%H%M%S')}-{index}.eml"), "wb") as f:
+                f.write(data)
+
+    def start(self) -> "LocalSmtpServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--out-dir", default=None, help="Write received messages as .eml files here")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth DATA with 451 (0 = never)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    server = LocalSmtpServer(args.host, args.port, args.out_dir, args.fail_every)
+    logging.info(f"SMTP stand-in listening on {server.host}:{server.port}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
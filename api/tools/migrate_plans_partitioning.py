@@ -0,0 +1,328 @@
+"""
+Migration: move plans to the project-partitioned container, online.
+
+`plans` is partitioned on /id; `plans_by_project` on /project_id (see
+shared/plans_store.py). The copy runs while the Function App keeps serving
+and writing `plans`, then the app is switched over:
+
+1. copy      Reads the change feed of `plans` from the checkpoint and upserts
+             each plan into `plans_by_project`. The change-feed continuation is
+             saved to --checkpoint after every page, so an interrupted copy
+             resumes where it stopped, and the ids of copied plans are
+             appended to <checkpoint>.ids. Re-run it (or keep it running with
+             --follow) until a pass copies (almost) nothing.
+2. verify    Compares the plan ids of each project in both containers.
+3. switch    Set the app setting PLANS_PARTITIONING=project on the Function
+             App and note the time (UTC).
+4. finalize --switched-at <time>
+             One last change-feed pass for writes that reached `plans` before
+             the switch. Existing copies are replaced, except those the app
+             has written in `plans_by_project` since the switch. A plan that
+             was copied but is no longer there was deleted by the app after
+             the switch and is not recreated. Plans that were never copied
+             are reported and listed in the checkpoint; re-run with
+             --create-uncopied to copy them after checking. Then
+             removes copies of plans that were deleted from `plans` before
+             the switch (the change feed does not report deletes). Their blob
+             references were already released by the delete, so only the
+             documents are removed.
+
+`plans` is left untouched; delete it once the app has run on the new
+container for a while. Switching back (PLANS_PARTITIONING=id) before then
+loses only the writes made after the switch.
+
+Run from the api/ folder (uses the same COSMOS_* settings as the Function App):
+    python -m tools.migrate_plans_partitioning copy [--checkpoint FILE] [--follow] [--workers 8] [--dry-run]
+    python -m tools.migrate_plans_partitioning verify [--project <project_id>]
+    python -m tools.migrate_plans_partitioning finalize --switched-at 2026-01-31T18:00:00Z [--checkpoint FILE] [--create-uncopied] [--dry-run]
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+
+from shared.plans_store import get_plans_container
+
+SOURCE_SCHEME = "id"
+TARGET_SCHEME = "project"
+DEFAULT_CHECKPOINT = "plans_partitioning.checkpoint.json"
+
+# Server-generated properties of the source document (the change feed adds _lsn)
+SYSTEM_PROPERTIES = ("_rid", "_self", "_etag", "_attachments", "_ts", "_lsn")
+
+
+def load_checkpoint(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, checkpoint: dict) -> None:
+    checkpoint["updated_at"] = datetime.now(timezone.utc).isoformat()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def copied_ids_path(path: str) -> str:
+    return f"{path}.ids"
+
+
+def load_copied_ids(path: str) -> set[str]:
+    """Ids of the plans copied so far (one per line in the checkpoint's .ids journal)."""
+    ids_path = copied_ids_path(path)
+    if not os.path.exists(ids_path):
+        return set()
+    with open(ids_path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def record_copied_ids(path: str, ids: list[str]) -> None:
+    if not ids:
+        return
+    with open(copied_ids_path(path), "a", encoding="utf-8") as f:
+        f.writelines(f"{plan_id}\n" for plan_id in ids)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def strip_system_properties(doc: dict) -> dict:
+    return {k: v for k, v in doc.items() if k not in SYSTEM_PROPERTIES}
+
+
+def copy_plan(target, doc: dict, dry_run: bool) -> str:
+    if not doc.get("project_id"):
+        logging.warning(f"{doc.get('id')}: no project_id, not copied")
+        return "no_project"
+    if dry_run:
+        return "pending"
+    target.upsert_item(strip_system_properties(doc))
+    return "copied"
+
+
+def finalize_plan(target, doc: dict, switched_ts: int, copied_ids: set[str], create_uncopied: bool, dry_run: bool) -> str:
+    """
+    Copies a late source write over an existing copy, unless the app has
+    rewritten the plan since the switch. A missing copy is only created for a
+    plan that was never copied, and only with create_uncopied: a plan copied
+    before but gone now was deleted by the app after the switch.
+    """
+    if not doc.get("project_id"):
+        return "no_project"
+    try:
+        current = target.read_item(item=doc["id"], partition_key=doc["project_id"])
+    except exceptions.CosmosResourceNotFoundError:
+        current = None
+    if current is not None and current["_ts"] >= switched_ts:
+        return "kept"
+    if current is None:
+        if doc["id"] in copied_ids:
+            logging.info(f"{doc['id']}: deleted after the switch, not recreated")
+            return "deleted_after_switch"
+        if not create_uncopied:
+            logging.warning(f"{doc['id']} (project {doc['project_id']}): never copied, not created")
+            return "not_copied"
+    if dry_run:
+        return "pending"
+    try:
+        if current is None:
+            target.create_item(strip_system_properties(doc))
+        else:
+            target.replace_item(item=doc["id"], body=strip_system_properties(doc),
+                                etag=current["_etag"], match_condition=MatchConditions.IfNotModified)
+    except (exceptions.CosmosResourceExistsError, exceptions.CosmosAccessConditionFailedError):
+        # Written by the app meanwhile
+        return "kept"
+    return "copied"
+
+
+def create_plan_copy(source, target, plan_id: str, dry_run: bool) -> str:
+    """Copies a plan that was never copied (--create-uncopied), if it still exists."""
+    try:
+        doc = source.read_item(item=plan_id, partition_key=plan_id)
+    except exceptions.CosmosResourceNotFoundError:
+        return "deleted"
+    if not doc.get("project_id"):
+        return "no_project"
+    if dry_run:
+        return "pending"
+    try:
+        target.create_item(strip_system_properties(doc))
+    except exceptions.CosmosResourceExistsError:
+        return "kept"
+    return "copied"
+
+
+def read_change_feed(source, checkpoint: dict, page_size: int):
+    """Yields (items, continuation) per change-feed page from the checkpoint (or the beginning)."""
+    if checkpoint.get("continuation"):
+        feed = source.query_items_change_feed(continuation=checkpoint["continuation"], max_item_count=page_size)
+    else:
+        feed = source.query_items_change_feed(start_time="Beginning", max_item_count=page_size)
+    pages = feed.by_page()
+    for page in pages:
+        yield list(page), pages.continuation_token
+
+
+def run_feed_pass(source, args, process) -> dict[str, int]:
+    checkpoint = load_checkpoint(args.checkpoint)
+    counts: dict[str, int] = {}
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for items, continuation in read_change_feed(source, checkpoint, args.page_size):
+            statuses = list(pool.map(process, items))
+            for status in statuses:
+                counts[status] = counts.get(status, 0) + 1
+            if args.dry_run:
+                continue
+            # Ids before the continuation: every copy behind the checkpoint is in the journal
+            record_copied_ids(args.checkpoint, [doc["id"] for doc, status in zip(items, statuses) if status == "copied"])
+            # Only after the whole page is written: a resumed run re-copies at most one page
+            checkpoint["continuation"] = continuation
+            checkpoint["copied"] = checkpoint.get("copied", 0) + statuses.count("copied")
+            save_checkpoint(args.checkpoint, checkpoint)
+    return counts
+
+
+def summary(counts: dict[str, int]) -> str:
+    return ", ".join(f"{k}: {v}" for k, v in sorted(counts.items())) or "no changes"
+
+
+def cmd_copy(args) -> None:
+    source = get_plans_container(SOURCE_SCHEME)
+    target = get_plans_container(TARGET_SCHEME)
+    while True:
+        counts = run_feed_pass(source, args, lambda doc: copy_plan(target, doc, args.dry_run))
+        logging.info(f"Copy pass: {summary(counts)}")
+        if not args.follow:
+            return
+        time.sleep(args.interval)
+
+
+def project_ids(container, project_id: str | None) -> dict[str, set]:
+    """Plan ids grouped by project."""
+    if project_id:
+        query, parameters = "SELECT c.id, c.project_id FROM c WHERE c.project_id = @pid", [{"name": "@pid", "value": project_id}]
+    else:
+        query, parameters = "SELECT c.id, c.project_id FROM c", []
+    grouped: dict[str, set] = {}
+    for item in container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True):
+        grouped.setdefault(item.get("project_id"), set()).add(item["id"])
+    return grouped
+
+
+def cmd_verify(args) -> None:
+    source = project_ids(get_plans_container(SOURCE_SCHEME), args.project)
+    target = project_ids(get_plans_container(TARGET_SCHEME), args.project)
+    mismatched = 0
+    for project_id in sorted(set(source) | set(target), key=str):
+        missing = source.get(project_id, set()) - target.get(project_id, set())
+        extra = target.get(project_id, set()) - source.get(project_id, set())
+        if missing or extra:
+            mismatched += 1
+            logging.info(f"{project_id}: {len(missing)} missing, {len(extra)} extra "
+                         f"(of {len(source.get(project_id, set()))} plans)")
+    total = sum(len(ids) for ids in source.values())
+    logging.info(f"{total} plans in {len(source)} projects, {mismatched} projects differ")
+
+
+def cmd_finalize(args) -> None:
+    switched_at = datetime.fromisoformat(args.switched_at.replace("Z", "+00:00"))
+    if switched_at.tzinfo is None:
+        switched_at = switched_at.replace(tzinfo=timezone.utc)
+    switched_ts = int(switched_at.timestamp())
+
+    copied_ids = load_copied_ids(args.checkpoint)
+    if not copied_ids and load_checkpoint(args.checkpoint).get("copied"):
+        logging.warning(f"{copied_ids_path(args.checkpoint)} is missing: plans copied before cannot be told apart "
+                        "from plans never copied, so no missing copy is recreated without --create-uncopied")
+
+    source = get_plans_container(SOURCE_SCHEME)
+    target = get_plans_container(TARGET_SCHEME)
+    reported: list[str] = []
+
+    def process(doc: dict) -> str:
+        status = finalize_plan(target, doc, switched_ts, copied_ids, args.create_uncopied, args.dry_run)
+        if status == "not_copied":
+            reported.append(doc["id"])
+        return status
+
+    counts = run_feed_pass(source, args, process)
+    logging.info(f"Final copy pass: {summary(counts)}")
+
+    # Never-copied plans are behind the continuation now: keep them in the checkpoint
+    checkpoint = load_checkpoint(args.checkpoint)
+    uncopied = set(checkpoint.get("not_copied", [])) | set(reported)
+    if args.create_uncopied:
+        for plan_id in sorted(uncopied):
+            status = create_plan_copy(source, target, plan_id, args.dry_run)
+            logging.info(f"{plan_id}: {status}")
+            if status == "copied":
+                record_copied_ids(args.checkpoint, [plan_id])
+            if status != "pending":
+                uncopied.discard(plan_id)
+    if uncopied:
+        logging.warning(f"{len(uncopied)} plans were never copied and are not in the target (see 'not_copied' in "
+                        f"{args.checkpoint}); check them and re-run with --create-uncopied to copy them")
+    if not args.dry_run:
+        checkpoint["not_copied"] = sorted(uncopied)
+        save_checkpoint(args.checkpoint, checkpoint)
+
+    # Copies last written before the switch whose plan is gone from the source
+    source_ids = set(source.query_items(query="SELECT VALUE c.id FROM c", enable_cross_partition_query=True))
+    stale = [doc for doc in target.query_items(
+        query="SELECT c.id, c.project_id FROM c WHERE c._ts < @switched",
+        parameters=[{"name": "@switched", "value": switched_ts}],
+        enable_cross_partition_query=True
+    ) if doc["id"] not in source_ids]
+    if not args.dry_run:
+        for doc in stale:
+            try:
+                target.delete_item(item=doc["id"], partition_key=doc["project_id"])
+            except exceptions.CosmosResourceNotFoundError:
+                pass
+    logging.info(f"{'Would remove' if args.dry_run else 'Removed'} {len(stale)} copies of plans deleted before the switch")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def feed_options(p):
+        p.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Checkpoint file (change-feed continuation)")
+        p.add_argument("--workers", type=int, default=8)
+        p.add_argument("--page-size", type=int, default=500)
+        p.add_argument("--dry-run", action="store_true", help="Only report what would be written")
+
+    copy_parser = sub.add_parser("copy", help="Copy plans from the change feed (resumable)")
+    feed_options(copy_parser)
+    copy_parser.add_argument("--follow", action="store_true", help="Keep tailing the change feed until interrupted")
+    copy_parser.add_argument("--interval", type=float, default=5.0, help="Seconds between --follow passes")
+
+    verify_parser = sub.add_parser("verify", help="Compare plan ids per project")
+    verify_parser.add_argument("--project", default=None, help="Only compare this project")
+
+    finalize_parser = sub.add_parser("finalize", help="Catch up and reconcile deletes after the switch")
+    feed_options(finalize_parser)
+    finalize_parser.add_argument("--switched-at", required=True, help="UTC time PLANS_PARTITIONING was switched (ISO 8601)")
+    finalize_parser.add_argument("--create-uncopied", action="store_true",
+                                 help="Also create copies of plans that were never copied (reported otherwise)")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    try:
+        {"copy": cmd_copy, "verify": cmd_verify, "finalize": cmd_finalize}[args.command](args)
+    except KeyboardInterrupt:
+        logging.info(f"Interrupted; resume from {getattr(args, 'checkpoint', DEFAULT_CHECKPOINT)}")
+
+
+if __name__ == "__main__":
+    main()
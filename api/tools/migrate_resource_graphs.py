@@ -0,0 +1,83 @@
+"""
+Migration: move embedded resource graphs out of plan documents.
+
+Plans ingested before the graph store carry `resource_graph` inline. For
+each of them the graph is written to the content-addressed graph store
+(shared/graph_store.py; identical graphs share one blob) and the document is
+patched to `graph_url` with `resource_graph` removed. The patch is
+conditional on the document still embedding its graph, so re-running the
+migration, or running it while plans are ingested and deleted, is safe.
+
+Re-run tools.backfill_latest_plans afterwards so the latest_plans entries pick
+up graph_url (export_plans falls back to the plan documents until then).
+
+Run from the api/ folder (uses the same COSMOS_* / storage settings as the Function App):
+    python -m tools.migrate_resource_graphs [--project <project_id>] [--workers 8] [--dry-run]
+"""
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.cosmos import exceptions
+
+from shared.plans_store import get_plans_container, plan_partition_key, project_query_kwargs
+from shared.graph_store import upload_graph_blob
+from shared.storage import delete_plan_blobs
+
+
+def migrate_plan(container, plan: dict, dry_run: bool) -> str:
+    if dry_run:
+        return "pending"
+
+    graph_url = upload_graph_blob(plan.get('resource_graph') or {}, plan['project_id'])
+    operations = [{"op": "remove", "path": "/resource_graph"}]
+    if graph_url:
+        operations.insert(0, {"op": "set", "path": "/graph_url", "value": graph_url})
+    try:
+        container.patch_item(item=plan['id'], partition_key=plan_partition_key(plan), patch_operations=operations,
+                             filter_predicate="FROM c WHERE IS_DEFINED(c.resource_graph)")
+    except (exceptions.CosmosResourceNotFoundError, exceptions.CosmosAccessConditionFailedError):
+        # Deleted or already migrated meanwhile: drop the reference taken above
+        if graph_url:
+            delete_plan_blobs([graph_url])
+        return "skipped"
+    return "migrated" if graph_url else "emptied"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--project", default=None, help="Only migrate this project's plans")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many plans would be migrated")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    where = ["IS_DEFINED(c.resource_graph)"]
+    parameters = []
+    if args.project:
+        where.append("c.project_id = @pid")
+        parameters.append({"name": "@pid", "value": args.project})
+
+    container = get_plans_container()
+    plans = container.query_items(
+        query=f"SELECT c.id, c.project_id, c.resource_graph FROM c WHERE {' AND '.join(where)}",
+        parameters=parameters,
+        # drift_summary / resource_graph are not indexed (shared/index_policies.py)
+        enable_scan_in_query=True,
+        **project_query_kwargs(args.project)
+    )
+
+    counts: dict[str, int] = {}
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for status in pool.map(lambda p: migrate_plan(container, p, args.dry_run), plans):
+            counts[status] = counts.get(status, 0) + 1
+            done = sum(counts.values())
+            if done % 500 == 0:
+                logging.info(f"{done} plans processed")
+
+    logging.info(", ".join(f"{k}: {v}" for k, v in sorted(counts.items())) or "No embedded graphs left")
+
+
+if __name__ == "__main__":
+    main()
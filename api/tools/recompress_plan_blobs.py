@@ -0,0 +1,84 @@
+"""
+Migration: recompress existing plan blobs with the configured codec.
+
+Blobs uploaded before compression was introduced (or under a different
+PLAN_BLOB_CODEC) are read, decoded with whatever codec they carry, and
+rewritten in place with the target codec. Each rewrite is conditional on the
+ETag read, so a plan re-ingested while the migration runs is never clobbered.
+
+Run from the api/ folder (uses the same BlobStorageConnection /
+STORAGE_ACCOUNT_NAME settings as the Function App):
+    python -m tools.recompress_plan_blobs [--codec gzip|zstd|identity] [--prefix <project_id>/] [--workers 8] [--dry-run]
+"""
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+
+from shared.blob_codec import SUPPORTED_CODECS, codec_from_properties, decompress, get_default_codec
+from shared.storage import get_plans_container_client, record_blob_etag, write_plan_bytes
+
+
+def recompress_blob(container_client, blob, target_codec: str, dry_run: bool) -> tuple[str, int, int]:
+    """Returns (status, bytes before, bytes after) for one blob."""
+    current_codec = codec_from_properties(blob)
+    if current_codec == target_codec:
+        return "skipped", blob.size, blob.size
+    if dry_run:
+        return "pending", blob.size, blob.size
+
+    blob_client = container_client.get_blob_client(blob.name)
+    raw = b""
+    try:
+        downloader = blob_client.download_blob(decompress=False)
+        raw = downloader.readall()
+        data = decompress(raw, codec_from_properties(downloader.properties))
+        result = write_plan_bytes(blob_client, data, codec=target_codec,
+                                  etag=downloader.properties.etag, match_condition=MatchConditions.IfNotModified)
+        # Shared (content-addressed) blobs track their ETag for safe deletion
+        record_blob_etag(blob.name, result.get("etag"))
+    except (ResourceModifiedError, ResourceNotFoundError):
+        # Re-ingested or deleted concurrently; the new upload already uses the current codec
+        return "changed", len(raw), 0
+    return "recompressed", len(raw), blob_client.get_blob_properties().size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--codec", choices=SUPPORTED_CODECS, default=None,
+                        help="Target codec (defaults to PLAN_BLOB_CODEC, i.e. gzip)")
+    parser.add_argument("--prefix", default=None, help="Only migrate blobs under this prefix, e.g. '<project_id>/'")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be rewritten")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    target_codec = args.codec or get_default_codec()
+    container_client = get_plans_container_client()
+
+    counts: dict[str, int] = {}
+    bytes_before = bytes_after = 0
+    blobs = container_client.list_blobs(name_starts_with=args.prefix, include=["metadata"])
+
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        results = pool.map(lambda b: (b.name, recompress_blob(container_client, b, target_codec, args.dry_run)), blobs)
+        for name, (status, before, after) in results:
+            counts[status] = counts.get(status, 0) + 1
+            if status == "recompressed":
+                bytes_before += before
+                bytes_after += after
+                logging.info(f"{name}: {before} -> {after} bytes")
+            elif status == "pending":
+                logging.info(f"{name}: would recompress ({before} bytes)")
+            elif status == "changed":
+                logging.warning(f"{name}: modified or deleted during migration, left as is")
+
+    logging.info(f"Target codec: {target_codec}; " + ", ".join(f"{k}: {v}" for k, v in sorted(counts.items())))
+    if bytes_before:
+        logging.info(f"Stored size {bytes_before} -> {bytes_after} bytes ({bytes_before / max(bytes_after, 1):.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,31 @@ resource "azurerm_storage_container" "plans" {
   container_access_type = "private"
 }
 
+# Spooled plan exports (api/shared/export_store.py), handed out as short-lived SAS links
+resource "azurerm_storage_container" "exports" {
+  name                  = "exports"
+  storage_account_name  = azurerm_storage_account.func.name
+  container_access_type = "private"
+}
+
+resource "azurerm_storage_management_policy" "func" {
+  storage_account_id = azurerm_storage_account.func.id
+
+  rule {
+    name    = "expire-exports"
+    enabled = true
+    filters {
+      prefix_match = ["exports/"]
+      blob_types   = ["blockBlob"]
+    }
+    actions {
+      base_blob {
+        delete_after_days_since_modification_greater_than = 1
+      }
+    }
+  }
+}
+
 # Private Endpoint for Blob
 resource "azurerm_private_endpoint" "blob" {
   name                = "pe-blob-${var.environment}"
@@ -110,7 +110,7 @@ export default function DashboardPage({ params }: { params: Promise<{ id: string
     const handleDelete = async () => {
         if (!planToDelete) return
         try {
-            await deletePlan(planToDelete.id)
+            await deletePlan(planToDelete.id, id)
             toast.success("Plan deleted")
             mutate()
             setDeleteOpen(false)
@@ -126,7 +126,7 @@ export default function DashboardPage({ params }: { params: Promise<{ id: string
         setViewLoading(true)
         setFullPlan(null)
         try {
-            const data = await getPlan(plan.id)
+            const data = await getPlan(plan.id, id)
             setFullPlan(data)
         } catch (e) {
             toast.error("Failed to load plan details")
@@ -409,15 +409,18 @@ export default function DashboardPage({ params }: { params: Promise<{ id: string
                             onClick={async () => {
                                 setExporting(true)
                                 try {
-                                    const blob = await exportPlans(id, targetEnvs, branch)
-                                    const url = URL.createObjectURL(blob)
+                                    const result = await exportPlans(id, targetEnvs, branch)
+                                    // Links point at the storage account, which names the file itself
+                                    const url = result instanceof Blob ? URL.createObjectURL(result) : result.url
                                     const a = document.createElement('a')
                                     a.href = url
                                     a.download = `terraform-plans-${targetEnvs.join('-')}-${branch}.zip`
                                     document.body.appendChild(a)
                                     a.click()
                                     a.remove()
-                                    URL.revokeObjectURL(url)
+                                    if (result instanceof Blob) {
+                                        URL.revokeObjectURL(url)
+                                    }
                                     toast.success('Plans exported successfully')
                                     setExportOpen(false)
                                 } catch (e: unknown) {
@@ -3,7 +3,7 @@
 import { use, useEffect, useState } from "react"
 import { useSearchParams } from "next/navigation"
 import useSWR from "swr"
-import { fetcher, listComponents, listPlans } from "@/lib/api"
+import { fetcher, getPlanGraph, listComponents, listPlans, withPage } from "@/lib/api"
 import { DependencyGraph } from "@/components/dependency-graph"
 import { BarChart2 } from "lucide-react"
 
@@ -22,9 +22,14 @@ export default function GraphPage({ params }: { params: Promise<{ id: string }>
         const fetchGraphData = async () => {
             if (!components) return
             const promises = components.map(async (c: any) => {
-                // Fetch latest plan for this component in this environment
-                const p = await fetcher(listPlans(projectId, c.id, env))
-                return p && p.length > 0 ? p[0] : null
+                // Latest plan for this component in this environment, then its graph
+                const page = await fetcher(withPage(listPlans(projectId, c.id, env, undefined, undefined, "graph"), 1))
+                const p = page?.items?.[0]
+                if (!p) return null
+                if (!p.resource_graph && p.graph_url) {
+                    p.resource_graph = await fetcher(getPlanGraph(p.id, projectId))
+                }
+                return p
             })
             const results = await Promise.all(promises)
             setAllGraphPlans(results.filter(r => r !== null))
@@ -25,7 +25,7 @@ import { Dialog, DialogContent, DialogDescription, DialogFooter, DialogHeader, D
 
 // Helper to group environments
 // Returns: { "Production": { "UK South": ["production-uks-1", ...], "Global": ["production-global"] } }
-import { groupEnvironments } from "@/lib/utils"
+import { changedResources, groupEnvironments } from "@/lib/utils"
 // Reusing from dashboard
 import { DriftChart } from "@/components/project-dashboard"
 import { AggregateDriftChart } from "@/components/aggregate-drift-chart"
@@ -50,7 +50,7 @@ export default function ProjectOverviewPage({ params }: { params: Promise<{ id:
     const daysRange: number | "all" = rangeQuery === "all" ? "all" : Number.parseInt(rangeQuery, 10)
 
     const { data: components, mutate: mutateComponents } = useSWR(() => `/list_components?project_id=${projectId}`, fetcher)
-    const { data: allPlans, mutate } = useSWR(() => listPlans(projectId, undefined, undefined, undefined, daysRange), fetcher)
+    const { data: allPlans, mutate } = useSWR(() => listPlans(projectId, undefined, undefined, undefined, daysRange, "summary"), fetcher)
     const { data: pendingIngestions } = useSWR(() => `/list_pending_ingestions?project_id=${projectId}`, fetcher)
     const filteredPlans = allPlans?.filter((p: any) => p.branch === branch)
 
@@ -85,7 +85,7 @@ export default function ProjectOverviewPage({ params }: { params: Promise<{ id:
     const handleDelete = async () => {
         if (!planToDelete) return
         try {
-            await deletePlan(planToDelete.id)
+            await deletePlan(planToDelete.id, projectId)
             toast.success("Plan deleted")
             mutate()
             setDeleteOpen(false)
@@ -102,13 +102,7 @@ export default function ProjectOverviewPage({ params }: { params: Promise<{ id:
 
     const getStatus = (plan: any) => {
         if (!plan) return "unknown"
-        const changes = plan.terraform_plan?.resource_changes || []
-        // expanded logic: check actions for non-noop
-        const hasDrift = changes.some((rc: any) => {
-            const actions = rc.change?.actions || []
-            return actions.some((action: string) => ["create", "update", "delete"].includes(action))
-        })
-        return hasDrift ? "drift" : "aligned"
+        return changedResources(plan) > 0 ? "drift" : "aligned"
     }
 
     // Metrics
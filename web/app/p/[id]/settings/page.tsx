@@ -278,7 +278,7 @@ export default function SettingsPage({ params }: { params: Promise<{ id: string
     const handleApprove = async (planId: string) => {
         setActionLoading(planId)
         try {
-            await approveIngestion(planId)
+            await approveIngestion(planId, id)
             toast.success("Ingestion approved!")
             mutatePending()
             mutateComponents()
@@ -292,7 +292,7 @@ export default function SettingsPage({ params }: { params: Promise<{ id: string
     const handleReject = async (planId: string) => {
         setActionLoading(planId)
         try {
-            await rejectIngestion(planId)
+            await rejectIngestion(planId, id)
             toast.success("Ingestion rejected")
             mutatePending()
         } catch (e) {
@@ -12,6 +12,7 @@ import {
 } from "recharts"
 import { useMemo } from "react"
 import { useTheme } from "next-themes"
+import { changedResources } from "@/lib/utils"
 
 // Helper to generate distinct colors for up to 10 groups
 const COLORS = [
@@ -44,17 +45,7 @@ export function AggregateDriftChart({ groups }: { groups: { name: string, plans:
         groups.forEach(g => groupStates.set(g.name, new Map()));
 
         // Helper to calc stats
-        const getPlanTotal = (plan: any) => {
-            const changes = plan.terraform_plan?.resource_changes || []
-            let total = 0
-            changes.forEach((rc: any) => {
-                const actions = rc.change.actions
-                if (actions.includes("create") || actions.includes("delete") || actions.includes("update")) {
-                    total++
-                }
-            })
-            return total
-        }
+        const getPlanTotal = (plan: any) => changedResources(plan)
 
         // 3. For each timestamp, we must accumulate the state of all components up to this point.
         const sortedGroupPlans = groups.map(g => ({
@@ -96,7 +96,8 @@ export const listPlans = (
     component_id?: string,
     environment?: string,
     branch?: string,
-    days?: number | "all"
+    days?: number | "all",
+    view?: "summary" | "changes" | "graph" | "full"
 ) => {
     let url = `/list_plans?project_id=${project_id}`;
     if (component_id) {
@@ -111,9 +112,34 @@ export const listPlans = (
     if (days !== undefined) {
         url += `&days=${days}`;
     }
+    if (view) {
+        url += `&view=${view}`;
+    }
     return url;
 };
 
+// project_id is optional for the plan_id endpoints; passing it keeps them
+// point reads when plans are partitioned by project.
+const projectParam = (project_id?: string, sep = "?") => project_id ? `${sep}project_id=${project_id}` : "";
+
+// Resource graph of one plan (stored separately from the plan document)
+export const getPlanGraph = (plan_id: string, project_id?: string) => `/get_plan_graph?plan_id=${plan_id}${projectParam(project_id, "&")}`;
+
+// Cursor pagination for the list_* endpoints: pass the previous page's
+// next_cursor to get the following page (null when there are no more).
+export interface Page<T> {
+    items: T[];
+    next_cursor: string | null;
+}
+
+export const withPage = (url: string, page_size: number, cursor?: string | null) => {
+    let paged = `${url}${url.includes("?") ? "&" : "?"}page_size=${page_size}`;
+    if (cursor) {
+        paged += `&cursor=${encodeURIComponent(cursor)}`;
+    }
+    return paged;
+};
+
 export const deleteComponent = async (component_id: string, project_id: string) => {
     const res = await fetch(`${API_BASE}/delete_component`, {
         method: "DELETE",
@@ -134,8 +160,8 @@ export const deleteEnvironment = async (project_id: string, environment: string)
     return true;
 };
 
-export const deletePlan = async (plan_id: string) => {
-    const res = await fetch(`${API_BASE}/delete_plan/${plan_id}`, {
+export const deletePlan = async (plan_id: string, project_id?: string) => {
+    const res = await fetch(`${API_BASE}/delete_plan/${plan_id}${projectParam(project_id)}`, {
         method: "DELETE",
         headers: { "Content-Type": "application/json" },
     });
@@ -153,8 +179,8 @@ export const updateProjectSettings = async (project_id: string, settings: any) =
     return res.json();
 };
 
-export const getPlan = async (plan_id: string) => {
-    const res = await fetch(`${API_BASE}/get_plan?plan_id=${plan_id}`);
+export const getPlan = async (plan_id: string, project_id?: string) => {
+    const res = await fetch(`${API_BASE}/get_plan?plan_id=${plan_id}${projectParam(project_id, "&")}`);
     if (!res.ok) throw new Error("Failed to fetch plan");
     return res.json();
 };
@@ -165,21 +191,21 @@ export const listPendingIngestions = async (project_id: string) => {
     return res.json();
 };
 
-export const approveIngestion = async (plan_id: string) => {
+export const approveIngestion = async (plan_id: string, project_id?: string) => {
     const res = await fetch(`${API_BASE}/approve_ingestion`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ plan_id }),
+        body: JSON.stringify({ plan_id, project_id }),
     });
     if (!res.ok) throw new Error("Failed to approve ingestion");
     return res.json();
 };
 
-export const rejectIngestion = async (plan_id: string) => {
+export const rejectIngestion = async (plan_id: string, project_id?: string) => {
     const res = await fetch(`${API_BASE}/reject_ingestion`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ plan_id }),
+        body: JSON.stringify({ plan_id, project_id }),
     });
     if (!res.ok) throw new Error("Failed to reject ingestion");
     return res.json();
@@ -229,7 +255,17 @@ export const calculateDiskUsage = async (project_id: string) => {
     return res.json();
 };
 
-export const exportPlans = async (project_id: string, environments: string[], branch?: string) => {
+export interface ExportLink {
+    url: string;
+    expires_at: string;
+    filename: string;
+    size: number;
+    files: number;
+}
+
+// The API returns a short-lived link to the spooled archive, or the archive
+// itself when it is configured for inline delivery
+export const exportPlans = async (project_id: string, environments: string[], branch?: string): Promise<ExportLink | Blob> => {
     let url = `${API_BASE}/export_plans?project_id=${project_id}&environment=${environments.join(',')}`;
     if (branch) {
         url += `&branch=${encodeURIComponent(branch)}`;
@@ -239,6 +275,9 @@ export const exportPlans = async (project_id: string, environments: string[], br
         const errorText = await res.text();
         throw new Error(errorText || "Failed to export plans");
     }
+    if (res.headers.get("content-type")?.includes("application/json")) {
+        return res.json();
+    }
     return res.blob();
 };
 
@@ -38,3 +38,18 @@ export const groupEnvironments = (envs: string[], config: Record<string, { group
 
   return grouped
 }
+
+// Resources a plan would create, update or delete (a replace counts once).
+// Prefers the precomputed drift_summary counters (list_plans view=summary);
+// falls back to counting resource_changes for plans without them.
+export function changedResources(plan: any): number {
+  const summary = plan?.drift_summary
+  if (summary) {
+    return (summary.create || 0) + (summary.update || 0) + (summary.delete || 0) + (summary.replace || 0)
+  }
+  const changes = plan?.terraform_plan?.resource_changes || []
+  return changes.filter((rc: any) => {
+    const actions = rc.change?.actions || []
+    return actions.some((action: string) => ["create", "update", "delete"].includes(action))
+  }).length
+}